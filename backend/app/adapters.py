@@ -0,0 +1,211 @@
+from typing import Any, Dict, List, Optional, Sequence, Type
+import json
+import math
+import os
+import random
+from pydantic import BaseModel, Field
+
+from app.http_client import get_http_client
+
+
+class PoolConfig(BaseModel):
+    """One pool as listed in the protocol config"""
+    name: str
+    source: str
+    # Upstream identifier; defaults to the display name
+    pool_id: Optional[str] = None
+    risk_score: int
+    fallback_apy: float
+    # Display TVL used when the source does not report one
+    tvl: str = "n/a"
+    # Most of the vault (percent) the allocation optimizer may place here
+    max_allocation: Optional[float] = None
+    # Adapter-specific settings (JSON paths, simulated variance, ...)
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+    @property
+    def upstream_id(self) -> str:
+        return self.pool_id or self.name
+
+
+class SourceConfig(BaseModel):
+    adapter: str
+    url: Optional[str] = None
+    timeout: Optional[float] = None
+    options: Dict[str, Any] = Field(default_factory=dict)
+
+
+class ProtocolConfig(BaseModel):
+    sources: Dict[str, SourceConfig]
+    pools: List[PoolConfig]
+
+
+class PoolQuote:
+    """What a source reported for one pool"""
+
+    __slots__ = ("apy", "tvl_usd")
+
+    def __init__(self, apy: float, tvl_usd: Optional[float] = None):
+        self.apy = apy
+        self.tvl_usd = tvl_usd
+
+
+_TVL_UNITS = ((1e12, "T"), (1e9, "B"), (1e6, "M"), (1e3, "K"))
+
+
+def format_tvl(value: float) -> str:
+    """Display form of a USD amount, e.g. 2.1e9 -> "$2.1B" (inverse of parse_tvl)"""
+    for scale, suffix in _TVL_UNITS:
+        if value >= scale:
+            return f"${value / scale:.3g}{suffix}"
+    return f"${value:.0f}"
+
+
+class ProtocolAdapter:
+    """Base class for one kind of APY source.
+
+    `fetch` receives every pool configured for the source and should answer
+    them all from as few upstream calls as possible (ideally one). Pools left
+    out of the result fall back to their configured APY.
+    """
+
+    type_name = ""
+
+    def __init__(self, source: str, config: SourceConfig):
+        self.source = source
+        self.config = config
+
+    async def fetch(self, pools: Sequence[PoolConfig]) -> Dict[str, PoolQuote]:
+        raise NotImplementedError
+
+
+ADAPTER_TYPES: Dict[str, Type[ProtocolAdapter]] = {}
+
+
+def register_adapter(cls: Type[ProtocolAdapter]) -> Type[ProtocolAdapter]:
+    """Class decorator making an adapter available to the config by its type_name"""
+    ADAPTER_TYPES[cls.type_name] = cls
+    return cls
+
+
+def _lookup(document: Any, path: str) -> Any:
+    """Follow a dotted path through dicts and lists ("data.pools.3.apy")"""
+    for part in path.split(".") if path else ():
+        if isinstance(document, list):
+            document = document[int(part)]
+        else:
+            document = document[part]
+    return document
+
+
+def _finite(value: Any) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+@register_adapter
+class SimulatedAdapter(ProtocolAdapter):
+    """Fallback APY plus uniform noise (params.variance); no network"""
+
+    type_name = "simulated"
+
+    async def fetch(self, pools: Sequence[PoolConfig]) -> Dict[str, PoolQuote]:
+        return {
+            pool.name: PoolQuote(round(pool.fallback_apy + random.uniform(-1, 1) * pool.params.get("variance", 2.0), 2))
+            for pool in pools
+        }
+
+
+@register_adapter
+class JsonHttpAdapter(ProtocolAdapter):
+    """One GET to `url`; each pool reads its APY (and optionally TVL) by JSON path.
+
+    Pool params: `apy_path` (default "<pool_id>.apy"), `tvl_path` (optional).
+    """
+
+    type_name = "json_http"
+
+    async def fetch(self, pools: Sequence[PoolConfig]) -> Dict[str, PoolQuote]:
+        response = await get_http_client().get(self.config.url)
+        response.raise_for_status()
+        document = response.json()
+
+        quotes: Dict[str, PoolQuote] = {}
+        for pool in pools:
+            try:
+                apy = _finite(_lookup(document, pool.params.get("apy_path", f"{pool.upstream_id}.apy")))
+                tvl_path = pool.params.get("tvl_path")
+                tvl = _finite(_lookup(document, tvl_path)) if tvl_path else None
+            except (KeyError, IndexError, ValueError, TypeError):
+                continue
+            if apy is not None:
+                quotes[pool.name] = PoolQuote(apy, tvl)
+        return quotes
+
+
+@register_adapter
+class DefiLlamaAdapter(ProtocolAdapter):
+    """DefiLlama yields API: every pool on every chain in one response, matched by pool id"""
+
+    type_name = "defillama"
+
+    async def fetch(self, pools: Sequence[PoolConfig]) -> Dict[str, PoolQuote]:
+        response = await get_http_client().get(self.config.url or "https://yields.llama.fi/pools")
+        response.raise_for_status()
+        wanted = {pool.upstream_id: pool.name for pool in pools}
+
+        quotes: Dict[str, PoolQuote] = {}
+        for entry in response.json().get("data", []):
+            name = wanted.get(entry.get("pool"))
+            if name is None:
+                continue
+            apy = _finite(entry.get("apy"))
+            if apy is not None:
+                quotes[name] = PoolQuote(apy, _finite(entry.get("tvlUsd")))
+        return quotes
+
+
+# Built-in pools: the three integrations the vault contract knows about
+DEFAULT_PROTOCOL_CONFIG: Dict[str, Any] = {
+    "sources": {
+        "simulated": {"adapter": "simulated"},
+    },
+    "pools": [
+        {"name": "PancakeSwap V3", "source": "simulated", "risk_score": 3, "tvl": "$2.1B", "fallback_apy": 12.5, "params": {"variance": 2}},
+        {"name": "Venus", "source": "simulated", "risk_score": 4, "tvl": "$1.8B", "fallback_apy": 15.2, "params": {"variance": 2}},
+        {"name": "Lista DAO", "source": "simulated", "risk_score": 5, "tvl": "$850M", "fallback_apy": 18.7, "params": {"variance": 3}},
+    ],
+}
+
+
+def load_protocol_config(path: Optional[str] = None) -> ProtocolConfig:
+    """Pools and sources from PROTOCOLS_FILE (JSON), else the built-in defaults"""
+    path = path or os.getenv("PROTOCOLS_FILE")
+    if path:
+        with open(path) as f:
+            raw = json.load(f)
+    else:
+        raw = DEFAULT_PROTOCOL_CONFIG
+    config = ProtocolConfig.model_validate(raw)
+
+    seen = set()
+    for pool in config.pools:
+        if pool.name in seen:
+            raise ValueError(f"Duplicate pool name: {pool.name}")
+        seen.add(pool.name)
+        if pool.source not in config.sources:
+            raise ValueError(f"Pool {pool.name!r} uses unknown source {pool.source!r}")
+    for name, source in config.sources.items():
+        if source.adapter not in ADAPTER_TYPES:
+            raise ValueError(f"Source {name!r} uses unknown adapter {source.adapter!r}")
+    return config
+
+
+def display_tvl(pool: PoolConfig, quote: Optional[PoolQuote]) -> str:
+    if quote is not None and quote.tvl_usd is not None:
+        return format_tvl(quote.tvl_usd)
+    return pool.tvl
+
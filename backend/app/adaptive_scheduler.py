@@ -0,0 +1,182 @@
+"""Event-driven cycles: poll APYs often, run a full cycle only when it can matter.
+
+Every `poll_seconds` the scheduler takes a fresh snapshot (one upstream call
+per source) and scores each vault locally, the same way a cycle would. A
+cycle starts when some vault's best-vs-current risk-adjusted spread crosses
+its rebalance threshold, or when the last cycle is older than
+`max_staleness_seconds`. After a cycle, a vault's signal only fires again if
+the best pool changes or the spread widens by `rearm_spread` (or drops back
+under the threshold first), so a spread Claude already declined does not
+re-trigger every poll. Cycle starts are spaced by `min_interval_seconds` and
+capped per hour by a token bucket.
+"""
+from typing import TYPE_CHECKING, Deque, Dict, List, Optional, Tuple
+from collections import deque
+from datetime import datetime, timezone
+import asyncio
+
+import numpy as np
+
+from app import metrics
+from app.models import RebalanceSignal, SchedulerStatusResponse
+from app.rate_limit import AsyncTokenBucket
+from app.scoring import REBALANCE_THRESHOLD_PERCENT, score_protocols
+
+if TYPE_CHECKING:
+    from app.ai_agent import AIAgent
+
+
+class AdaptiveCycleScheduler:
+    def __init__(
+        self,
+        agent: "AIAgent",
+        poll_seconds: float = 15.0,
+        max_staleness_seconds: float = 1800.0,
+        min_interval_seconds: float = 60.0,
+        max_cycles_per_hour: float = 12.0,
+        burst: int = 3,
+        rearm_spread: float = 1.0,
+    ):
+        self.agent = agent
+        self.poll_seconds = poll_seconds
+        self.max_staleness_seconds = max_staleness_seconds
+        self.min_interval_seconds = min_interval_seconds
+        self.rearm_spread = rearm_spread
+        self.budget = AsyncTokenBucket(rate_per_minute=max_cycles_per_hour / 60, burst=burst)
+        self.polls = 0
+        self.deferred = 0
+        self.signals: List[RebalanceSignal] = []
+        self.reactions: Deque[float] = deque(maxlen=500)
+        self.last_trigger: Optional[str] = None
+        self._last_start: Optional[datetime] = None
+        # vault id -> (best pool, spread) when a cycle last ran for its signal
+        self._handled: Dict[str, Tuple[str, float]] = {}
+        # vault id -> snapshot time at which its current signal was first seen
+        self._seen_at: Dict[str, datetime] = {}
+        self._stopping = False
+
+    async def run(self) -> None:
+        """Poll loop; runs until cancelled"""
+        while not self._stopping:
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Adaptive scheduler error: {e}")
+                metrics.ERRORS.labels("adaptive_scheduler").inc()
+            await asyncio.sleep(self.poll_seconds)
+
+    def stop(self) -> None:
+        self._stopping = True
+
+    async def poll(self) -> None:
+        """One cheap check; starts (and waits for) a cycle if it is due"""
+        current = self.agent.cycle_jobs.current
+        if current is not None and current.state == "running":
+            return
+        self.polls += 1
+        snapshot = await self._snapshot()
+        self.signals = self._evaluate(snapshot)
+        now = datetime.now(timezone.utc)
+
+        due = [s for s in self.signals if s.actionable]
+        for signal in self.signals:
+            if signal.actionable:
+                self._seen_at.setdefault(signal.vault_id, snapshot.fetched_at)
+            else:
+                self._seen_at.pop(signal.vault_id, None)
+        last_run = self.agent.last_run
+        if due:
+            reason = "spread"
+        elif last_run is None or (now - last_run).total_seconds() >= self.max_staleness_seconds:
+            reason = "staleness"
+        else:
+            return
+
+        since_start = (now - self._last_start).total_seconds() if self._last_start is not None else None
+        if (since_start is not None and since_start < self.min_interval_seconds) or not self.budget.try_acquire():
+            self.deferred += 1
+            return
+        await self._run_cycle(reason, due)
+
+    async def _snapshot(self):
+        cache = self.agent.protocol_cache
+        snapshot = cache.snapshot
+        # Reuse a fetch someone else just made (API traffic, another worker)
+        if snapshot is not None and (datetime.now(timezone.utc) - snapshot.fetched_at).total_seconds() < self.poll_seconds:
+            return snapshot
+        return await cache.refresh()
+
+    def _evaluate(self, snapshot) -> List[RebalanceSignal]:
+        agent = self.agent
+        protocol_data = [
+            {"name": p.name, "apy": p.apy, "tvl": p.tvl, "risk_score": p.risk_score}
+            for p in snapshot.protocols
+        ]
+        untrusted = {p.name: p.source for p in snapshot.protocols if p.source != "fresh"}
+        signals = []
+        for vault in agent.vaults:
+            current = vault.current_protocol
+            vault_data = [p for p in protocol_data if p["name"] == current or vault.can_target(p["name"])]
+            if agent.decision_mode == "allocation":
+                current_allocation = {
+                    "protocol": current,
+                    "percentage": vault.allocation.get(current, 0.0),
+                    "allocation": dict(vault.allocation),
+                }
+                plan = agent.plan_allocation(vault_data, current_allocation, untrusted)
+                best = max(plan.weights, key=plan.weights.get) if plan.weights else current
+                spread, threshold = plan.net_improvement, agent.allocation_min_improvement
+                crossed = bool(plan.moves) and spread > threshold
+            else:
+                # Pools on stale or fallback data can't be rebalance targets, so they can't trigger one
+                trusted = [p for p in vault_data if p["name"] not in untrusted or p["name"] == current]
+                scores = score_protocols(trusted or vault_data, current)
+                best, spread, threshold = scores.best_protocol, scores.delta, REBALANCE_THRESHOLD_PERCENT
+                crossed = best != current and spread > threshold
+
+            handled = self._handled.get(vault.vault_id)
+            if not crossed:
+                self._handled.pop(vault.vault_id, None)
+            actionable = crossed and (
+                handled is None or handled[0] != best or spread >= handled[1] + self.rearm_spread
+            )
+            signals.append(RebalanceSignal(
+                vault_id=vault.vault_id,
+                current_protocol=current,
+                best_protocol=best,
+                spread=round(spread, 4),
+                threshold=threshold,
+                actionable=actionable,
+            ))
+        return signals
+
+    async def _run_cycle(self, reason: str, due: List[RebalanceSignal]) -> None:
+        self.last_trigger = reason
+        self._last_start = datetime.now(timezone.utc)
+        seen = [self._seen_at.pop(s.vault_id) for s in due if s.vault_id in self._seen_at]
+        for signal in due:
+            self._handled[signal.vault_id] = (signal.best_protocol, signal.spread)
+        detail = ", ".join(f"{s.vault_id}: {s.best_protocol} +{s.spread:.2f}" for s in due)
+        print(f"⚡ Adaptive scheduler starting a cycle ({reason}{': ' + detail if detail else ''})")
+        job, _ = self.agent.cycle_jobs.trigger(source=reason)
+        await asyncio.shield(job.task)
+        if seen and job.finished_at is not None:
+            reaction = (job.finished_at - min(seen)).total_seconds()
+            self.reactions.append(reaction)
+            metrics.CYCLE_REACTION.observe(reaction)
+
+    def status(self) -> SchedulerStatusResponse:
+        reactions = np.array(self.reactions) if self.reactions else None
+        return self.agent.cycle_jobs.summary(
+            mode="adaptive",
+            poll_seconds=self.poll_seconds,
+            polls=self.polls,
+            deferred=self.deferred,
+            last_trigger=self.last_trigger,
+            reaction_p50_seconds=round(float(np.percentile(reactions, 50)), 3) if reactions is not None else None,
+            reaction_p95_seconds=round(float(np.percentile(reactions, 95)), 3) if reactions is not None else None,
+            last_reaction_seconds=round(self.reactions[-1], 3) if self.reactions else None,
+            signals=self.signals,
+        )
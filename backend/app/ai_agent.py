@@ -1,26 +1,267 @@
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
+import asyncio
 import os
 import math
 from datetime import datetime, timezone
 import anthropic
 import json
+import time
 
+from app import metrics
+from app.config import data_path, get_float_env, get_int_env
+from app.cycle_jobs import CycleJobManager
+from app.cycle_trace import CycleTraceRecorder, current_trace
+from app.decision_cache import DecisionCache
+from app.events import EventBroadcaster
 from app.protocols import ProtocolManager
+from app.snapshot_cache import ProtocolSnapshotCache
+from app.timeseries import ApyTimeSeriesStore
+from app.rate_limit import AsyncTokenBucket
 from app.vault_manager import VaultManager
-from app.models import RebalanceDecision
+from app.vault_registry import VaultRegistry
+from app.allocation import optimize_allocation
+from app.models import AllocationPlan, ProtocolSnapshot, RebalanceDecision, RebalanceEvent, VaultCycleStatus
+from app.scoring import (
+    REBALANCE_THRESHOLD_PERCENT,
+    ProtocolScores,
+    risk_adjusted_return,
+    score_protocols,
+)
+
+if TYPE_CHECKING:
+    from app.adaptive_scheduler import AdaptiveCycleScheduler
+    from app.workers import WorkerCoordinator
+
+SYSTEM_PROMPT = f"""You are an AI DeFi optimizer for YieldMind on BNB Chain. YieldMind vaults hold user
+deposits in lending and liquidity protocols and move them when another protocol pays a
+clearly better return for its risk. You decide whether a vault should move; the backend
+executes the move, records it and enforces its own safety checks after you answer.
+
+Metrics
+- apy: annual percentage yield of the pool, in percent (12.5 means 12.5% a year). It is
+  the pool's current rate, not a forecast, and it moves with utilization and rewards.
+- risk_score: 1 (lowest risk) to 10 (highest). Rough meaning of the scale:
+  1-2 battle-tested blue-chip lending markets with deep liquidity;
+  3-4 large, audited protocols with a long track record (PancakeSwap V3, Venus);
+  5-6 younger or more complex protocols, or pools with reward-token or depeg exposure;
+  7-8 small or recently launched pools, unaudited changes, concentrated liquidity;
+  9-10 experimental pools: treat as unsuitable unless the data says otherwise.
+- Risk-adjusted return = APY / (1 + risk_score/10). A 15% pool with risk 5 scores 10.0;
+  a 12% pool with risk 2 scores 10.0 as well. Compare protocols by this value only.
+- delta_percentage is the improvement in risk-adjusted return, in percentage points:
+  risk-adjusted return of the target minus that of the protocol the vault holds now.
+
+Rebalance policy
+- Only rebalance if improvement is > {REBALANCE_THRESHOLD_PERCENT:g}% to avoid gas waste. Every move pays gas,
+  swap fees and slippage, and the vault contract itself rejects on-chain moves whose
+  delta is below {REBALANCE_THRESHOLD_PERCENT:g} percentage points.
+- When the best protocol is the one the vault already holds, or the improvement is at or
+  below the threshold, do not rebalance. Ties and near-ties favour staying put.
+- Do not chase a single spike. An APY far above the other pools (for example several
+  times the median, or above 100%) usually reflects a short reward campaign, a tiny pool
+  or bad data; say so in the reason and prefer holding unless the margin stays large
+  after discounting it.
+- A zero, negative or missing APY means the pool is unusable this cycle. Never pick it as
+  a target; if the vault holds it, moving out is justified by any positive alternative
+  whose improvement clears the threshold.
+- Only recommend protocols that appear in the data you were given, spelled exactly as
+  given. Pools without a live price have already been removed by the backend.
+- The current allocation tells you which protocol the vault holds ("protocol") and, when
+  the vault is split, the percentage held in each ("allocation").
+
+Request types
+- Precomputed metrics: risk-adjusted returns, the best protocol and its delta are already
+  computed with the formula above. Trust them, do not recompute them, check that the
+  conclusion is consistent with the policy, and call recommend_rebalance exactly once.
+- Tool loop: call calculate_risk_adjusted_return once per protocol, in any order, then
+  compare the results and call recommend_rebalance exactly once with your conclusion.
+- Allocation review: a local optimizer has split the vault across protocols under
+  per-protocol caps, a risk budget (weighted-average risk score) and turnover costs. Its
+  net_improvement is the gain in APY after those costs. Approve with review_allocation
+  when the plan is consistent with the data and the policy; reject it when it relies on a
+  suspicious APY, concentrates into a high-risk pool, or gains too little to justify the
+  moves. If current_feasible is false the current split breaks a cap or the risk budget,
+  and moving is required even for a small or negative improvement.
+
+Worked examples (risk-adjusted returns rounded to one decimal)
+- Holding PancakeSwap V3 (12.5% APY, risk 3, score 9.6); Venus 15.2% risk 4 (10.9) and
+  Lista DAO 18.7% risk 5 (12.5). Lista DAO leads by 2.9 points: rebalance to Lista DAO.
+- Holding Venus (15.2%, risk 4, score 10.9); Lista DAO 17.5% risk 5 (11.7). The gain is
+  0.8 points, below the threshold: do not rebalance, target Lista DAO, delta 0.8.
+- Holding Venus (score 10.9); a new pool shows 240% APY with risk 7 (141.2). The APY is
+  far outside the range of the other pools: hold and name the outlier in the reason.
+- Holding a pool whose APY dropped to 0; Venus scores 10.9. Rebalance to Venus: the
+  current pool earns nothing and the improvement clears the threshold.
+
+Answer format
+- recommend_rebalance: should_rebalance is true only when the policy allows the move.
+  target_protocol is the best protocol you found, even when you do not rebalance.
+  delta_percentage is that protocol's improvement over the current one, rounded to two
+  decimals, and may be zero or negative.
+- reason: one or two plain sentences (no markdown, under 200 characters) naming the
+  protocols and the numbers that decided it, for example "Venus leads PancakeSwap V3 by
+  2.8 points risk-adjusted (10.9 vs 8.1); above the 2-point threshold".
+- Respond only through the tool call; any text outside it is ignored.
+"""
+
+CALCULATE_RISK_ADJUSTED_RETURN_TOOL = {
+    "name": "calculate_risk_adjusted_return",
+    "description": "Calculate risk-adjusted return (Sharpe-like metric) for a protocol",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "apy": {"type": "number", "description": "Annual Percentage Yield"},
+            "risk_score": {"type": "number", "description": "Risk score from 1-10"}
+        },
+        "required": ["apy", "risk_score"]
+    }
+}
+
+RECOMMEND_REBALANCE_TOOL = {
+    "name": "recommend_rebalance",
+    "description": "Recommend whether to rebalance and to which protocol",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "should_rebalance": {"type": "boolean"},
+            "target_protocol": {"type": "string"},
+            "delta_percentage": {"type": "number"},
+            "reason": {"type": "string"}
+        },
+        "required": ["should_rebalance", "target_protocol", "delta_percentage", "reason"]
+    }
+}
+
+REVIEW_ALLOCATION_TOOL = {
+    "name": "review_allocation",
+    "description": "Approve or reject the allocation plan computed by the local optimizer",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "approve": {"type": "boolean"},
+            "reason": {"type": "string"}
+        },
+        "required": ["approve", "reason"]
+    }
+}
+
+# Static request prefix, built once. The cache_control breakpoint on the system
+# block caches tools + system together. Anthropic only caches prefixes of at least
+# PROMPT_CACHE_MIN_TOKENS (2048 on Haiku models), which is why the whole decision
+# policy lives in the system prompt rather than in each request.
+PROMPT_CACHE_MIN_TOKENS = 1024
+CACHED_SYSTEM = [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]
+# Vault status suffix per decision path that did not make its own Claude call
+_PATH_NOTES = {"cached": " (cached decision)", "shared": " (decision shared with another vault)"}
+TOOLS = [CALCULATE_RISK_ADJUSTED_RETURN_TOOL, RECOMMEND_REBALANCE_TOOL]
+SINGLE_ROUND_TOOLS = [RECOMMEND_REBALANCE_TOOL]
+ALLOCATION_TOOLS = [REVIEW_ALLOCATION_TOOL]
+DECISION_MODES = ("single", "tools", "allocation")
 
 class AIAgent:
     def __init__(self):
+        # Created first: every status transition below is published to it
+        self.events = EventBroadcaster(
+            queue_size=get_int_env("STREAM_QUEUE_SIZE", 100),
+            max_subscribers=get_int_env("STREAM_MAX_SUBSCRIBERS", 1000),
+        )
         api_key = os.getenv("ANTHROPIC_API_KEY")
         self.model = os.getenv("ANTHROPIC_MODEL", "claude-opus-4-20250514")
         if os.getenv("ANTHROPIC_MODEL") and not self.model.startswith("claude-"):
             print(f"Warning: ANTHROPIC_MODEL={self.model!r} may not support tool use")
-        self.client = anthropic.Anthropic(api_key=api_key) if api_key else None
+        self.client = anthropic.AsyncAnthropic(api_key=api_key) if api_key else None
+        self.decision_mode = os.getenv("ANTHROPIC_DECISION_MODE", "single")
+        if self.decision_mode not in DECISION_MODES:
+            print(f"Invalid ANTHROPIC_DECISION_MODE={self.decision_mode!r}; using 'single'")
+            self.decision_mode = "single"
+        self.max_tool_rounds = 6
+        # Warn once if the API never reads or writes the cached prefix
+        self._prompt_cache_warned = False
+        # Allocation mode: the local optimizer proposes a split, Claude reviews it
+        self.allocation_max_percent = get_float_env("ALLOCATION_MAX_PERCENT", 60.0)
+        self.allocation_risk_budget = get_float_env("ALLOCATION_RISK_BUDGET", 4.0)
+        # One-off cost of moving capital, amortized over the expected holding period
+        self.allocation_turnover_cost = (
+            get_float_env("ALLOCATION_TURNOVER_COST_BPS", 10.0) / 100
+            * 365 / max(1.0, get_float_env("ALLOCATION_HORIZON_DAYS", 30.0))
+        )
+        self.allocation_min_improvement = get_float_env("ALLOCATION_MIN_IMPROVEMENT", 0.25)
         self.protocol_manager = ProtocolManager()
-        self.vault_manager = VaultManager()
+        self.protocol_cache = ProtocolSnapshotCache(
+            self.protocol_manager,
+            ttl_seconds=get_float_env("PROTOCOL_CACHE_TTL_SECONDS", 60.0),
+        )
+        # Every fetched snapshot (API refreshes and cycles) lands in the APY history
+        self.apy_history = ApyTimeSeriesStore(
+            os.getenv("APY_HISTORY_DIR", data_path("apy_history")),
+            capacity=get_int_env("APY_HISTORY_CAPACITY", 525_600),
+        )
+        # Only one process may append to the series files (see app/workers.py)
+        self.records_history = True
+        self.protocol_cache.add_listener(self.record_snapshot)
+        self.protocol_cache.add_listener(self._publish_snapshot)
+        self.decision_cache = DecisionCache(
+            apy_bucket=get_float_env("DECISION_CACHE_APY_BUCKET", 0.5),
+            max_entries=get_int_env("DECISION_CACHE_SIZE", 128),
+            ttl_seconds=get_float_env("DECISION_CACHE_TTL_SECONDS", 1800.0),
+        )
+        # Concurrent vaults asking the same question share one in-flight Claude call
+        self._inflight_decisions: Dict[Tuple, asyncio.Task] = {}
+        self.llm_rate_limiter = AsyncTokenBucket(
+            rate_per_minute=get_float_env("LLM_CALLS_PER_MINUTE", 30.0),
+            burst=get_int_env("LLM_BURST", 5),
+        )
+        self.vaults = VaultRegistry()
+        self.vault_concurrency = max(1, get_int_env("VAULT_CYCLE_CONCURRENCY", 8))
+        self.vault_status: Dict[str, VaultCycleStatus] = {
+            vault.vault_id: VaultCycleStatus(vault_id=vault.vault_id, status="Initializing...")
+            for vault in self.vaults
+        }
         self.status = "Initializing..."
         self.last_run: Optional[datetime] = None
         self.last_error: Optional[str] = None
+        # All cycle triggers (API and scheduler) go through here so cycles never overlap
+        self.cycle_jobs = CycleJobManager(self)
+        # Every cycle's inputs, Claude exchanges and timings, for replay.py (empty dir disables)
+        self.tracer = CycleTraceRecorder(
+            os.getenv("CYCLE_TRACE_DIR", data_path("traces")) or None,
+            max_bytes=get_int_env("CYCLE_TRACE_MAX_MB", 16) * 1024 * 1024,
+            max_files=get_int_env("CYCLE_TRACE_FILES", 8),
+        )
+        # Set when running as one of several workers (LEADER_ELECTION=1)
+        self.coordinator: Optional["WorkerCoordinator"] = None
+        # Set when cycles are event-driven (CYCLE_SCHEDULER=adaptive)
+        self.adaptive_scheduler: Optional["AdaptiveCycleScheduler"] = None
+
+    @property
+    def status(self) -> str:
+        return self._status
+
+    @status.setter
+    def status(self, value: str) -> None:
+        self._status = value
+        self.events.publish("status", {
+            "status": value,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        })
+
+    @property
+    def vault_manager(self) -> VaultManager:
+        """The default vault (single-vault deployments only have this one)"""
+        return self.vaults.default
+
+    def _set_vault_status(self, vault_id: str, status: str) -> None:
+        self.vault_status[vault_id].status = status
+        self.events.publish("vault_status", {"vault_id": vault_id, "status": status})
+        if len(self.vaults) == 1:
+            self.status = status
+
+    def record_snapshot(self, snapshot: ProtocolSnapshot) -> None:
+        if self.records_history:
+            self.apy_history.record_snapshot(snapshot)
+
+    def _publish_snapshot(self, snapshot: ProtocolSnapshot) -> None:
+        self.events.publish("protocols", snapshot.model_dump(mode="json"))
 
     def _missing_api_key_decision(self) -> RebalanceDecision:
         return RebalanceDecision(
@@ -43,8 +284,11 @@ class AIAgent:
         return normalized
         
     async def run_cycle(self):
-        """Main AI optimization cycle."""
+        """Main AI optimization cycle for every registered vault."""
         self.last_error = None
+        metrics.cycle_started()
+        started = time.perf_counter()
+        trace = self.tracer.start(self.model, self.decision_mode, self.vault_concurrency)
         try:
             if self.client is None:
                 self.status = self._missing_api_key_decision().reason
@@ -57,8 +301,12 @@ class AIAgent:
             print(f"AI Agent cycle started at {datetime.now(timezone.utc)}")
             print(f"{'='*60}")
             
-            # Fetch APY data from protocols
-            protocols = await self.protocol_manager.fetch_all_apys()
+            # Fetch APY data once for all vaults (also refreshes the snapshot the API serves)
+            fetch_started = time.perf_counter()
+            snapshot = await self.protocol_cache.refresh()
+            protocols = snapshot.protocols
+            trace.add_stage("fetch_protocols", time.perf_counter() - fetch_started)
+            trace.record_protocols(protocols)
             
             self.status = f"Analyzing with {self.model}..."
             
@@ -72,20 +320,27 @@ class AIAgent:
                 }
                 for p in protocols
             ]
-            
-            # Get current vault allocation
-            current_allocation = await self.vault_manager.get_current_allocation()
-            
-            # Use Claude to analyze and decide
-            decision = await self.analyze_with_claude(protocol_data, current_allocation)
 
-            # Execute rebalance if needed
-            if decision.should_rebalance:
-                self.status = "Executing rebalance..."
-                await self.execute_rebalance(decision)
-                self.status = f"Rebalanced: {decision.reason}"
-            else:
-                self.status = "Optimal - No rebalance needed"
+            # Pools not priced by a live source this cycle; never a rebalance leg
+            untrusted = {p.name: p.source for p in protocols if p.source != "fresh"}
+
+            semaphore = asyncio.Semaphore(self.vault_concurrency)
+
+            async def run_limited(vault: VaultManager) -> None:
+                async with semaphore:
+                    await self._run_vault_cycle(vault, protocol_data, untrusted)
+
+            await asyncio.gather(*(run_limited(vault) for vault in self.vaults))
+
+            failed = [s for s in self.vault_status.values() if s.last_error is not None]
+            if failed:
+                self.last_error = "; ".join(f"{s.vault_id}: {s.last_error}" for s in failed)
+            if len(self.vaults) > 1:
+                rebalanced = sum(1 for s in self.vault_status.values() if s.status.startswith(("Rebalanced", "Reallocated")))
+                self.status = (
+                    f"Cycle complete for {len(self.vaults)} vaults: "
+                    f"{rebalanced} rebalanced, {len(failed)} failed"
+                )
             
             self.last_run = datetime.now(timezone.utc)
             print(f"Cycle completed: {self.status}")
@@ -94,67 +349,450 @@ class AIAgent:
             self.status = f"Error: {str(e)}"
             self.last_error = str(e)
             self.last_run = datetime.now(timezone.utc)
+            metrics.ERRORS.labels("cycle").inc()
             print(f"Error in AI cycle: {e}")
+        finally:
+            metrics.CYCLE_DURATION.observe(time.perf_counter() - started)
+            metrics.LAST_CYCLE_TIMESTAMP.set_to_current_time()
+            self.tracer.finish(trace, self.status, self.last_error)
+
+    @staticmethod
+    def _untrusted_data_hold(
+        untrusted: Dict[str, str], current: Optional[str], target: str, delta: float
+    ) -> Optional[RebalanceDecision]:
+        """Hold instead of moving when either leg is priced from stale or fallback data"""
+        suspect = [name for name in (current, target) if name in untrusted]
+        if not suspect:
+            return None
+        return RebalanceDecision(
+            should_rebalance=False,
+            target_protocol="",
+            delta_percentage=round(delta, 4),
+            reason="Holding: " + ", ".join(f"{name} APY is {untrusted[name]}" for name in suspect)
+                   + f" (would move to {target})",
+        )
+
+    async def _run_vault_cycle(
+        self,
+        vault: VaultManager,
+        protocol_data: List[Dict[str, Any]],
+        untrusted: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Decide and (if needed) rebalance one vault against the shared protocol data"""
+        vault_status = self.vault_status[vault.vault_id]
+        vault_status.last_error = None
+        untrusted = untrusted or {}
+        started = time.perf_counter()
+        current_allocation = decision = path = None
+        try:
+            # Get current vault allocation
+            current_allocation = await vault.get_current_allocation()
+            current = current_allocation.get("protocol")
+            # Pools the vault contract has no address for (e.g. from PROTOCOLS_FILE) can't be targets
+            protocol_data = [p for p in protocol_data if p["name"] == current or vault.can_target(p["name"])]
+            if self.decision_mode == "allocation":
+                decision, path = await self._run_allocation_cycle(vault, protocol_data, current_allocation, untrusted)
+                return
+            
+            # Score locally first; only real rebalance candidates need Claude
+            scores = score_protocols(protocol_data, current)
+            hold = None
+            if scores.is_rebalance_candidate:
+                hold = self._untrusted_data_hold(untrusted, current, scores.best_protocol, scores.delta)
+            if hold is not None:
+                decision = hold
+                path = "untrusted_data"
+                print(f"AI Decision [{vault.vault_id}]: {decision.reason} (Claude skipped)")
+            elif scores.is_rebalance_candidate:
+                decision, path = await self._analyze(protocol_data, current_allocation, scores)
+                if decision.should_rebalance:
+                    hold = self._untrusted_data_hold(
+                        untrusted, current, decision.target_protocol, decision.delta_percentage
+                    )
+                    if hold is not None:
+                        decision = hold
+                        print(f"AI Decision [{vault.vault_id}] overridden: {decision.reason}")
+            else:
+                decision = scores.no_rebalance_decision()
+                path = "local"
+                print(f"AI Decision [{vault.vault_id}]: {decision.reason} (local fast path, Claude skipped)")
+            metrics.DECISIONS.labels("rebalance" if decision.should_rebalance else "hold", path).inc()
+
+            # Execute rebalance if needed
+            if decision.should_rebalance:
+                self._set_vault_status(vault.vault_id, "Executing rebalance...")
+                if await self.execute_rebalance(decision, vault) is not None:
+                    status = f"Rebalanced: {decision.reason}"
+                else:
+                    status = f"Dry run (no signer): {decision.reason}"
+            elif hold is not None:
+                status = decision.reason
+            else:
+                status = "Optimal - No rebalance needed"
+            status += _PATH_NOTES.get(path, "")
+            self._set_vault_status(vault.vault_id, status)
+
+        except Exception as e:
+            vault_status.last_error = str(e)
+            metrics.ERRORS.labels("vault_cycle").inc()
+            self._set_vault_status(vault.vault_id, f"Error: {str(e)}")
+            print(f"Error in AI cycle for vault {vault.vault_id}: {e}")
+        finally:
+            vault_status.last_run = datetime.now(timezone.utc)
+            trace = current_trace()
+            if trace is not None:
+                trace.record_vault(
+                    vault.vault_id, current_allocation, decision, path,
+                    vault_status.status, vault_status.last_error, time.perf_counter() - started,
+                    onchain=vault.is_onchain,
+                )
     
+    def plan_allocation(
+        self,
+        protocol_data: List[Dict[str, Any]],
+        current_allocation: Dict[str, Any],
+        untrusted: Optional[Dict[str, str]] = None,
+    ) -> AllocationPlan:
+        """Optimizer plan for one vault; pools without fresh data are frozen at their weight"""
+        held = current_allocation.get("allocation") or {
+            current_allocation.get("protocol"): current_allocation.get("percentage", 100.0)
+        }
+        names = [p["name"] for p in protocol_data]
+        caps, floors = [], []
+        for name in names:
+            pool = self.protocol_manager.pools.get(name)
+            cap = pool.max_allocation if pool is not None and pool.max_allocation is not None else self.allocation_max_percent
+            if untrusted and name in untrusted:
+                cap = held.get(name, 0.0)
+                floors.append(cap)
+            else:
+                floors.append(0.0)
+            caps.append(cap)
+        return optimize_allocation(
+            names,
+            [p["apy"] for p in protocol_data],
+            [p["risk_score"] for p in protocol_data],
+            held,
+            caps=caps,
+            floors=floors,
+            risk_budget=self.allocation_risk_budget,
+            turnover_cost=self.allocation_turnover_cost,
+        )
+
+    async def _run_allocation_cycle(
+        self,
+        vault: VaultManager,
+        protocol_data: List[Dict[str, Any]],
+        current_allocation: Dict[str, Any],
+        untrusted: Dict[str, str],
+    ) -> Tuple[RebalanceDecision, str]:
+        """Allocation mode: optimize locally, have Claude review real plans, apply the moves"""
+        plan = self.plan_allocation(protocol_data, current_allocation, untrusted)
+        self.vault_status[vault.vault_id].allocation_plan = plan
+        apys = {p["name"]: p["apy"] for p in protocol_data}
+        worthwhile = plan.net_improvement >= self.allocation_min_improvement or not plan.current_feasible
+        blocker = vault.onchain_plan_blocker(plan, apys) if plan.moves and worthwhile else None
+        if plan.moves and worthwhile and blocker is None:
+            decision, path = await self._analyze(protocol_data, current_allocation, plan=plan)
+        elif blocker is not None:
+            # Claude would review a plan the vault contract can't execute
+            decision = RebalanceDecision(
+                should_rebalance=False,
+                target_protocol="",
+                delta_percentage=plan.net_improvement,
+                reason=f"Local optimizer: holding, {blocker}",
+            )
+            path = "local"
+            print(f"AI Decision [{vault.vault_id}]: {decision.reason} (Claude skipped)")
+        else:
+            decision = RebalanceDecision(
+                should_rebalance=False,
+                target_protocol="",
+                delta_percentage=plan.net_improvement,
+                reason=(
+                    f"Local optimizer: current allocation is within costs of the best split "
+                    f"(net improvement {plan.net_improvement:.2f}%)"
+                ),
+            )
+            path = "local"
+            print(f"AI Decision [{vault.vault_id}]: {decision.reason} (Claude skipped)")
+        metrics.DECISIONS.labels("rebalance" if decision.should_rebalance else "hold", path).inc()
+
+        if decision.should_rebalance:
+            self._set_vault_status(vault.vault_id, "Executing allocation...")
+            await self.execute_allocation(plan, decision, vault, apys)
+            if vault.dry_run:
+                status = f"Dry run (no signer): {decision.reason}"
+            else:
+                status = f"Reallocated ({len(plan.moves)} moves): {decision.reason}"
+        elif blocker is not None:
+            status = decision.reason
+        elif plan.moves and worthwhile:
+            status = f"Plan rejected: {decision.reason}"
+        else:
+            status = "Optimal - No rebalance needed"
+        status += _PATH_NOTES.get(path, "")
+        self._set_vault_status(vault.vault_id, status)
+        return decision, path
+
     async def analyze_with_claude(
         self, 
         protocols: List[Dict[str, Any]], 
-        current_allocation: Dict[str, float]
+        current_allocation: Dict[str, float],
+        scores: Optional[ProtocolScores] = None,
     ) -> RebalanceDecision:
         """Use Claude to analyze protocols and make rebalance decision"""
+        decision, _ = await self._analyze(protocols, current_allocation, scores)
+        return decision
+
+    async def _analyze(
+        self,
+        protocols: List[Dict[str, Any]],
+        current_allocation: Dict[str, float],
+        scores: Optional[ProtocolScores] = None,
+        plan: Optional[AllocationPlan] = None,
+    ) -> Tuple[RebalanceDecision, str]:
+        """Decision for one market state, and where it came from.
 
+        The path is "claude" for this call's own request, "cached" for a
+        decision cache hit and "shared" for a request another vault had in flight.
+        """
         if self.client is None:
-            return self._missing_api_key_decision()
-        
-        # Define tools for Claude
-        tools = [
-            {
-                "name": "calculate_risk_adjusted_return",
-                "description": "Calculate risk-adjusted return (Sharpe-like metric) for a protocol",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "apy": {"type": "number", "description": "Annual Percentage Yield"},
-                        "risk_score": {"type": "number", "description": "Risk score from 1-10"}
-                    },
-                    "required": ["apy", "risk_score"]
-                }
-            },
-            {
-                "name": "recommend_rebalance",
-                "description": "Recommend whether to rebalance and to which protocol",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "should_rebalance": {"type": "boolean"},
-                        "target_protocol": {"type": "string"},
-                        "delta_percentage": {"type": "number"},
-                        "reason": {"type": "string"}
-                    },
-                    "required": ["should_rebalance", "target_protocol", "delta_percentage", "reason"]
+            return self._missing_api_key_decision(), "claude"
+
+        # Reuse the previous decision when the market only moved by noise
+        cache_key = self.decision_cache.make_key(protocols, current_allocation)
+        cached = self.decision_cache.get(cache_key)
+        if cached is not None:
+            print(f"AI Decision (cached): {cached.reason}")
+            trace = current_trace()
+            if trace is not None:
+                trace.record_cache_hit(current_allocation, cached)
+            return cached, "cached"
+
+        # Vaults in the same state join the call already in flight
+        task = self._inflight_decisions.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(
+                self._decide_uncached(cache_key, protocols, current_allocation, scores, plan)
+            )
+            self._inflight_decisions[cache_key] = task
+            task.add_done_callback(lambda _: self._inflight_decisions.pop(cache_key, None))
+            return (await asyncio.shield(task)).model_copy(), "claude"
+
+        decision = await asyncio.shield(task)
+        print(f"AI Decision (shared): {decision.reason}")
+        return decision.model_copy(), "shared"
+
+    async def _decide_uncached(
+        self,
+        cache_key: Tuple,
+        protocols: List[Dict[str, Any]],
+        current_allocation: Dict[str, float],
+        scores: Optional[ProtocolScores],
+        plan: Optional[AllocationPlan] = None,
+    ) -> RebalanceDecision:
+        await self.llm_rate_limiter.acquire()
+
+        if plan is not None:
+            decision, completed = await self._review_allocation(protocols, current_allocation, plan)
+        elif self.decision_mode == "single":
+            if scores is None:
+                scores = score_protocols(protocols, current_allocation.get("protocol"))
+            decision, completed = await self._decide_single_round(protocols, current_allocation, scores)
+        else:
+            decision, completed = await self._decide_with_tool_loop(protocols, current_allocation)
+
+        # Only cache real recommendations, never call failures or invalid output
+        if completed:
+            self.decision_cache.put(cache_key, decision)
+
+        print(f"AI Decision: {decision.reason}")
+        print(f"Should rebalance: {decision.should_rebalance}")
+        if decision.should_rebalance:
+            print(f"Target: {decision.target_protocol}")
+            print(f"Delta: {decision.delta_percentage:.2f}%")
+
+        return decision
+
+    async def _create_message(self, **kwargs: Any) -> Any:
+        """Send one request through the prompt-caching endpoint"""
+        started = time.perf_counter()
+        trace = current_trace()
+        request = {"system": CACHED_SYSTEM, **kwargs}
+        try:
+            message = await self.client.beta.prompt_caching.messages.create(model=self.model, **request)
+        except Exception as e:
+            metrics.LLM_REQUEST_DURATION.labels(self.decision_mode, "error").observe(time.perf_counter() - started)
+            metrics.ERRORS.labels("llm").inc()
+            if trace is not None:
+                trace.record_llm(request, None, e, time.perf_counter() - started)
+            raise
+        metrics.LLM_REQUEST_DURATION.labels(self.decision_mode, "ok").observe(time.perf_counter() - started)
+        if trace is not None:
+            trace.record_llm(request, message, None, time.perf_counter() - started)
+        usage = getattr(message, "usage", None)
+        if usage is not None:
+            metrics.record_usage(usage)
+            print(
+                f"Claude usage: input={usage.input_tokens} output={usage.output_tokens} "
+                f"cache_read={getattr(usage, 'cache_read_input_tokens', None)} "
+                f"cache_write={getattr(usage, 'cache_creation_input_tokens', None)}"
+            )
+            cache_tokens = (getattr(usage, "cache_read_input_tokens", None) or 0) + (
+                getattr(usage, "cache_creation_input_tokens", None) or 0
+            )
+            if not cache_tokens and not self._prompt_cache_warned:
+                self._prompt_cache_warned = True
+                print(
+                    f"Warning: prompt cache not used by {self.model}; the tools + system prefix may be "
+                    f"below the model's cacheable minimum ({PROMPT_CACHE_MIN_TOKENS} tokens, 2048 on Haiku)"
+                )
+        return message
+
+    async def _decide_single_round(
+        self,
+        protocols: List[Dict[str, Any]],
+        current_allocation: Dict[str, float],
+        scores: ProtocolScores,
+    ) -> Tuple[RebalanceDecision, bool]:
+        """One model round: send precomputed metrics and force recommend_rebalance"""
+        precomputed = {
+            "protocols": [
+                {
+                    "name": p["name"],
+                    "apy": p["apy"],
+                    "risk_score": p["risk_score"],
+                    "risk_adjusted_return": round(float(scores.scores[i]), 4),
                 }
-            }
-        ]
-        
-        # Create analysis prompt
-        prompt = f"""You are an AI DeFi optimizer for YieldMind on BNB Chain.
+                for i, p in enumerate(protocols)
+            ],
+            "current_allocation": current_allocation,
+            "best_protocol": scores.best_protocol,
+            "delta": round(scores.delta, 4),
+            "threshold": REBALANCE_THRESHOLD_PERCENT,
+        }
+        prompt = (
+            "Risk-adjusted returns are already computed. Review them and call "
+            "recommend_rebalance exactly once.\n"
+            + json.dumps(precomputed, separators=(",", ":"))
+        )
+
+        metrics.LLM_TOOL_ROUNDS.labels("single").observe(1)
+        try:
+            message = await self._create_message(
+                max_tokens=500,
+                tools=SINGLE_ROUND_TOOLS,
+                tool_choice={"type": "tool", "name": "recommend_rebalance"},
+                messages=[{"role": "user", "content": prompt}],
+            )
+        except Exception as e:
+            return RebalanceDecision(
+                should_rebalance=False,
+                target_protocol="",
+                delta_percentage=0.0,
+                reason=f"Claude call failed: {e}"
+            ), False
 
-Current Protocol Data:
-{json.dumps(protocols, indent=2)}
+        for block in message.content:
+            if getattr(block, "type", None) != "tool_use" or getattr(block, "name", "") != "recommend_rebalance":
+                continue
+            try:
+                return RebalanceDecision(**getattr(block, "input", {})), True
+            except Exception as e:
+                return RebalanceDecision(
+                    should_rebalance=False,
+                    target_protocol="",
+                    delta_percentage=0.0,
+                    reason=f"Invalid recommend_rebalance input: {e}"
+                ), False
+
+        return RebalanceDecision(
+            should_rebalance=False,
+            target_protocol="",
+            delta_percentage=0.0,
+            reason=f"AI did not return recommend_rebalance (stop_reason={message.stop_reason})"
+        ), False
+
+    async def _review_allocation(
+        self,
+        protocols: List[Dict[str, Any]],
+        current_allocation: Dict[str, Any],
+        plan: AllocationPlan,
+    ) -> Tuple[RebalanceDecision, bool]:
+        """One model round reviewing a finished optimizer plan"""
+        target = max(plan.weights, key=plan.weights.get)
+        prompt = (
+            "A local optimizer computed this allocation under per-protocol caps "
+            f"({self.allocation_max_percent:g}% default), a risk budget (weighted-average "
+            "risk score) and turnover costs. Check it against the data and call "
+            "review_allocation exactly once.\n"
+            + json.dumps({
+                "protocols": protocols,
+                "current_allocation": current_allocation,
+                "plan": plan.model_dump(),
+            }, separators=(",", ":"))
+        )
+
+        metrics.LLM_TOOL_ROUNDS.labels("allocation").observe(1)
+        try:
+            message = await self._create_message(
+                max_tokens=500,
+                tools=ALLOCATION_TOOLS,
+                tool_choice={"type": "tool", "name": "review_allocation"},
+                messages=[{"role": "user", "content": prompt}],
+            )
+        except Exception as e:
+            return RebalanceDecision(
+                should_rebalance=False,
+                target_protocol="",
+                delta_percentage=0.0,
+                reason=f"Claude call failed: {e}"
+            ), False
+
+        for block in message.content:
+            if getattr(block, "type", None) != "tool_use" or getattr(block, "name", "") != "review_allocation":
+                continue
+            review = getattr(block, "input", {})
+            if not isinstance(review.get("approve"), bool) or not isinstance(review.get("reason"), str):
+                return RebalanceDecision(
+                    should_rebalance=False,
+                    target_protocol="",
+                    delta_percentage=0.0,
+                    reason=f"Invalid review_allocation input: {review}"
+                ), False
+            return RebalanceDecision(
+                should_rebalance=review["approve"],
+                target_protocol=target,
+                delta_percentage=plan.net_improvement,
+                reason=review["reason"],
+            ), True
+
+        return RebalanceDecision(
+            should_rebalance=False,
+            target_protocol="",
+            delta_percentage=0.0,
+            reason=f"AI did not return review_allocation (stop_reason={message.stop_reason})"
+        ), False
+
+    async def _decide_with_tool_loop(
+        self,
+        protocols: List[Dict[str, Any]],
+        current_allocation: Dict[str, float],
+    ) -> Tuple[RebalanceDecision, bool]:
+        """Multi-round tool loop where Claude computes the metrics itself"""
+        # Create analysis prompt (compact JSON: it is resent on every round)
+        prompt = f"""Current Protocol Data:
+{json.dumps(protocols, separators=(",", ":"))}
 
 Current Vault Allocation:
-{json.dumps(current_allocation, indent=2)}
+{json.dumps(current_allocation, separators=(",", ":"))}
 
 Your task:
 1. Calculate risk-adjusted returns for each protocol using the calculate_risk_adjusted_return tool
 2. Compare the best risk-adjusted return with the current allocation
-3. If the delta is > 2%, recommend a rebalance using the recommend_rebalance tool
-4. If delta <= 2%, recommend no rebalance
-
-Consider:
-- Higher APY is better but must be balanced with risk
-- Risk-adjusted return = APY / (1 + risk_score/10)
-- Only rebalance if improvement is > 2% to avoid gas waste
+3. If the delta is > {REBALANCE_THRESHOLD_PERCENT:g}%, recommend a rebalance using the recommend_rebalance tool
+4. If delta <= {REBALANCE_THRESHOLD_PERCENT:g}%, recommend no rebalance
 """
 
         decision = RebalanceDecision(
@@ -165,26 +803,27 @@ Consider:
         )
 
         messages: List[Dict[str, Any]] = [{"role": "user", "content": prompt}]
-        max_tool_rounds = 6
+        max_tool_rounds = self.max_tool_rounds
+        rounds = 0
         got_recommendation = False
         first_tool_error: Optional[str] = None
         last_stop_reason: str = "not_started"
 
-        for _ in range(max_tool_rounds):
+        for rounds in range(1, max_tool_rounds + 1):
             try:
-                message = self.client.messages.create(
-                    model=self.model,
+                message = await self._create_message(
                     max_tokens=2000,
-                    tools=tools,
+                    tools=TOOLS,
                     messages=messages
                 )
             except Exception as e:
+                metrics.LLM_TOOL_ROUNDS.labels("tools").observe(rounds)
                 return RebalanceDecision(
                     should_rebalance=False,
                     target_protocol="",
                     delta_percentage=0.0,
                     reason=f"Claude call failed: {e}"
-                )
+                ), False
 
             last_stop_reason = message.stop_reason
 
@@ -228,11 +867,7 @@ Consider:
                     if sanitized:
                         print(f"Sanitized calculate_risk_adjusted_return input: apy={apy_raw}, risk_score={risk_raw}")
 
-                    denom = 1 + risk_score / 10
-                    if not math.isfinite(denom) or abs(denom) < 1e-9:
-                        metric = 0.0
-                    else:
-                        metric = apy / denom
+                    metric = risk_adjusted_return(apy, risk_score)
                     tool_results.append({
                         "type": "tool_result",
                         "tool_use_id": tool_use_id,
@@ -270,9 +905,14 @@ Consider:
                         "content": json.dumps({"error": err})
                     })
 
+            if got_recommendation:
+                # No need for another round trip just to acknowledge the recommendation
+                break
+
             messages.append({"role": "assistant", "content": self._normalize_content_blocks(message.content)})
             messages.append({"role": "user", "content": tool_results})
 
+        metrics.LLM_TOOL_ROUNDS.labels("tools").observe(rounds)
         if not got_recommendation:
             extra = f"; tool_error={first_tool_error}" if first_tool_error else ""
             decision = RebalanceDecision(
@@ -285,22 +925,77 @@ Consider:
                 )
             )
 
-        print(f"AI Decision: {decision.reason}")
-        print(f"Should rebalance: {decision.should_rebalance}")
-        if decision.should_rebalance:
-            print(f"Target: {decision.target_protocol}")
-            print(f"Delta: {decision.delta_percentage:.2f}%")
-
-        return decision
+        return decision, got_recommendation
     
-    async def execute_rebalance(self, decision: RebalanceDecision):
-        """Execute the rebalance on-chain"""
+    def resume_pending_transactions(self) -> None:
+        """Pick up receipts of rebalances submitted before a restart (leader only)"""
+        for vault in self.vaults:
+            resumed = vault.resume_pending(on_update=lambda event, vault=vault: self._publish_rebalance(vault, event))
+            if resumed:
+                print(f"Watching {resumed} pending rebalance transaction(s) of {vault.vault_id} from before the restart")
+
+    def _publish_rebalance(self, vault: VaultManager, event: RebalanceEvent) -> None:
+        payload = event.model_dump(mode="json")
+        payload["vault_id"] = vault.vault_id
+        self.events.publish("rebalance", payload)
+
+    async def execute_rebalance(self, decision: RebalanceDecision, vault: Optional[VaultManager] = None) -> Optional[str]:
+        """Execute the rebalance on-chain; None on a dry run (no signer)"""
+        vault = vault or self.vault_manager
+        started = time.perf_counter()
         try:
-            tx_hash = await self.vault_manager.execute_rebalance(
+            tx_hash = await vault.execute_rebalance(
                 target_protocol=decision.target_protocol,
-                reason=decision.reason
+                reason=decision.reason,
+                delta_percentage=decision.delta_percentage,
+                on_update=lambda event: self._publish_rebalance(vault, event),
             )
+            if tx_hash is None:
+                return None
             print(f"Rebalance executed: {tx_hash}")
+            event = vault.history.latest(vault.vault_id)
+            if event is not None:
+                self._publish_rebalance(vault, event)
+            return tx_hash
         except Exception as e:
+            metrics.ERRORS.labels("rebalance").inc()
             print(f"Rebalance execution failed: {e}")
             raise
+        finally:
+            metrics.REBALANCE_DURATION.observe(time.perf_counter() - started)
+            trace = current_trace()
+            if trace is not None:
+                trace.add_stage("execute", time.perf_counter() - started)
+
+    async def execute_allocation(
+        self,
+        plan: AllocationPlan,
+        decision: RebalanceDecision,
+        vault: Optional[VaultManager] = None,
+        apys: Optional[Dict[str, float]] = None,
+    ) -> List[str]:
+        """Apply an approved allocation plan; `apys` are the cycle's APYs by protocol name"""
+        vault = vault or self.vault_manager
+        started = time.perf_counter()
+        try:
+            tx_hashes = await vault.execute_allocation(
+                plan,
+                reason=decision.reason,
+                apys=apys or {},
+                on_update=lambda event: self._publish_rebalance(vault, event),
+            )
+            print(f"Allocation executed: {len(tx_hashes)} transaction(s)")
+            if tx_hashes:
+                events, _ = vault.history.query(limit=len(tx_hashes), vault_id=vault.vault_id)
+                for event in reversed(events):
+                    self._publish_rebalance(vault, event)
+            return tx_hashes
+        except Exception as e:
+            metrics.ERRORS.labels("rebalance").inc()
+            print(f"Allocation execution failed: {e}")
+            raise
+        finally:
+            metrics.REBALANCE_DURATION.observe(time.perf_counter() - started)
+            trace = current_trace()
+            if trace is not None:
+                trace.add_stage("execute", time.perf_counter() - started)
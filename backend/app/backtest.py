@@ -0,0 +1,322 @@
+from typing import Dict, List, Mapping, Optional, Sequence
+import csv
+from datetime import datetime
+import numpy as np
+
+from app.adapters import PoolConfig
+from app.scoring import REBALANCE_THRESHOLD_PERCENT, RISK_DIVISOR
+from app.timeseries import ApyTimeSeriesStore
+
+YEAR_SECONDS = 365 * 24 * 3600
+DEFAULT_STEP_SECONDS = 300
+# Steps scanned per block while looking for the next switch
+_SCAN_BLOCK = 64
+
+
+class ApyHistory:
+    """APY samples (percent) on a regular time grid, one column per protocol"""
+
+    def __init__(
+        self,
+        names: Sequence[str],
+        apys: np.ndarray,
+        risk_scores: Sequence[float],
+        step_seconds: float = DEFAULT_STEP_SECONDS,
+        start_ts: float = 0.0,
+    ):
+        apys = np.asarray(apys, dtype=np.float64)
+        if apys.ndim != 2 or apys.shape[1] != len(names):
+            raise ValueError(f"Expected a (samples, {len(names)}) APY array, got {apys.shape}")
+        if len(apys) == 0:
+            raise ValueError("APY history is empty")
+        self.names = list(names)
+        # Same sanitizing as scoring.risk_adjusted_returns: unusable samples earn and score 0
+        self.apys = np.where(np.isfinite(apys) & (apys >= 0), apys, 0.0)
+        self.risk_scores = np.asarray(risk_scores, dtype=np.float64)
+        self.step_seconds = step_seconds
+        self.start_ts = start_ts
+
+    @property
+    def years(self) -> float:
+        return len(self.apys) * self.step_seconds / YEAR_SECONDS
+
+
+def synthetic_history(
+    pools: Mapping[str, PoolConfig],
+    days: float = 365,
+    step_seconds: float = DEFAULT_STEP_SECONDS,
+    seed: int = 0,
+    volatility: float = 0.15,
+    half_life_days: float = 3.0,
+) -> ApyHistory:
+    """Mean-reverting APY paths around each pool's fallback_apy"""
+    names = list(pools)
+    means = np.array([pools[n].fallback_apy for n in names], dtype=np.float64)
+    risks = [pools[n].risk_score for n in names]
+    steps = int(days * 86400 / step_seconds)
+
+    rng = np.random.default_rng(seed)
+    # AR(1) in log-space keeps APYs positive; riskier pools get noisier paths
+    decay = 0.5 ** (step_seconds / (half_life_days * 86400))
+    sigma = volatility * np.sqrt(1 - decay ** 2) * (1 + np.asarray(risks) / RISK_DIVISOR)
+    shocks = rng.standard_normal((steps, len(names))) * sigma
+    log_dev = np.empty_like(shocks)
+    level = np.zeros(len(names))
+    for t in range(steps):
+        level = decay * level + shocks[t]
+        log_dev[t] = level
+    return ApyHistory(names, means * np.exp(log_dev), risks, step_seconds)
+
+
+def _regularize(
+    samples: Mapping[str, Sequence[np.ndarray]],
+    risk_scores: Mapping[str, float],
+    step_seconds: float,
+) -> ApyHistory:
+    """Resample irregular (ts, apy) series onto a shared grid (last value carried forward)"""
+    names = [name for name in samples if len(samples[name][0])]
+    if not names:
+        raise ValueError("No APY samples to backtest")
+    missing = [name for name in names if name not in risk_scores]
+    if missing:
+        raise ValueError(f"No risk score for: {', '.join(missing)}")
+
+    start = max(float(samples[n][0][0]) for n in names)
+    end = min(float(samples[n][0][-1]) for n in names)
+    grid = np.arange(start, end + step_seconds / 2, step_seconds)
+    columns = []
+    for name in names:
+        ts, apy = samples[name]
+        idx = np.searchsorted(ts, grid, side="right") - 1
+        columns.append(np.asarray(apy, dtype=np.float64)[idx])
+    return ApyHistory(names, np.column_stack(columns), [risk_scores[n] for n in names], step_seconds, start)
+
+
+def _parse_ts(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def load_csv_history(path: str, risk_scores: Mapping[str, float], step_seconds: float = DEFAULT_STEP_SECONDS) -> ApyHistory:
+    """Read `timestamp,<protocol>,...` (wide) or `timestamp,protocol,apy` (long) CSV.
+
+    Timestamps may be epoch seconds or ISO 8601.
+    """
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    if len(rows) < 2:
+        raise ValueError(f"{path}: no data rows")
+    header = [h.strip() for h in rows[0]]
+
+    series: Dict[str, List[List[float]]] = {}
+    if [h.lower() for h in header] == ["timestamp", "protocol", "apy"]:
+        for ts, name, apy in rows[1:]:
+            entry = series.setdefault(name, [[], []])
+            entry[0].append(_parse_ts(ts))
+            entry[1].append(float(apy) if apy else float("nan"))
+    else:
+        for name in header[1:]:
+            series[name] = [[], []]
+        for row in rows[1:]:
+            ts = _parse_ts(row[0])
+            for name, apy in zip(header[1:], row[1:]):
+                if apy:
+                    series[name][0].append(ts)
+                    series[name][1].append(float(apy))
+
+    samples = {}
+    for name, (ts, apy) in series.items():
+        order = np.argsort(ts, kind="stable")
+        samples[name] = (np.asarray(ts)[order], np.asarray(apy)[order])
+    return _regularize(samples, risk_scores, step_seconds)
+
+
+def load_store_history(
+    store: ApyTimeSeriesStore,
+    risk_scores: Mapping[str, float],
+    start: float,
+    end: float,
+    step_seconds: float = DEFAULT_STEP_SECONDS,
+) -> ApyHistory:
+    """Recorded live samples from the memory-mapped APY store"""
+    samples = {}
+    for name in risk_scores:
+        series = store.series(name)
+        if series is None:
+            continue
+        window = series.window(start, end)
+        samples[name] = (window["ts"], window["apy"].astype(np.float64))
+    return _regularize(samples, risk_scores, step_seconds)
+
+
+class BacktestResult:
+    """Metrics for every parameter combination, as flat arrays of equal length"""
+
+    COLUMNS = (
+        "threshold", "risk_weight", "interval_minutes", "gas_cost_bps",
+        "rebalances", "gross_yield_pct", "gas_pct", "net_yield_pct", "annualized_net_pct",
+    )
+
+    def __init__(self, columns: Dict[str, np.ndarray], years: float):
+        self.columns = columns
+        self.years = years
+
+    def __len__(self) -> int:
+        return len(self.columns["threshold"])
+
+    def order(self, key: str = "net_yield_pct") -> np.ndarray:
+        return np.argsort(-self.columns[key], kind="stable")
+
+    def rows(self, indices: Optional[Sequence[int]] = None) -> List[Dict[str, float]]:
+        if indices is None:
+            indices = range(len(self))
+        return [
+            {name: self.columns[name][i].item() for name in self.COLUMNS}
+            for i in indices
+        ]
+
+    def find(self, threshold: float, risk_weight: float, interval_minutes: float, gas_cost_bps: float) -> Optional[int]:
+        """Index of one exact combination, if it is part of the grid"""
+        mask = (
+            np.isclose(self.columns["threshold"], threshold)
+            & np.isclose(self.columns["risk_weight"], risk_weight)
+            & np.isclose(self.columns["interval_minutes"], interval_minutes)
+            & np.isclose(self.columns["gas_cost_bps"], gas_cost_bps)
+        )
+        hits = np.flatnonzero(mask)
+        return int(hits[0]) if len(hits) else None
+
+
+def _next_switch(
+    gap: np.ndarray,
+    risk_idx: np.ndarray,
+    thresholds: np.ndarray,
+    current: np.ndarray,
+    start: int,
+) -> np.ndarray:
+    """First decision index >= start where each combination would switch (len if never).
+
+    Scans ahead in growing blocks for all given combinations at once, so quiet
+    stretches cost one array comparison per block instead of a Python step per sample.
+    """
+    steps = gap.shape[1]
+    result = np.full(len(current), steps, dtype=np.int64)
+    pending = np.arange(len(current))
+    block = _SCAN_BLOCK
+    while len(pending) and start < steps:
+        window = np.arange(start, min(start + block, steps))
+        exceeds = gap[risk_idx[pending, None], window[None, :], current[pending, None]] > thresholds[pending, None]
+        found = exceeds.any(axis=1)
+        result[pending[found]] = window[exceeds[found].argmax(axis=1)]
+        pending = pending[~found]
+        start = int(window[-1]) + 1
+        block *= 2
+    return result
+
+
+def _simulate_interval(
+    gap: np.ndarray,
+    best: np.ndarray,
+    cum: np.ndarray,
+    times: np.ndarray,
+    risk_idx: np.ndarray,
+    thresholds: np.ndarray,
+    initial: int,
+):
+    """Run the hold/switch policy for many (risk weight, threshold) pairs sharing one interval.
+
+    gap[r, i, p]: best risk-adjusted score minus protocol p's at decision i.
+    A combination keeps its protocol until gap exceeds its threshold, so the
+    simulation jumps from switch to switch, rescanning only the combinations
+    that just moved.
+    """
+    n = len(thresholds)
+    current = np.full(n, initial, dtype=np.int64)
+    held_since = np.zeros(n, dtype=np.int64)
+    gross = np.zeros(n)
+    switches = np.zeros(n, dtype=np.int64)
+    steps = len(times)
+
+    next_at = _next_switch(gap, risk_idx, thresholds, current, 0)
+    while True:
+        at = int(next_at.min())
+        if at >= steps:
+            break
+        movers = np.flatnonzero(next_at == at)
+        t = times[at]
+        held = current[movers]
+        gross[movers] += cum[t, held] - cum[held_since[movers], held]
+        current[movers] = best[risk_idx[movers], at]
+        held_since[movers] = t
+        switches[movers] += 1
+        next_at[movers] = _next_switch(gap, risk_idx[movers], thresholds[movers], current[movers], at + 1)
+
+    end = len(cum) - 1
+    gross += cum[end, current] - cum[held_since, current]
+    return gross, switches
+
+
+def run_backtest(
+    history: ApyHistory,
+    thresholds: Sequence[float] = (REBALANCE_THRESHOLD_PERCENT,),
+    risk_weights: Sequence[float] = (1 / RISK_DIVISOR,),
+    intervals_minutes: Sequence[float] = (5,),
+    gas_costs_bps: Sequence[float] = (0.0,),
+    initial_protocol: Optional[str] = None,
+) -> BacktestResult:
+    """Replay the deterministic rebalance policy over every parameter combination.
+
+    The policy mirrors scoring.score_protocols: score = APY / (1 + risk_weight * risk)
+    (the live agent uses risk_weight = 1/RISK_DIVISOR), and the vault moves to the
+    best protocol when it beats the current one by more than `threshold` points.
+    Yield accrues at the held protocol's APY each step (simple, not compounded);
+    each rebalance costs `gas_cost_bps` of capital.
+    """
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    risk_weights = np.asarray(risk_weights, dtype=np.float64)
+    gas = np.asarray(gas_costs_bps, dtype=np.float64)
+    if (thresholds < 0).any():
+        raise ValueError("Thresholds must be >= 0")
+
+    steps_per_minute = 60 / history.step_seconds
+    interval_steps = np.maximum(1, np.round(np.asarray(intervals_minutes, dtype=np.float64) * steps_per_minute)).astype(np.int64)
+    initial = history.names.index(initial_protocol) if initial_protocol else 0
+
+    apys = history.apys
+    # cum[t, p]: percent earned holding p over samples [0, t)
+    dt_years = history.step_seconds / YEAR_SECONDS
+    cum = np.vstack([np.zeros((1, apys.shape[1])), np.cumsum(apys * dt_years, axis=0)])
+
+    # Decisions depend on (interval, risk weight, threshold); gas is applied afterwards
+    risk_idx, thr = (a.ravel() for a in np.meshgrid(np.arange(len(risk_weights)), thresholds, indexing="ij"))
+    gross = np.empty((len(interval_steps), len(risk_idx)))
+    switches = np.empty((len(interval_steps), len(risk_idx)), dtype=np.int64)
+    for k, every in enumerate(interval_steps):
+        times = np.arange(0, len(apys), every)
+        scores = apys[None, times, :] / (1 + risk_weights[:, None, None] * history.risk_scores[None, None, :])
+        best = scores.argmax(axis=2)
+        gap = scores.max(axis=2, keepdims=True) - scores
+        gross[k], switches[k] = _simulate_interval(gap, best, cum, times, risk_idx, thr, initial)
+
+    # Broadcast to (interval, risk weight x threshold, gas)
+    shape = (len(interval_steps), len(risk_idx), len(gas))
+    gross_full = np.broadcast_to(gross[:, :, None], shape)
+    switches_full = np.broadcast_to(switches[:, :, None], shape)
+    gas_pct = switches_full * gas[None, None, :] / 100
+    net = gross_full - gas_pct
+    years = history.years
+
+    columns = {
+        "threshold": np.broadcast_to(thr[None, :, None], shape),
+        "risk_weight": np.broadcast_to(risk_weights[risk_idx][None, :, None], shape),
+        "interval_minutes": np.broadcast_to((interval_steps / steps_per_minute)[:, None, None], shape),
+        "gas_cost_bps": np.broadcast_to(gas[None, None, :], shape),
+        "rebalances": switches_full,
+        "gross_yield_pct": gross_full,
+        "gas_pct": gas_pct,
+        "net_yield_pct": net,
+        "annualized_net_pct": net / years if years > 0 else net,
+    }
+    return BacktestResult({name: np.ascontiguousarray(values).ravel() for name, values in columns.items()}, years)
@@ -0,0 +1,116 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from collections import OrderedDict
+import asyncio
+import time
+from web3 import Web3
+
+from app.models import VaultChainState
+from app.rpc import JsonRpcClient, RpcError
+from app.vault_abi import load_vault_abi
+
+
+class VaultChainReader:
+    """Batched, block-keyed reads of YieldMindVault view functions.
+
+    All views for one vault go out as a single JSON-RPC batch pinned to one
+    block, and results are cached per (vault, block). The head block number is
+    itself reused for `block_time_seconds`, so repeated status requests within
+    a block never reach the node.
+    """
+
+    def __init__(self, rpc: JsonRpcClient, block_time_seconds: float = 3.0, cache_size: int = 256):
+        self.rpc = rpc
+        self.block_time_seconds = block_time_seconds
+        self.cache_size = cache_size
+        # Used only for ABI encoding/decoding; all I/O goes through self.rpc
+        self._codec_w3 = Web3()
+        self._contract = self._codec_w3.eth.contract(abi=load_vault_abi())
+        self._block_number: Optional[int] = None
+        self._block_checked_at = 0.0
+        self._block_task: Optional[asyncio.Task] = None
+        self._state_cache: "OrderedDict[Tuple[str, int], VaultChainState]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, int], asyncio.Task] = {}
+        # Rebalance log entries are append-only, so they are cached by index
+        self._log_cache: Dict[Tuple[str, int], Dict[str, Any]] = {}
+
+    async def block_number(self) -> int:
+        """Head block number, refreshed at most once per block time (single-flight)"""
+        if self._block_number is not None and time.monotonic() - self._block_checked_at < self.block_time_seconds:
+            return self._block_number
+        if self._block_task is None or self._block_task.done():
+            self._block_task = asyncio.create_task(self._fetch_block_number())
+        return await asyncio.shield(self._block_task)
+
+    async def _fetch_block_number(self) -> int:
+        self._block_number = int(await self.rpc.call("eth_blockNumber"), 16)
+        self._block_checked_at = time.monotonic()
+        return self._block_number
+
+    def _call_request(self, address: str, fn_name: str, args: Sequence[Any], block: int) -> Tuple[str, list]:
+        data = self._contract.encode_abi(fn_name, args=list(args))
+        return "eth_call", [{"to": address, "data": data}, hex(block)]
+
+    def _decode(self, fn_name: str, raw: Any) -> Tuple[Any, ...]:
+        if isinstance(raw, RpcError):
+            raise raw
+        fn = self._contract.get_function_by_name(fn_name)
+        output_types = [output["type"] for output in fn.abi["outputs"]]
+        return self._codec_w3.codec.decode(output_types, bytes.fromhex(raw[2:] if raw.startswith("0x") else raw))
+
+    async def read_vault_state(self, address: str) -> VaultChainState:
+        """Balance, rebalance count and current protocol at the head block"""
+        address = Web3.to_checksum_address(address)
+        block = await self.block_number()
+        key = (address, block)
+        cached = self._state_cache.get(key)
+        if cached is not None:
+            return cached
+
+        # Concurrent requests for the same block share one batch
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._read_vault_state(address, block))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _read_vault_state(self, address: str, block: int) -> VaultChainState:
+        names = ["getBalance", "getRebalanceCount", "currentProtocol", "totalDeposits"]
+        results = await self.rpc.batch([self._call_request(address, name, (), block) for name in names])
+        balance, count, current, deposits = (self._decode(name, raw)[0] for name, raw in zip(names, results))
+        state = VaultChainState(
+            block_number=block,
+            balance_wei=balance,
+            rebalance_count=count,
+            current_protocol_address=current,
+            total_deposits_wei=deposits,
+        )
+        self._state_cache[(address, block)] = state
+        while len(self._state_cache) > self.cache_size:
+            self._state_cache.popitem(last=False)
+        return state
+
+    async def read_rebalance_logs(self, address: str, start: int = 0, end: Optional[int] = None) -> List[Dict[str, Any]]:
+        """getRebalanceLog(start..end-1) in one batch, reusing entries already loaded"""
+        address = Web3.to_checksum_address(address)
+        block = await self.block_number()
+        if end is None:
+            end = (await self.read_vault_state(address)).rebalance_count
+
+        missing = [i for i in range(start, end) if (address, i) not in self._log_cache]
+        if missing:
+            results = await self.rpc.batch(
+                [self._call_request(address, "getRebalanceLog", (i,), block) for i in missing]
+            )
+            for index, raw in zip(missing, results):
+                timestamp, from_protocol, to_protocol, amount, reason, delta = self._decode("getRebalanceLog", raw)
+                self._log_cache[(address, index)] = {
+                    "index": index,
+                    "timestamp": timestamp,
+                    "from_protocol": from_protocol,
+                    "to_protocol": to_protocol,
+                    "amount": amount,
+                    "reason": reason,
+                    "delta_percentage": delta,
+                }
+        return [self._log_cache[(address, i)] for i in range(start, end)]
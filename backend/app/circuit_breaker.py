@@ -0,0 +1,75 @@
+from typing import Optional
+import random
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker with jittered exponential backoff.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    `allow` refuses calls until the backoff passes. Then a single probe is let
+    through (half-open): success closes the breaker, failure reopens it with
+    the backoff doubled, up to `max_backoff_seconds`. Each backoff is drawn
+    from [backoff / 2, backoff] so sources that died together don't retry in
+    lockstep.
+    """
+
+    def __init__(self, failure_threshold: int = 3, base_backoff_seconds: float = 30.0, max_backoff_seconds: float = 600.0):
+        if failure_threshold <= 0 or base_backoff_seconds <= 0:
+            raise ValueError("failure_threshold and base_backoff_seconds must be positive")
+        self.failure_threshold = failure_threshold
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max(max_backoff_seconds, base_backoff_seconds)
+        self.consecutive_failures = 0
+        self.opened_count = 0
+        self.last_success: Optional[float] = None
+        self.last_failure: Optional[float] = None
+        self._open_until = 0.0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.consecutive_failures < self.failure_threshold:
+            return CLOSED
+        if self._probing or time.monotonic() >= self._open_until:
+            return HALF_OPEN
+        return OPEN
+
+    def retry_in(self) -> float:
+        """Seconds until the next probe is allowed (0 unless open)"""
+        if self.state != OPEN:
+            return 0.0
+        return self._open_until - time.monotonic()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open state only one probe at a time"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self.opened_count = 0
+        self.last_success = time.time()
+        self._probing = False
+
+    def abandon(self) -> None:
+        """Forget an in-flight probe that ended without an outcome (cancelled)"""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self.last_failure = time.time()
+        self._probing = False
+        if self.consecutive_failures >= self.failure_threshold:
+            backoff = min(self.max_backoff_seconds, self.base_backoff_seconds * 2 ** self.opened_count)
+            self._open_until = time.monotonic() + random.uniform(backoff / 2, backoff)
+            self.opened_count += 1
@@ -0,0 +1,30 @@
+import os
+
+
+def get_int_env(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    if raw is None or raw == "":
+        return default
+
+    try:
+        return int(raw)
+    except ValueError:
+        print(f"Invalid {name}={raw!r}; using {default}")
+        return default
+
+
+def get_float_env(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if raw is None or raw == "":
+        return default
+
+    try:
+        return float(raw)
+    except ValueError:
+        print(f"Invalid {name}={raw!r}; using {default}")
+        return default
+
+
+def data_path(*parts: str) -> str:
+    """Path under the local state directory (rebalance history, time series, ...)"""
+    return os.path.join(os.getenv("YIELDMIND_DATA_DIR", "data"), *parts)
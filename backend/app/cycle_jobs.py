@@ -0,0 +1,135 @@
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from datetime import datetime, timezone
+import asyncio
+import uuid
+
+from app import metrics
+from app.models import CycleJobResponse, SchedulerStatusResponse
+
+if TYPE_CHECKING:
+    from app.ai_agent import AIAgent
+
+
+class CycleJob:
+    def __init__(self, source: str):
+        self.id = uuid.uuid4().hex
+        self.source = source
+        self.state = "running"
+        self.message: Optional[str] = None
+        self.started_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+        # Rebalances the cycle recorded; a finished cycle with none was wasted
+        self.rebalances: Optional[int] = None
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_reason: Optional[str] = None
+
+
+class CycleJobManager:
+    """Runs agent cycles as jobs with a single-flight guard.
+
+    Triggers that arrive while a cycle is running (from the API or the
+    scheduler) attach to that job instead of starting an overlapping cycle.
+    """
+
+    def __init__(self, agent: "AIAgent", history_size: int = 50):
+        self.agent = agent
+        self.history_size = history_size
+        self._jobs: "OrderedDict[str, CycleJob]" = OrderedDict()
+        self._current: Optional[CycleJob] = None
+        # source -> outcome ("acted", "wasted", "failed") -> finished cycles
+        self.outcomes: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def current(self) -> Optional[CycleJob]:
+        return self._current
+
+    def trigger(self, source: str = "api") -> Tuple[CycleJob, bool]:
+        """Start a cycle, or return the running one. The flag is True if a new job started"""
+        if self._current is not None and self._current.state == "running":
+            return self._current, False
+
+        job = CycleJob(source)
+        job.task = asyncio.create_task(self._run(job))
+        self._current = job
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.history_size:
+            self._jobs.popitem(last=False)
+        return job, True
+
+    async def run_scheduled(self) -> None:
+        """Scheduler entry point: trigger (or join) a cycle and wait for it"""
+        job, _ = self.trigger(source="scheduler")
+        try:
+            await asyncio.shield(job.task)
+        except asyncio.CancelledError:
+            # The job was cancelled (see cancel_current), not this scheduler run
+            if not job.task.cancelled():
+                raise
+
+    def cancel_current(self, reason: str) -> bool:
+        """Cancel the running cycle, if any; True if one was cancelled"""
+        job = self._current
+        if job is None or job.state != "running" or job.task is None or job.task.done():
+            return False
+        job.cancel_reason = reason
+        job.task.cancel()
+        return True
+
+    def get(self, job_id: str) -> Optional[CycleJob]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[CycleJob]:
+        """Recent jobs, oldest first"""
+        return list(self._jobs.values())
+
+    def _rebalance_count(self) -> int:
+        history = self.agent.vaults.history
+        return sum(history.count(vault.vault_id) for vault in self.agent.vaults)
+
+    async def _run(self, job: CycleJob) -> None:
+        before = self._rebalance_count()
+        try:
+            await self.agent.run_cycle()
+            if self.agent.last_error is not None:
+                job.state = "failed"
+            else:
+                job.state = "succeeded"
+            job.message = self.agent.status
+        except asyncio.CancelledError:
+            job.state = "failed"
+            job.message = f"Cancelled: {job.cancel_reason or 'shutting down'}"
+            self.agent.status = job.message
+            raise
+        except Exception as e:
+            # run_cycle handles its own errors; this only catches bugs around it
+            job.state = "failed"
+            job.message = f"Error: {e}"
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            job.rebalances = self._rebalance_count() - before
+            outcome = "acted" if job.rebalances else "failed" if job.state == "failed" else "wasted"
+            counts = self.outcomes.setdefault(job.source, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+            metrics.CYCLE_OUTCOMES.labels(job.source, outcome).inc()
+
+    def summary(self, mode: str, **details) -> SchedulerStatusResponse:
+        """Cycle outcomes so far, plus scheduler-specific `details`"""
+        return SchedulerStatusResponse(
+            mode=mode,
+            cycles={source: dict(counts) for source, counts in self.outcomes.items()},
+            wasted_cycles=sum(counts.get("wasted", 0) for counts in self.outcomes.values()),
+            **details,
+        )
+
+    def describe(self, job: CycleJob) -> CycleJobResponse:
+        return CycleJobResponse(
+            job_id=job.id,
+            state=job.state,
+            source=job.source,
+            # While running, progress is the agent's live status
+            message=self.agent.status if job.state == "running" else job.message,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+            rebalances=job.rebalances,
+        )
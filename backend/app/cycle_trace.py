@@ -0,0 +1,188 @@
+"""Per-cycle traces: inputs, Claude exchanges, decisions and stage timings.
+
+`run_cycle` opens a trace and makes it current through a context variable,
+so code running inside the cycle (including tasks it spawns) records into it
+without threading it through every call. Finished traces are appended as one
+gzip member per cycle to `cycles.jsonl.gz`, which rotates by size; `replay.py`
+runs them back through the agent offline.
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import glob
+import gzip
+import hashlib
+import json
+import os
+import time
+import uuid
+
+# 2: Claude requests carry hashes of the system blocks and tool schemas
+TRACE_VERSION = 2
+ACTIVE_FILE = "cycles.jsonl.gz"
+
+_current: ContextVar[Optional["CycleTrace"]] = ContextVar("cycle_trace", default=None)
+
+
+def current_trace() -> Optional["CycleTrace"]:
+    """The trace of the cycle this code runs in, if any"""
+    return _current.get()
+
+
+def _plain(value: Any) -> Any:
+    """JSON-safe deep copy (pydantic models and SDK blocks included)"""
+    return json.loads(json.dumps(value, default=lambda o: o.model_dump(mode="json") if hasattr(o, "model_dump") else str(o)))
+
+
+def content_hash(value: Any) -> str:
+    """Short stable hash of a JSON-able value, for request parts too large to store per call"""
+    canonical = json.dumps(_plain(value), sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(canonical.encode(), digest_size=12).hexdigest()
+
+
+class CycleTrace:
+    def __init__(self, model: str, decision_mode: str, vault_concurrency: int):
+        self.data: Dict[str, Any] = {
+            "version": TRACE_VERSION,
+            "cycle_id": uuid.uuid4().hex,
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "model": model,
+            "decision_mode": decision_mode,
+            "vault_concurrency": vault_concurrency,
+            "protocols": [],
+            "vaults": [],
+            "cache_hits": [],
+            "llm": [],
+            "stages": {},
+            "status": None,
+            "error": None,
+        }
+        self._started = time.perf_counter()
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        self.data["stages"].setdefault(name, []).append(round(seconds, 6))
+
+    def record_protocols(self, protocols: Iterable[Any]) -> None:
+        self.data["protocols"] = _plain(list(protocols))
+
+    def record_llm(self, request: Dict[str, Any], message: Any, error: Optional[Exception], seconds: float) -> None:
+        entry: Dict[str, Any] = {
+            "request": {
+                "max_tokens": request.get("max_tokens"),
+                "tools": [tool["name"] for tool in request.get("tools", [])],
+                "tool_choice": request.get("tool_choice"),
+                "messages": _plain(request.get("messages", [])),
+                # The system prompt and tool schemas are code constants: a hash shows when they change
+                "system_hash": content_hash(request.get("system")),
+                "tools_hash": content_hash(request.get("tools", [])),
+            },
+            "seconds": round(seconds, 6),
+        }
+        if error is not None:
+            entry["error"] = str(error)
+        else:
+            usage = getattr(message, "usage", None)
+            entry["response"] = {
+                "content": _plain(list(message.content)),
+                "stop_reason": message.stop_reason,
+                "usage": _plain(usage) if usage is not None else None,
+            }
+        self.data["llm"].append(entry)
+        self.add_stage("llm", seconds)
+
+    def record_cache_hit(self, current_allocation: Dict[str, Any], decision: Any) -> None:
+        self.data["cache_hits"].append({"current_allocation": _plain(current_allocation), "decision": _plain(decision)})
+
+    def record_vault(
+        self,
+        vault_id: str,
+        current_allocation: Optional[Dict[str, Any]],
+        decision: Any,
+        path: Optional[str],
+        status: str,
+        error: Optional[str],
+        seconds: float,
+        onchain: bool = False,
+    ) -> None:
+        self.data["vaults"].append({
+            "vault_id": vault_id,
+            "onchain": onchain,
+            "current_allocation": _plain(current_allocation),
+            "decision": _plain(decision),
+            "path": path,
+            "status": status,
+            "error": error,
+            "seconds": round(seconds, 6),
+        })
+        self.add_stage("vault", seconds)
+
+    def finish(self, status: str, error: Optional[str]) -> Dict[str, Any]:
+        self.data["status"] = status
+        self.data["error"] = error
+        self.add_stage("cycle", time.perf_counter() - self._started)
+        return self.data
+
+
+class CycleTraceRecorder:
+    """Starts traces and appends finished ones to a size-rotated JSONL.gz log.
+
+    With `directory=None` nothing is written; the last trace is still kept in
+    `last` (replay uses this to trace the re-run cycle).
+    """
+
+    def __init__(self, directory: Optional[str], max_bytes: int = 16 * 1024 * 1024, max_files: int = 8):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.last: Optional[Dict[str, Any]] = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def start(self, model: str, decision_mode: str, vault_concurrency: int) -> CycleTrace:
+        trace = CycleTrace(model, decision_mode, vault_concurrency)
+        _current.set(trace)
+        return trace
+
+    def finish(self, trace: CycleTrace, status: str, error: Optional[str]) -> None:
+        _current.set(None)
+        self.last = trace.finish(status, error)
+        if not self.directory:
+            return
+        try:
+            self._append(self.last)
+        except OSError as e:
+            print(f"Could not write cycle trace: {e}")
+
+    def _append(self, data: Dict[str, Any]) -> None:
+        path = os.path.join(self.directory, ACTIVE_FILE)
+        line = (json.dumps(data, separators=(",", ":")) + "\n").encode()
+        # One gzip member per cycle: readers see a valid stream even if we crash mid-file
+        with open(path, "ab") as f:
+            f.write(gzip.compress(line))
+        if os.path.getsize(path) >= self.max_bytes:
+            self._rotate(path)
+
+    def _rotate(self, path: str) -> None:
+        rotated = os.path.join(self.directory, f"cycles-{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}.jsonl.gz")
+        os.replace(path, rotated)
+        for old in trace_files(self.directory)[:-self.max_files]:
+            os.remove(old)
+
+
+def trace_files(directory: str) -> List[str]:
+    """Trace logs in `directory`, oldest first (the active file last)"""
+    rotated = sorted(glob.glob(os.path.join(directory, "cycles-*.jsonl.gz")))
+    active = os.path.join(directory, ACTIVE_FILE)
+    return rotated + ([active] if os.path.exists(active) else [])
+
+
+def read_traces(paths: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    for path in paths:
+        with gzip.open(path, "rt") as f:
+            try:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            except EOFError:
+                # The last member was cut short (crash while writing); earlier cycles are intact
+                print(f"{path}: truncated trace skipped")
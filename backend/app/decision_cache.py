@@ -0,0 +1,66 @@
+from typing import Any, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import time
+
+from app.models import DecisionCacheStats, RebalanceDecision
+
+
+class DecisionCache:
+    """LRU + TTL cache of rebalance decisions keyed on a quantized market state.
+
+    APYs are bucketed to `apy_bucket` percentage points, so noise between
+    cycles maps to the same key and reuses the previous decision.
+    """
+
+    def __init__(self, apy_bucket: float = 0.5, max_entries: int = 128, ttl_seconds: float = 1800.0):
+        if apy_bucket <= 0:
+            raise ValueError("apy_bucket must be positive")
+        self.apy_bucket = apy_bucket
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, Tuple[float, RebalanceDecision]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, protocols: List[Dict[str, Any]], current_allocation: Dict[str, Any]) -> Tuple:
+        """Quantized fingerprint of (APYs, risk scores, current allocation)"""
+        market = tuple(sorted(
+            (p["name"], round(float(p["apy"]) / self.apy_bucket), int(p["risk_score"]))
+            for p in protocols
+        ))
+        allocation = (
+            current_allocation.get("protocol"),
+            round(float(current_allocation.get("percentage", 0.0)), 1),
+            tuple(sorted(
+                (name, round(float(pct), 1)) for name, pct in (current_allocation.get("allocation") or {}).items()
+            )),
+        )
+        return market, allocation
+
+    def get(self, key: Tuple) -> Optional[RebalanceDecision]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        stored_at, decision = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return decision.model_copy()
+
+    def put(self, key: Tuple, decision: RebalanceDecision) -> None:
+        self._entries[key] = (time.monotonic(), decision.model_copy())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> DecisionCacheStats:
+        return DecisionCacheStats(hits=self.hits, misses=self.misses, size=len(self._entries))
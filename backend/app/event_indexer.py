@@ -0,0 +1,232 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import asyncio
+from datetime import datetime, timezone
+import httpx
+from web3 import Web3
+
+from app import metrics
+from app.event_store import ChainEventStore
+from app.models import RebalanceEvent
+from app.rpc import JsonRpcClient, RpcError
+from app.vault_abi import load_vault_abi, protocol_name
+
+INDEXED_EVENTS = ("Rebalance", "Deposit", "Withdraw")
+
+
+class LogDecoder:
+    """Decodes raw eth_getLogs entries for the vault's events"""
+
+    def __init__(self, abi: Sequence[Dict[str, Any]]):
+        self._codec = Web3().codec
+        self.events: Dict[str, Dict[str, Any]] = {}
+        for item in abi:
+            if item.get("type") != "event" or item["name"] not in INDEXED_EVENTS:
+                continue
+            signature = f"{item['name']}({','.join(i['type'] for i in item['inputs'])})"
+            self.events[Web3.keccak(text=signature).hex().lower().removeprefix("0x")] = item
+
+    @property
+    def topics(self) -> List[str]:
+        return ["0x" + topic for topic in self.events]
+
+    def decode(self, log: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        topics = log.get("topics") or []
+        if not topics:
+            return None
+        item = self.events.get(topics[0].lower().removeprefix("0x"))
+        if item is None:
+            return None
+
+        indexed = [i for i in item["inputs"] if i["indexed"]]
+        plain = [i for i in item["inputs"] if not i["indexed"]]
+        args: Dict[str, Any] = {}
+        for spec, topic in zip(indexed, topics[1:]):
+            (args[spec["name"]],) = self._codec.decode([spec["type"]], bytes.fromhex(topic.removeprefix("0x")))
+        data = bytes.fromhex((log.get("data") or "0x").removeprefix("0x"))
+        for spec, value in zip(plain, self._codec.decode([i["type"] for i in plain], data)):
+            args[spec["name"]] = value
+
+        return {
+            "vault_address": log["address"].lower(),
+            "event": item["name"],
+            "block_number": int(log["blockNumber"], 16),
+            "block_hash": log.get("blockHash"),
+            "tx_hash": log["transactionHash"],
+            "log_index": int(log["logIndex"], 16),
+            # uint256 values can exceed JSON/SQLite integer ranges; keep them as strings
+            "args": {k: str(v) if isinstance(v, int) else v for k, v in args.items()},
+        }
+
+
+class VaultEventIndexer:
+    """Incrementally indexes vault logs into ChainEventStore.
+
+    Logs are read with eth_getLogs in adaptive block ranges: the range halves
+    when the node rejects a request and grows after successes. Each range is
+    stored and checkpointed before the next is read, and a pass covers at most
+    `max_blocks_per_pass` blocks, so a long backfill never holds more than one
+    range in memory. The checkpoint trails the head by `confirmations` blocks;
+    every pass rolls back whatever was indexed above it and re-reads those
+    blocks, so shallow reorgs heal.
+    """
+
+    CHECKPOINT = "vault_events"
+
+    def __init__(
+        self,
+        rpc: JsonRpcClient,
+        store: ChainEventStore,
+        vault_addresses: Sequence[str],
+        start_block: Optional[int] = None,
+        confirmations: int = 15,
+        initial_chunk: int = 2000,
+        min_chunk: int = 1,
+        max_chunk: int = 50_000,
+        max_blocks_per_pass: int = 200_000,
+        poll_seconds: float = 6.0,
+        on_rebalance: Optional[Callable[[str, RebalanceEvent], None]] = None,
+        on_rollback: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+    ):
+        self.rpc = rpc
+        self.store = store
+        self.addresses = [Web3.to_checksum_address(a) for a in vault_addresses]
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.chunk = initial_chunk
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.max_blocks_per_pass = max_blocks_per_pass
+        self.poll_seconds = poll_seconds
+        self.on_rebalance = on_rebalance
+        self.on_rollback = on_rollback
+        self.decoder = LogDecoder(load_vault_abi())
+        self.indexed_block: Optional[int] = None
+        # False while a backfill still has blocks left after the last pass
+        self.caught_up = True
+        self.last_error: Optional[str] = None
+
+    async def _get_logs(self, from_block: int, to_block: int) -> Tuple[int, List[Dict[str, Any]]]:
+        """eth_getLogs for one range starting at `from_block`, shrunk on provider errors.
+
+        Returns the last block read (at most `to_block`) and its logs.
+        """
+        while True:
+            end = min(from_block + self.chunk - 1, to_block)
+            try:
+                logs = await self.rpc.call("eth_getLogs", [{
+                    "address": self.addresses,
+                    "topics": [self.decoder.topics],
+                    "fromBlock": hex(from_block),
+                    "toBlock": hex(end),
+                }])
+            except (RpcError, httpx.HTTPError) as e:
+                # Range too large / too many results (RPC error), or the provider timed out
+                # or answered 413/5xx at the HTTP level: shrink and retry
+                if self.chunk <= self.min_chunk:
+                    raise
+                self.chunk = max(self.min_chunk, self.chunk // 2)
+                print(f"eth_getLogs rejected {from_block}-{end} ({e}); chunk -> {self.chunk}")
+                continue
+            self.chunk = min(self.max_chunk, int(self.chunk * 1.5) + 1)
+            return end, logs or []
+
+    async def sync_once(self) -> int:
+        """Index up to the current head; returns the number of new events"""
+        head = int(await self.rpc.call("eth_blockNumber"), 16)
+        checkpoint = self.store.get_checkpoint(self.CHECKPOINT)
+        if checkpoint is None:
+            if self.start_block is not None:
+                checkpoint = self.start_block - 1
+            else:
+                # No deployment block configured: only index from here on
+                checkpoint = max(0, head - self.confirmations)
+                print(f"INDEXER_START_BLOCK not set; indexing vault events from block {checkpoint + 1}")
+
+        if head <= checkpoint:
+            self.indexed_block = head
+            self.caught_up = True
+            return 0
+
+        target = min(head, checkpoint + self.max_blocks_per_pass)
+        confirmed = head - self.confirmations
+        new_events = 0
+        cursor = checkpoint + 1
+        while cursor <= target:
+            end, raw_logs = await self._get_logs(cursor, target)
+            events = [event for event in map(self.decoder.decode, raw_logs) if event is not None]
+            # Each range replaces what was indexed in it before (the last one, everything above
+            # it too, in case the head moved back); blocks not read yet keep their events
+            removed = self.store.apply(
+                events,
+                rollback_after=cursor - 1,
+                rollback_through=end if end < head else None,
+                checkpoint_name=self.CHECKPOINT,
+                checkpoint=max(checkpoint, min(end, confirmed)),
+            )
+            removed_keys = {(e["tx_hash"], e["log_index"]) for e in removed}
+            if self.on_rollback is not None:
+                current_keys = {(e["tx_hash"], e["log_index"]) for e in events}
+                orphaned = [e for e in removed if (e["tx_hash"], e["log_index"]) not in current_keys]
+                if orphaned:
+                    self.on_rollback(orphaned)
+            await self._publish_rebalances(events)
+            new_events += len([e for e in events if (e["tx_hash"], e["log_index"]) not in removed_keys])
+            self.indexed_block = end
+            cursor = end + 1
+
+        self.caught_up = target == head
+        return new_events
+
+    async def _publish_rebalances(self, events: List[Dict[str, Any]]) -> None:
+        if self.on_rebalance is None:
+            return
+        rebalances = [e for e in events if e["event"] == "Rebalance"]
+        if not rebalances:
+            return
+        timestamps = await self._block_timestamps({e["block_number"] for e in rebalances})
+        for event in rebalances:
+            self.on_rebalance(
+                event["vault_address"],
+                self._to_rebalance_event(event, timestamps.get(event["block_number"])),
+            )
+
+    async def _block_timestamps(self, blocks: set) -> Dict[int, datetime]:
+        """Timestamps for the given blocks in one batch"""
+        ordered = sorted(blocks)
+        results = await self.rpc.batch([("eth_getBlockByNumber", [hex(b), False]) for b in ordered])
+        timestamps: Dict[int, datetime] = {}
+        for block, result in zip(ordered, results):
+            if isinstance(result, dict) and result.get("timestamp"):
+                timestamps[block] = datetime.fromtimestamp(int(result["timestamp"], 16), tz=timezone.utc)
+        return timestamps
+
+    @staticmethod
+    def _to_rebalance_event(event: Dict[str, Any], timestamp: Optional[datetime]) -> RebalanceEvent:
+        args = event["args"]
+        return RebalanceEvent(
+            timestamp=timestamp or datetime.now(timezone.utc),
+            from_protocol=protocol_name(args["fromProtocol"]),
+            to_protocol=protocol_name(args["toProtocol"]),
+            amount=str(Web3.from_wei(int(args["amount"]), "ether")),
+            reason=args["reason"],
+            tx_hash=event["tx_hash"],
+            status="confirmed",
+        )
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                await self.sync_once()
+                self.last_error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.caught_up = True
+                self.last_error = str(e)
+                metrics.ERRORS.labels("indexer").inc()
+                print(f"Vault event indexer error: {e}")
+            if self.caught_up:
+                await asyncio.sleep(self.poll_seconds)
+            else:
+                # Backfilling: start the next pass right away, but let other tasks run
+                await asyncio.sleep(0)
@@ -0,0 +1,166 @@
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import os
+import sqlite3
+import threading
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chain_events (
+    vault_address TEXT NOT NULL,
+    event TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    block_hash TEXT,
+    tx_hash TEXT NOT NULL,
+    log_index INTEGER NOT NULL,
+    args TEXT NOT NULL,
+    PRIMARY KEY (tx_hash, log_index)
+);
+CREATE INDEX IF NOT EXISTS idx_chain_events_vault ON chain_events (vault_address, event, block_number);
+CREATE INDEX IF NOT EXISTS idx_chain_events_block ON chain_events (block_number);
+CREATE TABLE IF NOT EXISTS chain_event_totals (
+    vault_address TEXT NOT NULL,
+    event TEXT NOT NULL,
+    total TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (vault_address, event)
+);
+CREATE TABLE IF NOT EXISTS indexer_checkpoints (
+    name TEXT PRIMARY KEY,
+    block_number INTEGER NOT NULL
+);
+"""
+
+# Events whose `amount` is aggregated into running totals
+_TOTALED_EVENTS = ("Deposit", "Withdraw")
+
+
+class ChainEventStore:
+    """Decoded vault logs plus running Deposit/Withdraw totals and indexer checkpoints.
+
+    Totals are kept as decimal strings (wei exceeds SQLite's int64) and are
+    adjusted in the same transaction as inserts and reorg rollbacks, so
+    reading them is a primary-key lookup.
+    """
+
+    def __init__(self, db_path: str):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._writes = 0
+
+    def version(self) -> Tuple[int, int]:
+        """Changes whenever events or totals change, through this process or another"""
+        with self._lock:
+            return self._conn.execute("PRAGMA data_version").fetchone()[0], self._writes
+
+    def get_checkpoint(self, name: str) -> Optional[int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT block_number FROM indexer_checkpoints WHERE name = ?", (name,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _adjust_total(self, vault_address: str, event: str, amount: int, sign: int) -> None:
+        row = self._conn.execute(
+            "SELECT total, count FROM chain_event_totals WHERE vault_address = ? AND event = ?",
+            (vault_address, event),
+        ).fetchone()
+        total, count = (int(row[0]), row[1]) if row else (0, 0)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO chain_event_totals (vault_address, event, total, count) VALUES (?, ?, ?, ?)",
+            (vault_address, event, str(total + sign * amount), count + sign),
+        )
+
+    def apply(
+        self,
+        events: List[Dict[str, Any]],
+        rollback_after: Optional[int],
+        checkpoint_name: str,
+        checkpoint: int,
+        rollback_through: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Atomically drop events above `rollback_after`, insert `events` and move the checkpoint.
+
+        With `rollback_through`, only events up to that block are dropped.
+        Returns the events that were rolled back (so callers can undo derived state).
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed: List[Dict[str, Any]] = []
+                if rollback_after is not None:
+                    where, params = "block_number > ?", (rollback_after,)
+                    if rollback_through is not None:
+                        where, params = "block_number > ? AND block_number <= ?", (rollback_after, rollback_through)
+                    rows = self._conn.execute(
+                        "SELECT vault_address, event, block_number, block_hash, tx_hash, log_index, args "
+                        f"FROM chain_events WHERE {where}",
+                        params,
+                    ).fetchall()
+                    removed = [self._row_to_event(row) for row in rows]
+                    for event in removed:
+                        if event["event"] in _TOTALED_EVENTS:
+                            self._adjust_total(event["vault_address"], event["event"], int(event["args"]["amount"]), -1)
+                    self._conn.execute(f"DELETE FROM chain_events WHERE {where}", params)
+
+                for event in events:
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO chain_events "
+                        "(vault_address, event, block_number, block_hash, tx_hash, log_index, args) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            event["vault_address"],
+                            event["event"],
+                            event["block_number"],
+                            event.get("block_hash"),
+                            event["tx_hash"],
+                            event["log_index"],
+                            json.dumps(event["args"], default=str),
+                        ),
+                    )
+                    if cursor.rowcount and event["event"] in _TOTALED_EVENTS:
+                        self._adjust_total(event["vault_address"], event["event"], int(event["args"]["amount"]), 1)
+
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO indexer_checkpoints (name, block_number) VALUES (?, ?)",
+                    (checkpoint_name, checkpoint),
+                )
+                self._conn.execute("COMMIT")
+                self._writes += 1
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return removed
+
+    @staticmethod
+    def _row_to_event(row: Tuple) -> Dict[str, Any]:
+        vault_address, event, block_number, block_hash, tx_hash, log_index, args = row
+        return {
+            "vault_address": vault_address,
+            "event": event,
+            "block_number": block_number,
+            "block_hash": block_hash,
+            "tx_hash": tx_hash,
+            "log_index": log_index,
+            "args": json.loads(args),
+        }
+
+    def totals(self, vault_address: str) -> Dict[str, int]:
+        """Summed `amount` (wei) per totaled event type for one vault"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT event, total FROM chain_event_totals WHERE vault_address = ?",
+                (vault_address.lower(),),
+            ).fetchall()
+        totals = {event: 0 for event in _TOTALED_EVENTS}
+        totals.update({event: int(total) for event, total in rows})
+        return totals
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,63 @@
+from typing import Any, Dict, Optional, Set
+import asyncio
+import json
+
+
+class Subscription:
+    """One subscriber's bounded queue of pre-encoded SSE frames"""
+
+    def __init__(self, queue_size: int):
+        self.queue: "asyncio.Queue[bytes]" = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def offer(self, frame: bytes) -> None:
+        # Backpressure: a slow client loses its oldest frames instead of
+        # growing memory without bound.
+        while True:
+            try:
+                self.queue.put_nowait(frame)
+                return
+            except asyncio.QueueFull:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except asyncio.QueueEmpty:
+                    pass
+
+
+class EventBroadcaster:
+    """Single publisher, many subscribers, for server-sent events"""
+
+    def __init__(self, queue_size: int = 100, max_subscribers: int = 1000):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self._subscribers: Set[Subscription] = set()
+        self._sequence = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Optional[Subscription]:
+        """Register a subscriber, or return None when at capacity"""
+        if len(self._subscribers) >= self.max_subscribers:
+            return None
+        subscription = Subscription(self.queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+
+    def encode(self, event: str, data: Dict[str, Any]) -> bytes:
+        self._sequence += 1
+        payload = json.dumps(data, separators=(",", ":"), default=str)
+        return f"id: {self._sequence}\nevent: {event}\ndata: {payload}\n\n".encode()
+
+    def publish(self, event: str, data: Dict[str, Any]) -> None:
+        """Encode once and fan out to every subscriber (never blocks)"""
+        if not self._subscribers:
+            return
+        frame = self.encode(event, data)
+        for subscription in list(self._subscribers):
+            subscription.offer(frame)
@@ -0,0 +1,309 @@
+from typing import Deque, Dict, List, Optional, Tuple
+from collections import deque
+from datetime import datetime, timezone
+import os
+import sqlite3
+import threading
+
+from app.models import RebalanceEvent
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rebalances (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    from_protocol TEXT NOT NULL,
+    to_protocol TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    tx_hash TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_rebalances_timestamp ON rebalances (timestamp);
+CREATE INDEX IF NOT EXISTS idx_rebalances_from ON rebalances (from_protocol, timestamp);
+CREATE INDEX IF NOT EXISTS idx_rebalances_to ON rebalances (to_protocol, timestamp);
+-- Every hash sent for a submitted rebalance (original and speed-ups), to match the mined one
+CREATE TABLE IF NOT EXISTS rebalance_tx_hashes (
+    tx_hash TEXT NOT NULL,
+    rebalance_id INTEGER NOT NULL,
+    PRIMARY KEY (tx_hash, rebalance_id)
+);
+"""
+
+DEFAULT_VAULT_ID = "default"
+
+_COLUMNS = "id, timestamp, from_protocol, to_protocol, amount, reason, tx_hash, status"
+
+
+def _to_epoch(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class RebalanceHistoryStore:
+    """Append-only SQLite store for rebalance events of every vault.
+
+    The newest `recent_size` events of each vault are mirrored in an
+    in-memory ring so the default, unfiltered first page never touches disk.
+    """
+
+    def __init__(self, db_path: str, recent_size: int = 200):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path
+        self.recent_size = recent_size
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+
+        self._recent: Dict[str, Deque[Tuple[int, RebalanceEvent]]] = {}
+        self._totals: Dict[str, int] = {}
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        # Writes through this connection (data_version only counts other connections')
+        self._writes = 0
+
+    def _migrate(self) -> None:
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(rebalances)")}
+        if "vault_id" not in columns:
+            # Databases created before multi-vault support belong to the default vault
+            self._conn.execute(
+                f"ALTER TABLE rebalances ADD COLUMN vault_id TEXT NOT NULL DEFAULT '{DEFAULT_VAULT_ID}'"
+            )
+        if "status" not in columns:
+            self._conn.execute("ALTER TABLE rebalances ADD COLUMN status TEXT")
+        if "nonce" not in columns:
+            self._conn.execute("ALTER TABLE rebalances ADD COLUMN nonce INTEGER")
+            self._conn.execute(
+                "INSERT OR IGNORE INTO rebalance_tx_hashes (tx_hash, rebalance_id) "
+                "SELECT tx_hash, id FROM rebalances WHERE status = 'pending' AND tx_hash IS NOT NULL"
+            )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_rebalances_vault ON rebalances (vault_id, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_rebalances_tx ON rebalances (tx_hash)")
+
+    def _drop_rings_if_changed(self) -> None:
+        """Forget the rings when another connection (e.g. another worker) committed"""
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._data_version = version
+            self._recent.clear()
+            self._totals.clear()
+
+    def _ring(self, vault_id: str) -> Deque[Tuple[int, RebalanceEvent]]:
+        ring = self._recent.get(vault_id)
+        if ring is None:
+            ring = deque(maxlen=self.recent_size)
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM rebalances WHERE vault_id = ? ORDER BY id DESC LIMIT ?",
+                (vault_id, self.recent_size),
+            ).fetchall()
+            for row in reversed(rows):
+                ring.append(self._row_to_entry(row))
+            self._recent[vault_id] = ring
+            self._totals[vault_id] = self._conn.execute(
+                "SELECT COUNT(*) FROM rebalances WHERE vault_id = ?", (vault_id,)
+            ).fetchone()[0]
+        return ring
+
+    @staticmethod
+    def _row_to_entry(row: tuple) -> Tuple[int, RebalanceEvent]:
+        row_id, ts, from_protocol, to_protocol, amount, reason, tx_hash, status = row
+        return row_id, RebalanceEvent(
+            timestamp=datetime.fromtimestamp(ts, tz=timezone.utc),
+            from_protocol=from_protocol,
+            to_protocol=to_protocol,
+            amount=amount,
+            reason=reason,
+            tx_hash=tx_hash,
+            status=status,
+        )
+
+    def append(self, event: RebalanceEvent, vault_id: str = DEFAULT_VAULT_ID, nonce: Optional[int] = None) -> int:
+        """Persist an event and return its id; `nonce` is set for submitted transactions"""
+        with self._lock:
+            ring = self._ring(vault_id)
+            cursor = self._conn.execute(
+                "INSERT INTO rebalances "
+                "(vault_id, timestamp, from_protocol, to_protocol, amount, reason, tx_hash, status, nonce) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    vault_id,
+                    _to_epoch(event.timestamp),
+                    event.from_protocol,
+                    event.to_protocol,
+                    event.amount,
+                    event.reason,
+                    event.tx_hash,
+                    event.status,
+                    nonce,
+                ),
+            )
+            row_id = cursor.lastrowid
+            if event.status == "pending" and event.tx_hash:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO rebalance_tx_hashes (tx_hash, rebalance_id) VALUES (?, ?)",
+                    (event.tx_hash, row_id),
+                )
+            ring.append((row_id, event))
+            self._totals[vault_id] += 1
+            self._writes += 1
+        return row_id
+
+    def append_if_new(self, event: RebalanceEvent, vault_id: str = DEFAULT_VAULT_ID) -> Optional[int]:
+        """Append unless the transaction is already stored (indexer path).
+
+        A stored row still marked pending (e.g. its watcher was lost in a
+        restart) is resolved instead, also when the mined hash is one of its
+        speed-up replacements. Returns the id of a new row only.
+        """
+        if event.tx_hash:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT id, vault_id, status FROM rebalances WHERE tx_hash = ? "
+                    "UNION ALL "
+                    "SELECT r.id, r.vault_id, r.status FROM rebalance_tx_hashes h "
+                    "JOIN rebalances r ON r.id = h.rebalance_id WHERE h.tx_hash = ? "
+                    "LIMIT 1",
+                    (event.tx_hash, event.tx_hash),
+                ).fetchone()
+            if row is not None:
+                row_id, stored_vault_id, status = row
+                if status == "pending":
+                    self.update_tx(row_id, event.tx_hash, event.status or "confirmed", stored_vault_id)
+                return None
+        return self.append(event, vault_id)
+
+    def pending(self, vault_id: str = DEFAULT_VAULT_ID) -> List[Tuple[int, RebalanceEvent, Optional[int], List[str]]]:
+        """Rows still waiting for a receipt, oldest first: (id, event, nonce, every hash sent)"""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS}, nonce FROM rebalances WHERE vault_id = ? AND status = 'pending' ORDER BY id",
+                (vault_id,),
+            ).fetchall()
+            result = []
+            for row in rows:
+                row_id, event = self._row_to_entry(row[:-1])
+                hashes = [
+                    h for (h,) in self._conn.execute(
+                        "SELECT tx_hash FROM rebalance_tx_hashes WHERE rebalance_id = ?", (row_id,)
+                    )
+                ]
+                if event.tx_hash and event.tx_hash not in hashes:
+                    hashes.append(event.tx_hash)
+                result.append((row_id, event, row[-1], hashes))
+        return result
+
+    def update_tx(self, row_id: int, tx_hash: Optional[str], status: str, vault_id: str = DEFAULT_VAULT_ID) -> None:
+        """Record a transaction's final hash/status (replacement or confirmation)"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE rebalances SET tx_hash = ?, status = ? WHERE id = ?", (tx_hash, status, row_id)
+            )
+            if tx_hash:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO rebalance_tx_hashes (tx_hash, rebalance_id) VALUES (?, ?)",
+                    (tx_hash, row_id),
+                )
+            self._writes += 1
+            ring = self._recent.get(vault_id)
+            if ring is not None:
+                for i, (entry_id, event) in enumerate(ring):
+                    if entry_id == row_id:
+                        ring[i] = (entry_id, event.model_copy(update={"tx_hash": tx_hash, "status": status}))
+                        break
+
+    def delete_by_tx_hashes(self, tx_hashes: List[str]) -> int:
+        """Remove events whose transactions were reorged out"""
+        if not tx_hashes:
+            return 0
+        with self._lock:
+            placeholders = ",".join("?" for _ in tx_hashes)
+            deleted = self._conn.execute(
+                f"DELETE FROM rebalances WHERE tx_hash IN ({placeholders})", list(tx_hashes)
+            ).rowcount
+            if deleted:
+                self._writes += 1
+                # Rings are rebuilt from disk on next access
+                self._recent.clear()
+                self._totals.clear()
+        return deleted
+
+    def query(
+        self,
+        limit: int = 50,
+        cursor: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        protocol: Optional[str] = None,
+        vault_id: str = DEFAULT_VAULT_ID,
+    ) -> Tuple[List[RebalanceEvent], Optional[int]]:
+        """Return a vault's events newest first, plus the cursor for the next page (if any)"""
+        if cursor is None and since is None and until is None and protocol is None:
+            hot = self._query_recent(limit, vault_id)
+            if hot is not None:
+                return hot
+
+        clauses = ["vault_id = ?"]
+        params: list = [vault_id]
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(cursor)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(_to_epoch(since))
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(_to_epoch(until))
+        if protocol is not None:
+            clauses.append("(from_protocol = ? OR to_protocol = ?)")
+            params.extend([protocol, protocol])
+
+        where = f"WHERE {' AND '.join(clauses)}"
+        # Fetch one extra row to know whether another page exists
+        params.append(limit + 1)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_COLUMNS} FROM rebalances {where} ORDER BY id DESC LIMIT ?", params
+            ).fetchall()
+
+        entries = [self._row_to_entry(row) for row in rows[:limit]]
+        next_cursor = entries[-1][0] if len(rows) > limit else None
+        return [event for _, event in entries], next_cursor
+
+    def _query_recent(self, limit: int, vault_id: str) -> Optional[Tuple[List[RebalanceEvent], Optional[int]]]:
+        with self._lock:
+            self._drop_rings_if_changed()
+            recent = list(self._ring(vault_id))
+            total = self._totals[vault_id]
+        # The ring only answers the first page if it holds enough rows to decide
+        # whether a next page exists.
+        if limit >= len(recent) and len(recent) < total:
+            return None
+
+        page = recent[::-1][:limit]
+        next_cursor = page[-1][0] if page and total > limit else None
+        return [event for _, event in page], next_cursor
+
+    def latest(self, vault_id: str = DEFAULT_VAULT_ID) -> Optional[RebalanceEvent]:
+        with self._lock:
+            self._drop_rings_if_changed()
+            ring = self._ring(vault_id)
+            return ring[-1][1] if ring else None
+
+    def count(self, vault_id: str = DEFAULT_VAULT_ID) -> int:
+        with self._lock:
+            self._drop_rings_if_changed()
+            self._ring(vault_id)
+            return self._totals[vault_id]
+
+    def version(self) -> Tuple[int, int]:
+        """Changes whenever stored events change, through this process or another"""
+        with self._lock:
+            self._drop_rings_if_changed()
+            return self._data_version, self._writes
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
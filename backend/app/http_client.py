@@ -0,0 +1,36 @@
+from typing import Optional
+import httpx
+from app.config import get_float_env
+
+
+def fetch_timeout_seconds() -> float:
+    """Per-request deadline for upstream APY sources (read at use, after .env is loaded)"""
+    return get_float_env("PROTOCOL_FETCH_TIMEOUT_SECONDS", 5.0)
+
+# One pooled, keep-alive client for the whole process. Sources share its
+# connection pool instead of opening a new TCP/TLS session per request.
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide pooled HTTP client"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(fetch_timeout_seconds(), connect=2.0),
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=20,
+                keepalive_expiry=30.0,
+            ),
+            headers={"User-Agent": "YieldMind/1.0"},
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    """Close the pooled HTTP client (called on shutdown)"""
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
@@ -0,0 +1,159 @@
+"""Prometheus metrics for the agent cycle.
+
+Metric objects are module-level, as is usual with prometheus_client; updating
+one is a lock-protected float add, so instrumented code pays next to nothing.
+Values are only rendered when /metrics is scraped.
+
+With `uvicorn --workers N`, set PROMETHEUS_MULTIPROC_DIR to a directory that is
+emptied before each start: every worker writes its values there, and /metrics
+merges all workers, whichever one serves the scrape.
+"""
+from typing import Any, Optional
+import os
+import time
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+# Seconds; spans a cached sub-millisecond stage up to a slow multi-round Claude call
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+CYCLE_DURATION = Histogram(
+    "yieldmind_cycle_duration_seconds", "Duration of a full optimization cycle (all vaults)",
+    buckets=_LATENCY_BUCKETS,
+)
+APY_FETCH_DURATION = Histogram(
+    "yieldmind_apy_fetch_seconds", "APY fetch latency per source (one upstream call for all its pools)",
+    ["source", "outcome"], buckets=_LATENCY_BUCKETS,
+)
+APY_FALLBACKS = Counter(
+    "yieldmind_apy_fallback_total", "APY reads served from fallback data",
+    ["protocol", "reason"],
+)
+APY_SOURCE_STATE = Gauge(
+    "yieldmind_apy_source_breaker_state", "Circuit breaker per APY source (0 closed, 1 half-open, 2 open)",
+    ["source"], multiprocess_mode="livemax",
+)
+RPC_REQUEST_DURATION = Histogram(
+    "yieldmind_rpc_request_seconds", "JSON-RPC request latency per node (abandoned: lost a hedge)",
+    ["endpoint", "outcome"], buckets=_LATENCY_BUCKETS,
+)
+RPC_HEDGES = Counter(
+    "yieldmind_rpc_hedges_total", "Hedged RPC reads sent, and how many the hedge answered first",
+    ["result"],
+)
+RPC_ENDPOINT_LAG = Gauge(
+    "yieldmind_rpc_endpoint_lag_blocks", "Blocks each RPC node is behind the best head seen",
+    ["endpoint"], multiprocess_mode="livemax",
+)
+LLM_REQUEST_DURATION = Histogram(
+    "yieldmind_llm_request_seconds", "Claude round-trip latency per request",
+    ["mode", "outcome"], buckets=_LATENCY_BUCKETS,
+)
+LLM_TOOL_ROUNDS = Histogram(
+    "yieldmind_llm_tool_rounds", "Claude requests needed per decision",
+    ["mode"], buckets=(1, 2, 3, 4, 5, 6, 8, 10),
+)
+LLM_TOKENS = Counter(
+    "yieldmind_llm_tokens_total", "Tokens reported in Anthropic usage",
+    ["type"],
+)
+DECISIONS = Counter(
+    "yieldmind_decisions_total", "Rebalance decisions by outcome and how they were made",
+    ["outcome", "path"],
+)
+REBALANCE_DURATION = Histogram(
+    "yieldmind_rebalance_execution_seconds", "Time to execute (or submit) a rebalance",
+    buckets=_LATENCY_BUCKETS,
+)
+ERRORS = Counter(
+    "yieldmind_errors_total", "Errors by component",
+    ["component"],
+)
+CYCLE_OUTCOMES = Counter(
+    "yieldmind_cycle_outcomes_total", "Finished cycles by trigger and outcome (wasted: no rebalance)",
+    ["source", "outcome"],
+)
+CYCLE_REACTION = Histogram(
+    "yieldmind_cycle_reaction_seconds",
+    "Adaptive scheduler: from the snapshot that first showed a rebalance signal to the end of its cycle",
+    buckets=_LATENCY_BUCKETS + (300, 600, 1800),
+)
+RESPONSE_CACHE = Counter(
+    "yieldmind_response_cache_total",
+    "Read endpoint responses by cache result (hit, rebuilt, not_modified: 304 sent)",
+    ["endpoint", "result"],
+)
+LAST_CYCLE_TIMESTAMP = Gauge(
+    "yieldmind_last_cycle_timestamp_seconds", "Unix time the last cycle finished",
+    multiprocess_mode="max",
+)
+CYCLE_LAG = Gauge(
+    "yieldmind_cycle_lag_seconds",
+    "How far the next cycle is behind schedule (0 while on time)",
+    multiprocess_mode="livemax",
+)
+
+_schedule = {"interval": None, "last_start": None}
+
+
+def _cycle_lag() -> float:
+    interval, last_start = _schedule["interval"], _schedule["last_start"]
+    if interval is None or last_start is None:
+        return 0.0
+    return max(0.0, time.time() - last_start - interval)
+
+
+if not MULTIPROCESS:
+    # Evaluated at scrape time rather than on a timer. Another worker may serve
+    # the scrape in multiprocess mode, so there refresh_cycle_lag() runs on a timer.
+    CYCLE_LAG.set_function(_cycle_lag)
+
+
+def refresh_cycle_lag() -> None:
+    CYCLE_LAG.set(_cycle_lag())
+
+
+def set_cycle_interval(seconds: Optional[float]) -> None:
+    _schedule["interval"] = seconds
+
+
+def cycle_started() -> None:
+    _schedule["last_start"] = time.time()
+
+
+def cycles_stopped() -> None:
+    """This process no longer runs cycles (e.g. lost the leader lease)"""
+    _schedule["last_start"] = None
+    if MULTIPROCESS:
+        refresh_cycle_lag()
+
+
+def render() -> bytes:
+    """Exposition text for /metrics"""
+    if not MULTIPROCESS:
+        return generate_latest()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def process_exited() -> None:
+    """Drop this worker's live gauges from the merged view"""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def record_usage(usage: Any) -> None:
+    """Token counters from an Anthropic `usage` object (missing fields are skipped)"""
+    for field, label in (
+        ("input_tokens", "input"),
+        ("output_tokens", "output"),
+        ("cache_read_input_tokens", "cache_read"),
+        ("cache_creation_input_tokens", "cache_write"),
+    ):
+        value = getattr(usage, field, None)
+        if value:
+            LLM_TOKENS.labels(label).inc(value)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List, Literal
+from typing import Dict, Optional, List, Literal
 from datetime import datetime
 
 class Protocol(BaseModel):
@@ -8,6 +8,14 @@ class Protocol(BaseModel):
     tvl: str
     risk_score: int
     is_active: bool = False
+    # "stale": last real value, served while the source is failing; "fallback": configured constant
+    source: Literal["fresh", "stale", "fallback"] = "fresh"
+    # Age of a stale value
+    age_seconds: Optional[float] = None
+
+class ProtocolSnapshot(BaseModel):
+    protocols: List[Protocol]
+    fetched_at: datetime
 
 class RebalanceDecision(BaseModel):
     should_rebalance: bool
@@ -22,27 +30,181 @@ class RebalanceEvent(BaseModel):
     amount: str
     reason: str
     tx_hash: Optional[str] = None
+    # None for rows recorded before transaction tracking existed
+    status: Optional[Literal["simulated", "pending", "confirmed", "failed"]] = None
+
+
+class AllocationMove(BaseModel):
+    from_protocol: str
+    to_protocol: str
+    # Percent of the vault moved
+    percentage: float
+
+class AllocationPlan(BaseModel):
+    # Target percent of the vault per protocol (protocols at 0% are omitted)
+    weights: Dict[str, float]
+    moves: List[AllocationMove]
+    expected_apy: float
+    current_apy: float
+    # Weighted-average risk score of the target
+    risk: float
+    risk_budget: Optional[float] = None
+    turnover_percentage: float
+    # Annualized APY given up to turnover costs
+    cost_apy: float
+    # expected_apy - current_apy - cost_apy
+    net_improvement: float
+    # False when the current split breaks a cap, floor or the risk budget
+    current_feasible: bool = True
+
+
+class DecisionCacheStats(BaseModel):
+    hits: int
+    misses: int
+    size: int
+
 
+class SourceHealth(BaseModel):
+    name: str
+    adapter: str
+    pools: int
+    state: Literal["closed", "open", "half_open"]
+    consecutive_failures: int
+    retry_in_seconds: float
+    last_success: Optional[datetime] = None
+    last_error: Optional[str] = None
+
+class RpcEndpointHealth(BaseModel):
+    name: str
+    state: Literal["closed", "open", "half_open"]
+    latency_ms: Optional[float] = None
+    error_rate: float
+    head_block: Optional[int] = None
+    lag_blocks: int = 0
+    lagging: bool = False
+    sticky: bool = False
+    requests: int = 0
+    failures: int = 0
+    last_error: Optional[str] = None
 
 class ProtocolsResponse(BaseModel):
     protocols: List[Protocol]
     ai_status: str
+    decision_cache: Optional[DecisionCacheStats] = None
+    sources: List[SourceHealth] = []
+
+
+class ApyHistoryBucket(BaseModel):
+    timestamp: datetime
+    min_apy: float
+    max_apy: float
+    mean_apy: float
+    mean_tvl: Optional[float] = None
+    samples: int
+    fallback_samples: int
+
+
+class ProtocolHistory(BaseModel):
+    name: str
+    buckets: List[ApyHistoryBucket]
+
+
+class ProtocolHistoryResponse(BaseModel):
+    start: datetime
+    end: datetime
+    resolution_seconds: int
+    history: List[ProtocolHistory]
+
+
+class VaultCycleStatus(BaseModel):
+    vault_id: str
+    status: str
+    last_run: Optional[datetime] = None
+    last_error: Optional[str] = None
+    # Latest plan from the allocation optimizer (ANTHROPIC_DECISION_MODE=allocation)
+    allocation_plan: Optional[AllocationPlan] = None
+
+
+class VaultChainState(BaseModel):
+    block_number: int
+    balance_wei: int
+    rebalance_count: int
+    current_protocol_address: str
+    total_deposits_wei: int
 
 
 class VaultStatusResponse(BaseModel):
     balance: str
     current_protocol: Optional[str] = None
     agent_initialized: bool = True
+    vault_id: Optional[str] = None
+    ai_status: Optional[str] = None
+    last_run: Optional[datetime] = None
+    block_number: Optional[int] = None
+    total_deposited: Optional[str] = None
+    total_withdrawn: Optional[str] = None
+    indexed_block: Optional[int] = None
+    rpc_endpoints: List[RpcEndpointHealth] = []
+
+
+class VaultSummary(BaseModel):
+    vault_id: str
+    address: str
+    current_protocol: str
+    # Percent of the vault per protocol
+    allocation: Dict[str, float] = {}
+    status: VaultCycleStatus
+
+
+class VaultsResponse(BaseModel):
+    vaults: List[VaultSummary]
 
 
 class RebalancesResponse(BaseModel):
     rebalances: List[RebalanceEvent]
+    next_cursor: Optional[str] = None
 
 
 class TriggerCycleResponse(BaseModel):
-    status: Literal["success", "error"]
+    status: Literal["accepted", "success", "error"]
     message: str
     last_run: Optional[datetime] = None
+    job_id: Optional[str] = None
+
+
+class CycleJobResponse(BaseModel):
+    job_id: str
+    state: Literal["running", "succeeded", "failed"]
+    source: str
+    message: Optional[str] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    rebalances: Optional[int] = None
+
+
+class RebalanceSignal(BaseModel):
+    vault_id: str
+    current_protocol: Optional[str] = None
+    best_protocol: str
+    # Risk-adjusted spread (allocation mode: net improvement of the optimal split)
+    spread: float
+    threshold: float
+    actionable: bool
+
+
+class SchedulerStatusResponse(BaseModel):
+    mode: Literal["interval", "adaptive"]
+    # Finished cycles per trigger source and outcome ("acted", "wasted", "failed")
+    cycles: Dict[str, Dict[str, int]] = {}
+    wasted_cycles: int = 0
+    poll_seconds: Optional[float] = None
+    polls: int = 0
+    deferred: int = 0
+    last_trigger: Optional[str] = None
+    reaction_p50_seconds: Optional[float] = None
+    reaction_p95_seconds: Optional[float] = None
+    last_reaction_seconds: Optional[float] = None
+    signals: List[RebalanceSignal] = []
 
 
 class BackendRootResponse(BaseModel):
@@ -1,114 +1,160 @@
-from typing import List
-import httpx
-from app.models import Protocol
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import math
+import time
+from datetime import datetime, timezone
+from app import metrics
+from app.adapters import (
+    ADAPTER_TYPES,
+    PoolConfig,
+    PoolQuote,
+    ProtocolAdapter,
+    ProtocolConfig,
+    display_tvl,
+    load_protocol_config,
+)
+from app.circuit_breaker import CircuitBreaker
+from app.config import get_float_env, get_int_env
+from app.http_client import fetch_timeout_seconds
+from app.models import Protocol, SourceHealth
+
+# Gauge values for APY_SOURCE_STATE
+_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
 
 class ProtocolManager:
-    """Manages fetching APY data from DeFi protocols on BSC"""
-    
-    def __init__(self):
-        self.protocols = {
-            "PancakeSwap V3": {
-                "url": "https://api.pancakeswap.info/api/v2/summary",
-                "risk_score": 3
-            },
-            "Venus": {
-                "url": "https://api.venus.io/api/governance/venus",
-                "risk_score": 4
-            },
-            "Lista DAO": {
-                "url": "https://api.lista.org/v1/apy",  # TODO: Replace with actual Lista DAO API endpoint before production
-                "risk_score": 5
-            }
+    """Fetches APY data for every configured pool through its source adapter.
+
+    Pools are grouped by source and each source is queried once per refresh,
+    however many pools it serves. Every source has a circuit breaker: while it
+    is open the source is not called at all, and its pools are served from
+    their last real value (`source="stale"`, with its age) instead.
+    """
+
+    def __init__(self, config: Optional[ProtocolConfig] = None):
+        config = config or load_protocol_config()
+        self.pools: Dict[str, PoolConfig] = {pool.name: pool for pool in config.pools}
+        self.sources: Dict[str, ProtocolAdapter] = {
+            name: ADAPTER_TYPES[source.adapter](name, source) for name, source in config.sources.items()
         }
-    
+        self._pools_by_source: Dict[str, List[PoolConfig]] = {name: [] for name in self.sources}
+        for pool in config.pools:
+            self._pools_by_source[pool.source].append(pool)
+        self.timeout_seconds = fetch_timeout_seconds()
+        failure_threshold = get_int_env("APY_BREAKER_FAILURES", 3)
+        base_backoff = get_float_env("APY_BREAKER_BACKOFF_SECONDS", 30.0)
+        max_backoff = get_float_env("APY_BREAKER_MAX_BACKOFF_SECONDS", 600.0)
+        self.breakers: Dict[str, CircuitBreaker] = {
+            name: CircuitBreaker(failure_threshold, base_backoff, max_backoff) for name in self.sources
+        }
+        self.last_errors: Dict[str, Optional[str]] = {name: None for name in self.sources}
+        # Last real quote per pool and the wall-clock time it was fetched
+        self._last_good: Dict[str, Tuple[PoolQuote, float]] = {}
+
     async def fetch_all_apys(self) -> List[Protocol]:
-        """Fetch APY data from all protocols"""
+        """Fetch APY data for all pools, one concurrent upstream call per source.
+
+        Each source runs under its own deadline, so total latency is bounded by
+        the slowest single source; sources with an open breaker cost nothing.
+        Pools their source could not price get the last real value if there is
+        one (`source="stale"`), else their configured fallback APY.
+        """
+        names = [name for name, pools in self._pools_by_source.items() if pools]
+        results = await asyncio.gather(*(self._fetch_source(name) for name in names))
+        quotes: Dict[str, PoolQuote] = {}
+        outcomes: Dict[str, str] = {}
+        for name, (source_quotes, outcome) in zip(names, results):
+            quotes.update(source_quotes)
+            outcomes[name] = outcome
+
+        now = time.time()
         protocols = []
-        
-        # PancakeSwap V3
-        try:
-            apy = await self.fetch_pancakeswap_apy()
-            protocols.append(Protocol(
-                name="PancakeSwap V3",
-                apy=apy,
-                tvl="$2.1B",
-                risk_score=3,
-                is_active=False
-            ))
-        except Exception as e:
-            print(f"Error fetching PancakeSwap: {e}")
-            # Use fallback data
-            protocols.append(Protocol(
-                name="PancakeSwap V3",
-                apy=12.5,
-                tvl="$2.1B",
-                risk_score=3,
-                is_active=False
-            ))
-        
-        # Venus
-        try:
-            apy = await self.fetch_venus_apy()
+        for pool in self.pools.values():
+            quote = quotes.get(pool.name)
+            source, age = "fresh", None
+            if quote is not None:
+                self._last_good[pool.name] = (quote, now)
+            else:
+                outcome = outcomes[pool.source]
+                metrics.APY_FALLBACKS.labels(pool.name, "missing" if outcome == "fresh" else outcome).inc()
+                if pool.name in self._last_good:
+                    quote, fetched_at = self._last_good[pool.name]
+                    source, age = "stale", round(now - fetched_at, 1)
+                else:
+                    source = "fallback"
             protocols.append(Protocol(
-                name="Venus",
-                apy=apy,
-                tvl="$1.8B",
-                risk_score=4,
-                is_active=False
+                name=pool.name,
+                apy=quote.apy if quote is not None else pool.fallback_apy,
+                tvl=display_tvl(pool, quote),
+                risk_score=pool.risk_score,
+                is_active=False,
+                source=source,
+                age_seconds=age,
             ))
-        except Exception as e:
-            print(f"Error fetching Venus: {e}")
-            protocols.append(Protocol(
-                name="Venus",
-                apy=15.2,
-                tvl="$1.8B",
-                risk_score=4,
-                is_active=False
+        return protocols
+
+    def source_health(self) -> List[SourceHealth]:
+        """Breaker state of every source, for the API"""
+        health = []
+        for name, adapter in self.sources.items():
+            breaker = self.breakers[name]
+            health.append(SourceHealth(
+                name=name,
+                adapter=adapter.config.adapter,
+                pools=len(self._pools_by_source[name]),
+                state=breaker.state,
+                consecutive_failures=breaker.consecutive_failures,
+                retry_in_seconds=round(breaker.retry_in(), 1),
+                last_success=(
+                    datetime.fromtimestamp(breaker.last_success, timezone.utc)
+                    if breaker.last_success is not None else None
+                ),
+                last_error=self.last_errors[name],
             ))
-        
-        # Lista DAO
+        return health
+
+    def health_version(self) -> Tuple:
+        """Changes whenever `source_health()` would (retry countdowns: once per second)"""
+        return tuple(
+            (
+                breaker.state,
+                breaker.consecutive_failures,
+                breaker.last_success,
+                self.last_errors[name],
+                math.ceil(breaker.retry_in()),
+            )
+            for name, breaker in self.breakers.items()
+        )
+
+    async def _fetch_source(self, name: str) -> Tuple[Dict[str, PoolQuote], str]:
+        """Quotes from one source plus its outcome ("fresh", "timeout", "error" or "open")"""
+        adapter = self.sources[name]
+        breaker = self.breakers[name]
+        if not breaker.allow():
+            return {}, "open"
+
+        timeout = adapter.config.timeout or self.timeout_seconds
+        started = time.perf_counter()
         try:
-            apy = await self.fetch_lista_apy()
-            protocols.append(Protocol(
-                name="Lista DAO",
-                apy=apy,
-                tvl="$850M",
-                risk_score=5,
-                is_active=False
-            ))
+            quotes = await asyncio.wait_for(adapter.fetch(self._pools_by_source[name]), timeout=timeout)
+            outcome = "fresh"
+        except asyncio.TimeoutError:
+            error = f"timed out after {timeout}s"
+            quotes, outcome = {}, "timeout"
+        except asyncio.CancelledError:
+            breaker.abandon()
+            raise
         except Exception as e:
-            print(f"Error fetching Lista DAO: {e}")
-            protocols.append(Protocol(
-                name="Lista DAO",
-                apy=18.7,
-                tvl="$850M",
-                risk_score=5,
-                is_active=False
-            ))
-        
-        return protocols
-    
-    async def fetch_pancakeswap_apy(self) -> float:
-        """Fetch APY from PancakeSwap V3"""
-        # In production, this would call the actual PancakeSwap API
-        # For now, return simulated data with some variance
-        import random
-        base_apy = 12.5
-        variance = random.uniform(-2, 2)
-        return round(base_apy + variance, 2)
-    
-    async def fetch_venus_apy(self) -> float:
-        """Fetch APY from Venus Protocol"""
-        # In production, this would call the actual Venus API
-        import random
-        base_apy = 15.2
-        variance = random.uniform(-2, 2)
-        return round(base_apy + variance, 2)
-    
-    async def fetch_lista_apy(self) -> float:
-        """Fetch APY from Lista DAO"""
-        # In production, this would call the actual Lista DAO API
-        import random
-        base_apy = 18.7
-        variance = random.uniform(-3, 3)
-        return round(base_apy + variance, 2)
+            error = str(e) or type(e).__name__
+            quotes, outcome = {}, "error"
+        metrics.APY_FETCH_DURATION.labels(name, outcome).observe(time.perf_counter() - started)
+
+        if outcome == "fresh":
+            breaker.record_success()
+            self.last_errors[name] = None
+        else:
+            breaker.record_failure()
+            self.last_errors[name] = error
+            print(f"Error fetching APYs from {name}: {error} (breaker {breaker.state})")
+        metrics.APY_SOURCE_STATE.labels(name).set(_STATE_VALUES[breaker.state])
+        return quotes, outcome
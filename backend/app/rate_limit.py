@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+
+class AsyncTokenBucket:
+    """Token bucket for async callers; `acquire` waits until a token is available"""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        if rate_per_minute <= 0 or burst <= 0:
+            raise ValueError("rate_per_minute and burst must be positive")
+        self.rate_per_second = rate_per_minute / 60.0
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available right now, without waiting"""
+        self._refill()
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def acquire(self) -> None:
+        # The lock keeps waiters in FIFO order
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate_per_second)
+                self._refill()
+            self._tokens -= 1
@@ -0,0 +1,220 @@
+"""Re-run recorded cycles offline and compare them with the recording.
+
+The agent is built fresh for each trace with the recorded protocol snapshot,
+vault allocations and decision-cache hits, and with an Anthropic client that
+answers from the trace. A request is answered only if the agent sends the
+same messages, tool_choice, system prompt and tool schemas (the last two
+compared by hash) as it did when recording, so a change
+in prompts, parsing or decision logic shows up as a divergence rather than a
+silently different call. Vaults are replayed in simulation mode; no network
+is used.
+"""
+from typing import Any, Deque, Dict, List, Tuple
+from collections import defaultdict, deque
+import asyncio
+import json
+import os
+import tempfile
+
+from anthropic.types import TextBlock, ToolUseBlock, Usage
+
+from app.cycle_trace import CycleTraceRecorder, content_hash
+from app.models import Protocol, RebalanceDecision
+from app.rate_limit import AsyncTokenBucket
+from app.vault_abi import PROTOCOL_ADDRESSES
+
+_BLOCK_TYPES = {"text": TextBlock, "tool_use": ToolUseBlock}
+
+
+class ReplayMismatch(Exception):
+    """The agent sent a request the trace has no response for"""
+
+
+def _request_key(request: Dict[str, Any]) -> str:
+    """Match key of a recorded request (see CycleTrace.record_llm)"""
+    fields = ("messages", "tools", "tool_choice", "system_hash", "tools_hash")
+    return json.dumps({field: request.get(field) for field in fields}, sort_keys=True, default=str)
+
+
+class RecordedMessage:
+    """Just the attributes AIAgent reads from a Claude response"""
+
+    def __init__(self, response: Dict[str, Any]):
+        self.content = [
+            _BLOCK_TYPES[block["type"]].model_validate(block) if block.get("type") in _BLOCK_TYPES else block
+            for block in response["content"]
+        ]
+        self.stop_reason = response["stop_reason"]
+        self.usage = Usage.model_validate(response["usage"]) if response.get("usage") else None
+
+
+class _ReplayMessages:
+    def __init__(self, client: "ReplayAnthropicClient"):
+        self._client = client
+
+    async def create(self, **kwargs: Any) -> RecordedMessage:
+        return await self._client.respond(**kwargs)
+
+
+class ReplayAnthropicClient:
+    """Stands in for `AsyncAnthropic().beta.prompt_caching.messages` with recorded answers.
+
+    With `realtime` each answer waits as long as the recorded call took.
+    """
+
+    def __init__(self, llm_calls: List[Dict[str, Any]], realtime: bool = False):
+        self.realtime = realtime
+        self.calls = 0
+        self.unmatched: List[Dict[str, Any]] = []
+        self._recorded: Dict[str, Deque[Dict[str, Any]]] = defaultdict(deque)
+        for call in llm_calls:
+            self._recorded[_request_key(call["request"])].append(call)
+        messages = _ReplayMessages(self)
+        self.beta = type("Beta", (), {"prompt_caching": type("PromptCaching", (), {"messages": messages})()})()
+
+    async def respond(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]], **kwargs: Any) -> RecordedMessage:
+        self.calls += 1
+        plain = json.loads(json.dumps(messages, default=lambda o: o.model_dump(mode="json") if hasattr(o, "model_dump") else str(o)))
+        names = [tool["name"] for tool in tools]
+        queue = self._recorded.get(_request_key({
+            "messages": plain,
+            "tools": names,
+            "tool_choice": kwargs.get("tool_choice"),
+            "system_hash": content_hash(kwargs.get("system")),
+            "tools_hash": content_hash(tools),
+        }))
+        if not queue:
+            self.unmatched.append({"tools": names, "messages": plain})
+            raise ReplayMismatch("No recorded response for this request")
+        call = queue.popleft()
+        if self.realtime:
+            await asyncio.sleep(call["seconds"])
+        if "response" not in call:
+            raise RuntimeError(call.get("error", "Recorded Claude call failed"))
+        return RecordedMessage(call["response"])
+
+    @property
+    def unused(self) -> int:
+        return sum(len(queue) for queue in self._recorded.values())
+
+
+class ReplayResult:
+    def __init__(self, recorded: Dict[str, Any], replayed: Dict[str, Any], client: ReplayAnthropicClient):
+        self.recorded = recorded
+        self.replayed = replayed
+        self.unmatched = client.unmatched
+        self.unused = client.unused
+        self.differences = self._compare()
+
+    @staticmethod
+    def _outcome(vault: Dict[str, Any]) -> Tuple:
+        decision = vault.get("decision") or {}
+        return (
+            vault.get("path"),
+            decision.get("should_rebalance"),
+            decision.get("target_protocol") if decision.get("should_rebalance") else None,
+            vault.get("error") is not None,
+        )
+
+    def _compare(self) -> List[str]:
+        differences = []
+        recorded = {v["vault_id"]: v for v in self.recorded["vaults"]}
+        replayed = {v["vault_id"]: v for v in self.replayed["vaults"]}
+        for vault_id, vault in recorded.items():
+            again = replayed.get(vault_id)
+            if again is None:
+                differences.append(f"{vault_id}: not replayed")
+            elif self._outcome(vault) != self._outcome(again):
+                differences.append(f"{vault_id}: recorded {self._outcome(vault)}, replayed {self._outcome(again)}")
+        if self.unmatched:
+            differences.append(f"{len(self.unmatched)} Claude request(s) differ from the recording")
+        if self.unused:
+            differences.append(f"{self.unused} recorded Claude response(s) were never requested")
+        return differences
+
+    @staticmethod
+    def local_seconds(trace: Dict[str, Any]) -> float:
+        """Cycle time spent in the agent itself: total minus APY fetch and Claude waits.
+
+        Claude calls of concurrent vaults overlap, so with several vaults this
+        is a lower bound.
+        """
+        stages = trace["stages"]
+        total = sum(stages.get("cycle", []))
+        waited = sum(stages.get("fetch_protocols", [])) + sum(stages.get("llm", []))
+        return max(0.0, total - waited)
+
+    @property
+    def matches(self) -> bool:
+        return not self.differences
+
+
+def _env_for(trace: Dict[str, Any], data_dir: str) -> Dict[str, str]:
+    vaults = [
+        {
+            "id": vault["vault_id"],
+            # Empty address: simulated execution, no chain access
+            "address": "",
+            "initial_protocol": (vault.get("current_allocation") or {}).get("protocol") or "PancakeSwap V3",
+        }
+        for vault in trace["vaults"]
+    ]
+    return {
+        "YIELDMIND_DATA_DIR": data_dir,
+        "REBALANCE_DB_PATH": os.path.join(data_dir, "yieldmind.db"),
+        "APY_HISTORY_DIR": os.path.join(data_dir, "apy_history"),
+        "CYCLE_TRACE_DIR": "",
+        "VAULTS": json.dumps(vaults),
+        "VAULTS_FILE": "",
+        "ANTHROPIC_API_KEY": "replay",
+        "ANTHROPIC_MODEL": trace["model"],
+        "ANTHROPIC_DECISION_MODE": trace["decision_mode"],
+        "VAULT_CYCLE_CONCURRENCY": str(trace["vault_concurrency"]),
+        "PRIVATE_KEY": "",
+        "BSC_RPC_URLS": "",
+    }
+
+
+async def replay_trace(trace: Dict[str, Any], realtime: bool = False) -> ReplayResult:
+    """Run one recorded cycle through a fresh agent"""
+    # Imported here: the agent module reads its settings from the environment we set
+    from app.ai_agent import AIAgent
+
+    with tempfile.TemporaryDirectory(prefix="yieldmind-replay-") as data_dir:
+        os.environ.update(_env_for(trace, data_dir))
+        agent = AIAgent()
+        client = ReplayAnthropicClient(trace["llm"], realtime=realtime)
+        agent.client = client
+        agent.tracer = CycleTraceRecorder(None)
+        agent.llm_rate_limiter = AsyncTokenBucket(rate_per_minute=1e9, burst=1_000_000)
+        protocols = [Protocol.model_validate(p) for p in trace["protocols"]]
+
+        async def recorded_apys() -> List[Protocol]:
+            return [p.model_copy() for p in protocols]
+
+        agent.protocol_manager.fetch_all_apys = recorded_apys
+        for vault in trace["vaults"]:
+            manager = agent.vaults.get(vault["vault_id"])
+            allocation = vault.get("current_allocation")
+            if manager is not None and allocation:
+                manager.current_protocol = allocation.get("protocol")
+                manager.allocation = dict(allocation.get("allocation") or {allocation.get("protocol"): 100.0})
+            if manager is not None and vault.get("onchain"):
+                # Simulated here, but limited to the targets the recorded vault contract had
+                manager.can_target = PROTOCOL_ADDRESSES.__contains__
+
+        # Decisions the recording got from its cache are primed, so no Claude call is expected for them
+        protocol_data = [
+            {"name": p.name, "apy": p.apy, "tvl": p.tvl, "risk_score": p.risk_score} for p in protocols
+        ]
+        for hit in trace["cache_hits"]:
+            key = agent.decision_cache.make_key(protocol_data, hit["current_allocation"])
+            agent.decision_cache.put(key, RebalanceDecision.model_validate(hit["decision"]))
+
+        try:
+            await agent.run_cycle()
+        finally:
+            agent.vaults.history.close()
+            agent.vaults.event_store.close()
+            agent.apy_history.flush()
+        return ReplayResult(trace, agent.tracer.last, client)
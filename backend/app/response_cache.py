@@ -0,0 +1,105 @@
+"""Pre-serialized read responses with conditional GET.
+
+Each entry holds the encoded body of one endpoint + query, tagged with the
+state version it was built from. Routes pass a cheap version tuple (snapshot
+identity, store write counters, head block, ...); the model is only rebuilt
+and encoded when that tuple changes. The ETag is a hash of the body, so it is
+stable across rebuilds that produce the same bytes and across workers, and a
+matching `If-None-Match` is answered with 304 and no body.
+"""
+from typing import Any, Callable, Hashable, Optional
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+import hashlib
+
+import orjson
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from app import metrics
+
+# Same JSON as FastAPI's encoder for our models (UTC datetimes end in "Z")
+_ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+def encode(model: BaseModel) -> bytes:
+    return orjson.dumps(model.model_dump(), option=_ORJSON_OPTIONS)
+
+
+class CachedBody:
+    def __init__(self, version: Any, body: bytes, last_modified: datetime):
+        self.version = version
+        self.body = body
+        self.etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        self.last_modified = last_modified
+        self.headers = {
+            "ETag": self.etag,
+            "Last-Modified": format_datetime(last_modified, usegmt=True),
+            # Let browsers keep the body but revalidate every poll
+            "Cache-Control": "no-cache",
+        }
+
+
+class ResponseCache:
+    """LRU of encoded responses keyed by (endpoint, query), rebuilt on version change"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CachedBody]" = OrderedDict()
+
+    def body(self, endpoint: str, key: Hashable, version: Any, build: Callable[[], BaseModel]) -> CachedBody:
+        cache_key = (endpoint, key)
+        entry = self._entries.get(cache_key)
+        if entry is not None and entry.version == version:
+            self._entries.move_to_end(cache_key)
+            metrics.RESPONSE_CACHE.labels(endpoint, "hit").inc()
+            return entry
+
+        body = encode(build())
+        if entry is not None and entry.body == body:
+            # State moved but the response didn't: keep validators so clients still get 304s
+            fresh = CachedBody(version, body, entry.last_modified)
+        else:
+            # HTTP dates have whole seconds
+            fresh = CachedBody(version, body, datetime.now(timezone.utc).replace(microsecond=0))
+        self._entries[cache_key] = fresh
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        metrics.RESPONSE_CACHE.labels(endpoint, "rebuilt").inc()
+        return fresh
+
+    def respond(
+        self, request: Request, endpoint: str, key: Hashable, version: Any, build: Callable[[], BaseModel]
+    ) -> Response:
+        """The cached body as a response, or 304 if the client's validators still match"""
+        entry = self.body(endpoint, key, version, build)
+        if not_modified(request, entry):
+            metrics.RESPONSE_CACHE.labels(endpoint, "not_modified").inc()
+            return Response(status_code=304, headers=entry.headers)
+        return Response(content=entry.body, media_type="application/json", headers=entry.headers)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def not_modified(request: Request, entry: CachedBody) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, as RFC 9110 requires for If-None-Match
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or entry.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        since = _parse_http_date(if_modified_since)
+        return since is not None and entry.last_modified <= since
+    return False
+
+
+def _parse_http_date(value: str) -> Optional[datetime]:
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
@@ -1,70 +1,327 @@
-from fastapi import APIRouter
+from typing import Optional
+import math
+from datetime import datetime, timedelta, timezone
+import asyncio
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from web3 import Web3
 from app.models import (
+    ApyHistoryBucket,
+    CycleJobResponse,
+    ProtocolHistory,
+    ProtocolHistoryResponse,
     ProtocolsResponse,
     VaultStatusResponse,
     RebalancesResponse,
+    SchedulerStatusResponse,
     TriggerCycleResponse,
+    VaultsResponse,
+    VaultSummary,
 )
 from app.ai_agent import AIAgent
+from app.response_cache import ResponseCache
+from app.rpc_pool import RpcEndpointPool
+from app.vault_manager import VaultManager
 
 router = APIRouter()
 
+# Upper bound on buckets per protocol in one history response
+MAX_HISTORY_BUCKETS = 5000
+# Comment frame sent when a stream is idle, so proxies keep the connection open
+STREAM_HEARTBEAT_SECONDS = 15.0
+
+# Encoded read responses (endpoint + query combinations kept)
+RESPONSE_CACHE_ENTRIES = 256
+
 # Shared AI agent instance (will be injected from main)
 ai_agent: AIAgent = None
+response_cache = ResponseCache(max_entries=RESPONSE_CACHE_ENTRIES)
 
 def set_ai_agent(agent: AIAgent):
     global ai_agent
     ai_agent = agent
+    response_cache.clear()
+
+def _get_vault(vault_id: Optional[str]) -> VaultManager:
+    vault = ai_agent.vaults.get(vault_id)
+    if vault is None:
+        raise HTTPException(status_code=404, detail=f"Unknown vault: {vault_id}")
+    return vault
 
 @router.get("/protocols", response_model=ProtocolsResponse)
-async def get_protocols() -> ProtocolsResponse:
+async def get_protocols(request: Request, vault_id: Optional[str] = None) -> Response:
     """Get current protocol APY data"""
     if ai_agent is None:
-        return ProtocolsResponse(protocols=[], ai_status="Not initialized")
-    
-    protocols = await ai_agent.protocol_manager.fetch_all_apys()
-    
-    # Mark current protocol as active
-    current = ai_agent.vault_manager.current_protocol
-    for p in protocols:
-        if p.name == current:
-            p.is_active = True
+        return response_cache.respond(
+            request, "protocols", None, None, lambda: ProtocolsResponse(protocols=[], ai_status="Not initialized")
+        )
     
-    return ProtocolsResponse(protocols=protocols, ai_status=ai_agent.status)
+    vault = _get_vault(vault_id)
+    snapshot = await ai_agent.protocol_cache.get()
+    current = vault.current_protocol
+    decision_cache = ai_agent.decision_cache.stats()
+    version = (snapshot.fetched_at, current, ai_agent.status, decision_cache, ai_agent.protocol_manager.health_version())
+
+    def build() -> ProtocolsResponse:
+        # Mark current protocol as active (copies, so the cached snapshot stays untouched)
+        protocols = [
+            p.model_copy(update={"is_active": p.name == current})
+            for p in snapshot.protocols
+        ]
+        return ProtocolsResponse(
+            protocols=protocols,
+            ai_status=ai_agent.status,
+            decision_cache=decision_cache,
+            sources=ai_agent.protocol_manager.source_health(),
+        )
+
+    return response_cache.respond(request, "protocols", vault.vault_id, version, build)
+
+@router.get("/protocols/history", response_model=ProtocolHistoryResponse)
+async def get_protocol_history(
+    protocol: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: int = Query(3600, ge=1, description="Bucket width in seconds"),
+) -> ProtocolHistoryResponse:
+    """Get downsampled APY history (min/max/mean per bucket)"""
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=1)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if (end - start).total_seconds() / resolution > MAX_HISTORY_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Too many buckets (max {MAX_HISTORY_BUCKETS}); increase resolution")
+
+    if ai_agent is None:
+        return ProtocolHistoryResponse(start=start, end=end, resolution_seconds=resolution, history=[])
+
+    if protocol is not None:
+        names = [protocol]
+    else:
+        names = list(ai_agent.protocol_manager.pools)
+
+    history = []
+    for name in names:
+        series = ai_agent.apy_history.series(name)
+        if series is None:
+            history.append(ProtocolHistory(name=name, buckets=[]))
+            continue
+
+        buckets = series.downsample(start.timestamp(), end.timestamp(), resolution)
+        history.append(ProtocolHistory(
+            name=name,
+            buckets=[
+                ApyHistoryBucket(
+                    timestamp=datetime.fromtimestamp(ts, tz=timezone.utc),
+                    min_apy=round(lo, 4),
+                    max_apy=round(hi, 4),
+                    mean_apy=round(mean, 4),
+                    mean_tvl=tvl if math.isfinite(tvl) else None,
+                    samples=count,
+                    fallback_samples=fallback,
+                )
+                for ts, lo, hi, mean, tvl, count, fallback in zip(
+                    buckets["bucket_start"].tolist(),
+                    buckets["min"].tolist(),
+                    buckets["max"].tolist(),
+                    buckets["mean"].tolist(),
+                    buckets["tvl_mean"].tolist(),
+                    buckets["count"].tolist(),
+                    buckets["fallback_count"].tolist(),
+                )
+            ],
+        ))
+
+    return ProtocolHistoryResponse(start=start, end=end, resolution_seconds=resolution, history=history)
 
 @router.get("/vault/status", response_model=VaultStatusResponse)
-async def get_vault_status() -> VaultStatusResponse:
+async def get_vault_status(request: Request, vault_id: Optional[str] = None) -> Response:
     """Get vault status and balance"""
     if ai_agent is None:
-        return VaultStatusResponse(balance="0", current_protocol=None, agent_initialized=False)
+        return response_cache.respond(
+            request, "vault_status", None, None,
+            lambda: VaultStatusResponse(balance="0", current_protocol=None, agent_initialized=False),
+        )
     
-    balance = await ai_agent.vault_manager.get_balance()
-    return VaultStatusResponse(
-        balance=balance,
-        current_protocol=ai_agent.vault_manager.current_protocol,
-        agent_initialized=ai_agent.client is not None and ai_agent.last_error is None,
+    vault = _get_vault(vault_id)
+    try:
+        chain_state = await vault.get_chain_state()
+        balance = await vault.get_balance()
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Vault RPC read failed: {e}")
+    vault_status = ai_agent.vault_status[vault.vault_id]
+    indexer = ai_agent.vaults.indexer
+    rpc = ai_agent.vaults.rpc
+    pool = rpc if isinstance(rpc, RpcEndpointPool) else None
+    event_store = ai_agent.vaults.event_store
+    agent_initialized = ai_agent.client is not None and ai_agent.last_error is None
+    version = (
+        chain_state.block_number if chain_state is not None else None,
+        balance,
+        vault.current_protocol,
+        agent_initialized,
+        vault_status.status,
+        vault_status.last_run,
+        event_store.version() if vault.is_onchain else None,
+        indexer.indexed_block if indexer is not None else None,
+        pool.health_version() if pool is not None else None,
     )
 
+    def build() -> VaultStatusResponse:
+        totals = event_store.totals(vault.vault_address) if vault.is_onchain else None
+        return VaultStatusResponse(
+            balance=balance,
+            current_protocol=vault.current_protocol,
+            agent_initialized=agent_initialized,
+            vault_id=vault.vault_id,
+            ai_status=vault_status.status,
+            last_run=vault_status.last_run,
+            block_number=chain_state.block_number if chain_state is not None else None,
+            total_deposited=str(Web3.from_wei(totals["Deposit"], "ether")) if totals else None,
+            total_withdrawn=str(Web3.from_wei(totals["Withdraw"], "ether")) if totals else None,
+            indexed_block=indexer.indexed_block if indexer is not None else None,
+            rpc_endpoints=pool.endpoint_health() if pool is not None else [],
+        )
+
+    return response_cache.respond(request, "vault_status", vault.vault_id, version, build)
+
+@router.get("/vaults", response_model=VaultsResponse)
+async def get_vaults() -> VaultsResponse:
+    """List managed vaults with their cycle status"""
+    if ai_agent is None:
+        return VaultsResponse(vaults=[])
+
+    return VaultsResponse(vaults=[
+        VaultSummary(
+            vault_id=vault.vault_id,
+            address=vault.vault_address,
+            current_protocol=vault.current_protocol,
+            allocation=vault.allocation,
+            status=ai_agent.vault_status[vault.vault_id],
+        )
+        for vault in ai_agent.vaults
+    ])
+
 @router.get("/rebalances", response_model=RebalancesResponse)
-async def get_rebalances() -> RebalancesResponse:
-    """Get rebalance history"""
+async def get_rebalances(
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    protocol: Optional[str] = None,
+    vault_id: Optional[str] = None,
+) -> Response:
+    """Get rebalance history, newest first, with cursor pagination"""
     if ai_agent is None:
-        return RebalancesResponse(rebalances=[])
+        return response_cache.respond(request, "rebalances", None, None, lambda: RebalancesResponse(rebalances=[]))
+
+    try:
+        cursor_id = int(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     
-    history = ai_agent.vault_manager.get_rebalance_history()
-    return RebalancesResponse(rebalances=history)
+    vault = _get_vault(vault_id)
+
+    def build() -> RebalancesResponse:
+        history, next_cursor = vault.get_rebalance_history(
+            limit=limit, cursor=cursor_id, since=since, until=until, protocol=protocol
+        )
+        return RebalancesResponse(
+            rebalances=history,
+            next_cursor=str(next_cursor) if next_cursor is not None else None,
+        )
+
+    key = (vault.vault_id, limit, cursor_id, since, until, protocol)
+    return response_cache.respond(request, "rebalances", key, vault.history.version(), build)
+
+@router.get("/stream")
+async def stream_events(request: Request) -> StreamingResponse:
+    """Server-sent events: status transitions, protocol snapshots and rebalances"""
+    if ai_agent is None:
+        raise HTTPException(status_code=503, detail="AI agent not initialized")
+
+    subscription = ai_agent.events.subscribe()
+    if subscription is None:
+        raise HTTPException(status_code=503, detail="Too many stream subscribers")
+
+    async def event_source():
+        try:
+            # Current state first, so a new client doesn't wait for the next change
+            yield ai_agent.events.encode("status", {"status": ai_agent.status})
+            snapshot = ai_agent.protocol_cache.snapshot
+            if snapshot is not None:
+                yield ai_agent.events.encode("protocols", snapshot.model_dump(mode="json"))
+
+            while not await request.is_disconnected():
+                try:
+                    frame = await asyncio.wait_for(subscription.queue.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield frame
+        finally:
+            ai_agent.events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @router.post("/trigger-cycle", response_model=TriggerCycleResponse)
 async def trigger_cycle() -> TriggerCycleResponse:
-    """Manually trigger an AI optimization cycle"""
+    """Start an AI optimization cycle as a background job (or join the running one)"""
     if ai_agent is None:
         return TriggerCycleResponse(status="error", message="AI agent not initialized")
     
-    await ai_agent.run_cycle()
     if ai_agent.client is None:
-        return TriggerCycleResponse(status="error", message=ai_agent.status, last_run=ai_agent.last_run)
+        reason = ai_agent._missing_api_key_decision().reason
+        return TriggerCycleResponse(status="error", message=reason, last_run=ai_agent.last_run)
+
+    coordinator = ai_agent.coordinator
+    if coordinator is not None and not coordinator.leading:
+        queued = coordinator.request_cycle()
+        return TriggerCycleResponse(
+            status="accepted",
+            message="AI cycle queued for the leader worker",
+            last_run=ai_agent.last_run,
+            job_id=queued.job_id,
+        )
+
+    job, created = ai_agent.cycle_jobs.trigger(source="api")
+    return TriggerCycleResponse(
+        status="accepted",
+        message="AI cycle started" if created else "AI cycle already running; attached to it",
+        last_run=ai_agent.last_run,
+        job_id=job.id,
+    )
 
-    if ai_agent.last_error is not None:
-        return TriggerCycleResponse(status="error", message=ai_agent.status, last_run=ai_agent.last_run)
+@router.get("/cycles/{job_id}", response_model=CycleJobResponse)
+async def get_cycle_job(job_id: str) -> CycleJobResponse:
+    """Get progress and outcome of a cycle job"""
+    if ai_agent is None:
+        raise HTTPException(status_code=503, detail="AI agent not initialized")
+
+    job = ai_agent.cycle_jobs.get(job_id)
+    if job is None:
+        # Jobs run by (or queued for) another worker live in the shared store
+        shared = ai_agent.coordinator.get_job(job_id) if ai_agent.coordinator is not None else None
+        if shared is None:
+            raise HTTPException(status_code=404, detail="Unknown cycle job")
+        return shared
+    return ai_agent.cycle_jobs.describe(job)
+
+@router.get("/scheduler", response_model=SchedulerStatusResponse)
+async def get_scheduler_status() -> SchedulerStatusResponse:
+    """Cycle outcomes (wasted cycles) and, in adaptive mode, live signals and reaction times"""
+    if ai_agent is None:
+        raise HTTPException(status_code=503, detail="AI agent not initialized")
 
-    return TriggerCycleResponse(status="success", message="AI cycle triggered", last_run=ai_agent.last_run)
+    if ai_agent.adaptive_scheduler is not None:
+        return ai_agent.adaptive_scheduler.status()
+    return ai_agent.cycle_jobs.summary(mode="interval")
@@ -0,0 +1,79 @@
+from typing import Any, List, Sequence, Tuple, Union
+import itertools
+
+from app.http_client import get_http_client
+
+
+class RpcError(Exception):
+    """JSON-RPC error returned by the node (or a malformed response)"""
+
+    def __init__(self, message: str, code: int = 0, data: Any = None):
+        super().__init__(message)
+        self.code = code
+        self.data = data
+
+
+class JsonRpcClient:
+    """Minimal async JSON-RPC client over the shared pooled HTTP client.
+
+    `batch` sends many calls in one HTTP request (a JSON-RPC batch), which is
+    how the vault reader avoids one round trip per contract view.
+    """
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+        self._ids = itertools.count(1)
+
+    async def _post(self, payload: Any) -> Any:
+        response = await get_http_client().post(self.url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _unwrap(reply: Any) -> Any:
+        if not isinstance(reply, dict):
+            raise RpcError(f"Malformed JSON-RPC reply: {reply!r}")
+        error = reply.get("error")
+        if error is not None:
+            raise RpcError(error.get("message", str(error)), error.get("code", 0), error.get("data"))
+        return reply.get("result")
+
+    async def call(self, method: str, params: Sequence[Any] = ()) -> Any:
+        reply = await self._post({"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": list(params)})
+        return self._unwrap(reply)
+
+    async def batch(self, calls: Sequence[Tuple[str, Sequence[Any]]]) -> List[Union[Any, RpcError]]:
+        """Run calls in one request; each slot holds the result or an RpcError"""
+        if not calls:
+            return []
+        ids = [next(self._ids) for _ in calls]
+        payload = [
+            {"jsonrpc": "2.0", "id": request_id, "method": method, "params": list(params)}
+            for request_id, (method, params) in zip(ids, calls)
+        ]
+        replies = await self._post(payload)
+        if not isinstance(replies, list):
+            # Some nodes answer a rejected batch with a single error object
+            error = self._unwrap_error(replies)
+            return [error for _ in calls]
+
+        by_id = {reply.get("id"): reply for reply in replies if isinstance(reply, dict)}
+        results: List[Union[Any, RpcError]] = []
+        for request_id in ids:
+            reply = by_id.get(request_id)
+            if reply is None:
+                results.append(RpcError(f"No reply for batch request {request_id}"))
+                continue
+            try:
+                results.append(self._unwrap(reply))
+            except RpcError as e:
+                results.append(e)
+        return results
+
+    def _unwrap_error(self, reply: Any) -> RpcError:
+        try:
+            self._unwrap(reply)
+        except RpcError as e:
+            return e
+        return RpcError(f"Unexpected batch reply: {reply!r}")
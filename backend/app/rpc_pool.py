@@ -0,0 +1,358 @@
+"""Several RPC nodes behind the JsonRpcClient interface.
+
+Reads go to the node with the lowest expected latency and are hedged: if the
+answer is slower than that node's usual p90, the same request goes to the
+next node and whichever answers first wins. Nodes whose head falls behind
+the others are skipped (and never hedged to), a read pinned to a block goes
+only to nodes known to have it, a node answering "header not found" counts as
+failed so the read moves on, and writes (and the nonce reads they depend on) stick
+to one node so a transaction and its successors see the same mempool.
+"""
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+from collections import deque
+from urllib.parse import urlparse
+import asyncio
+import time
+
+import httpx
+
+from app.circuit_breaker import CLOSED, OPEN, CircuitBreaker
+from app.metrics import RPC_ENDPOINT_LAG, RPC_HEDGES, RPC_REQUEST_DURATION
+from app.models import RpcEndpointHealth
+from app.rpc import JsonRpcClient, RpcError
+
+# Methods whose node must stay the same from one call to the next
+STICKY_METHODS = frozenset({"eth_sendRawTransaction", "eth_sendTransaction", "eth_getTransactionCount"})
+# JSON-RPC codes public nodes use for rate limiting; the reply is treated as a node failure
+_THROTTLED_CODES = frozenset({-32005, -32090, 429})
+# Error messages of a node that has not seen the requested block yet (geth, erigon, bsc)
+_UNKNOWN_BLOCK_ERRORS = ("header not found", "unknown block", "block not found")
+# Position of the block parameter of methods that take one
+_BLOCK_PARAM = {
+    "eth_call": 1,
+    "eth_getBalance": 1,
+    "eth_getCode": 1,
+    "eth_getStorageAt": 2,
+    "eth_getBlockByNumber": 0,
+}
+
+
+def _endpoint_name(url: str) -> str:
+    # Host only: provider keys usually sit in the path
+    return urlparse(url).netloc or url
+
+
+def _methods(payload: Any) -> List[str]:
+    items = payload if isinstance(payload, list) else [payload]
+    return [item.get("method", "") for item in items]
+
+
+def _block_number(value: Any) -> Optional[int]:
+    # Tags ("latest", "pending", ...) don't pin a block
+    if isinstance(value, str) and value.startswith("0x"):
+        return int(value, 16)
+    return None
+
+
+def _required_block(payload: Any) -> Optional[int]:
+    """Highest block number the request pins, or None if it only reads the head"""
+    blocks = []
+    for item in payload if isinstance(payload, list) else [payload]:
+        method, params = item.get("method", ""), item.get("params") or []
+        if method == "eth_getLogs" and params and isinstance(params[0], dict):
+            blocks.append(_block_number(params[0].get("toBlock")))
+        elif method in _BLOCK_PARAM and len(params) > _BLOCK_PARAM[method]:
+            blocks.append(_block_number(params[_BLOCK_PARAM[method]]))
+    pinned = [block for block in blocks if block is not None]
+    return max(pinned) if pinned else None
+
+
+def _errors(reply: Any) -> List[Dict[str, Any]]:
+    items = reply if isinstance(reply, list) else [reply]
+    return [item["error"] for item in items if isinstance(item, dict) and isinstance(item.get("error"), dict)]
+
+
+def _throttled(reply: Any) -> bool:
+    return any(error.get("code") in _THROTTLED_CODES for error in _errors(reply))
+
+
+def _unknown_block(reply: Any) -> bool:
+    return any(
+        any(text in str(error.get("message", "")).lower() for text in _UNKNOWN_BLOCK_ERRORS)
+        for error in _errors(reply)
+    )
+
+
+class RpcEndpoint:
+    """One node: latency / error EWMAs, recent latencies for hedging, head block"""
+
+    def __init__(self, url: str, timeout: float, alpha: float, breaker: CircuitBreaker, samples: int = 64):
+        self.url = url
+        self.name = _endpoint_name(url)
+        self.client = JsonRpcClient(url, timeout=timeout)
+        self.alpha = alpha
+        self.breaker = breaker
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.recent: Deque[float] = deque(maxlen=samples)
+        self.head: Optional[int] = None
+        self.lag = 0
+        self.lagging = False
+        self.requests = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def expected_seconds(self, timeout: float) -> float:
+        """Expected time to an answer: latency plus failed attempts costing a timeout"""
+        # Unmeasured nodes sort first so each gets tried once
+        return (self.latency or 0.0) + self.error_rate * timeout
+
+    def _observe(self, seconds: float, failed: bool) -> None:
+        self.latency = seconds if self.latency is None else self.latency + self.alpha * (seconds - self.latency)
+        self.error_rate += self.alpha * ((1.0 if failed else 0.0) - self.error_rate)
+
+    def record_success(self, seconds: float) -> None:
+        self.requests += 1
+        self.recent.append(seconds)
+        self._observe(seconds, failed=False)
+        self.breaker.record_success()
+
+    def record_failure(self, seconds: float, error: Exception) -> None:
+        self.requests += 1
+        self.failures += 1
+        self.last_error = str(error) or type(error).__name__
+        self._observe(seconds, failed=True)
+        self.breaker.record_failure()
+
+    def record_abandoned(self, seconds: float) -> None:
+        """A hedged attempt that lost: it took at least `seconds`, so count that as its latency.
+
+        Not added to `recent`: a censored time there would drag the hedge delay toward itself.
+        """
+        self._observe(seconds, failed=False)
+        self.breaker.abandon()
+
+    def hedge_delay(self, percentile: float, floor: float, default: float) -> float:
+        if len(self.recent) < 8:
+            return default
+        ordered = sorted(self.recent)
+        return max(floor, ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))])
+
+
+class RpcEndpointPool(JsonRpcClient):
+    """JsonRpcClient that spreads calls over several nodes (see module docstring)"""
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        timeout: float = 10.0,
+        alpha: float = 0.2,
+        hedge_percentile: float = 90.0,
+        hedge_min_delay_seconds: float = 0.05,
+        max_lag_blocks: int = 5,
+        head_check_seconds: float = 15.0,
+        failure_threshold: int = 3,
+        backoff_seconds: float = 5.0,
+        max_backoff_seconds: float = 120.0,
+    ):
+        if not urls:
+            raise ValueError("RpcEndpointPool needs at least one URL")
+        super().__init__(urls[0], timeout=timeout)
+        self.endpoints = [
+            RpcEndpoint(url, timeout, alpha, CircuitBreaker(failure_threshold, backoff_seconds, max_backoff_seconds))
+            for url in urls
+        ]
+        names = [endpoint.name for endpoint in self.endpoints]
+        for i, endpoint in enumerate(self.endpoints):
+            if names.count(endpoint.name) > 1:
+                endpoint.name = f"{endpoint.name}#{i}"
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay_seconds = hedge_min_delay_seconds
+        self.max_lag_blocks = max_lag_blocks
+        self.head_check_seconds = head_check_seconds
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._sticky: Optional[RpcEndpoint] = None
+        self._heads_checked = 0.0
+        self._head_task: Optional[asyncio.Task] = None
+
+    def _ranked(self, block: Optional[int] = None) -> List[RpcEndpoint]:
+        """Fastest first; lagging nodes only as a last resort.
+
+        With `block`, nodes whose last known head is below it are left out,
+        unless that would leave none.
+        """
+        ranked = sorted(self.endpoints, key=lambda e: (e.lagging, e.expected_seconds(self.timeout)))
+        if block is None:
+            return ranked
+        return [e for e in ranked if e.head is None or e.head >= block] or ranked
+
+    async def _attempt(self, endpoint: RpcEndpoint, payload: Any) -> Any:
+        started = time.monotonic()
+        try:
+            reply = await endpoint.client._post(payload)
+        except asyncio.CancelledError:
+            endpoint.record_abandoned(time.monotonic() - started)
+            RPC_REQUEST_DURATION.labels(endpoint.name, "abandoned").observe(time.monotonic() - started)
+            raise
+        except (httpx.HTTPError, ValueError) as e:
+            # Transport errors, HTTP 429/5xx and unparseable bodies; JSON-RPC errors are answers
+            endpoint.record_failure(time.monotonic() - started, e)
+            RPC_REQUEST_DURATION.labels(endpoint.name, "error").observe(time.monotonic() - started)
+            raise
+        elapsed = time.monotonic() - started
+        if _throttled(reply):
+            error = RpcError(f"{endpoint.name} is rate limiting")
+            endpoint.record_failure(elapsed, error)
+            RPC_REQUEST_DURATION.labels(endpoint.name, "throttled").observe(elapsed)
+            raise error
+        if _unknown_block(reply):
+            # Behind the node that gave the caller its block number; another node may have it
+            error = RpcError(f"{endpoint.name} does not have the requested block yet")
+            endpoint.record_failure(elapsed, error)
+            RPC_REQUEST_DURATION.labels(endpoint.name, "behind").observe(elapsed)
+            raise error
+        self._observe_head(endpoint, payload, reply)
+        endpoint.record_success(elapsed)
+        RPC_REQUEST_DURATION.labels(endpoint.name, "ok").observe(elapsed)
+        return reply
+
+    @staticmethod
+    def _observe_head(endpoint: RpcEndpoint, payload: Any, reply: Any) -> None:
+        """Keep the node's known head current from its own eth_blockNumber answers"""
+        if isinstance(payload, dict) and payload.get("method") == "eth_blockNumber" and isinstance(reply, dict):
+            block = _block_number(reply.get("result"))
+            if block is not None and (endpoint.head is None or block > endpoint.head):
+                endpoint.head = block
+
+    async def _post(self, payload: Any) -> Any:
+        self._maybe_check_heads()
+        if STICKY_METHODS.intersection(_methods(payload)):
+            return await self._post_sticky(payload)
+        return await self._post_hedged(payload)
+
+    async def _post_sticky(self, payload: Any) -> Any:
+        endpoint = self._sticky
+        if endpoint is None or endpoint.lagging or endpoint.breaker.state != CLOSED:
+            candidates = [e for e in self._ranked() if e.breaker.state != OPEN]
+            if not candidates:
+                raise RpcError("No healthy RPC endpoint for writes")
+            if endpoint is not None and candidates[0] is not endpoint:
+                print(f"RPC writes moving from {endpoint.name} to {candidates[0].name}")
+            endpoint = self._sticky = candidates[0]
+        endpoint.breaker.allow()
+        return await self._attempt(endpoint, payload)
+
+    async def _post_hedged(self, payload: Any) -> Any:
+        candidates = self._ranked(_required_block(payload))
+        pending: Dict[asyncio.Task, RpcEndpoint] = {}
+        hedged = False
+        last_error: Optional[Exception] = None
+
+        def launch(hedge: bool = False) -> Optional[RpcEndpoint]:
+            while candidates:
+                # Lagging nodes sort last: a hedge stops at the first one, a failover may use them
+                if hedge and candidates[0].lagging:
+                    return None
+                endpoint = candidates.pop(0)
+                if endpoint.breaker.allow():
+                    pending[asyncio.create_task(self._attempt(endpoint, payload))] = endpoint
+                    return endpoint
+            return None
+
+        primary = launch()
+        if primary is None:
+            raise RpcError("No healthy RPC endpoint")
+        try:
+            while pending:
+                # One hedge per request keeps the extra load near (100 - percentile)%
+                delay = None if hedged else primary.hedge_delay(
+                    self.hedge_percentile, self.hedge_min_delay_seconds, self.timeout / 4
+                )
+                done, _ = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    if launch(hedge=True) is not None:
+                        self.hedges += 1
+                        RPC_HEDGES.labels("sent").inc()
+                    continue
+                for task in done:
+                    endpoint = pending.pop(task)
+                    if task.exception() is None:
+                        if endpoint is not primary:
+                            self.hedge_wins += 1
+                            RPC_HEDGES.labels("won").inc()
+                        return task.result()
+                    last_error = task.exception()
+                if not pending:
+                    # Every attempt so far failed: fail over to the next node
+                    primary = launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise last_error if last_error is not None else RpcError("No healthy RPC endpoint")
+
+    def _maybe_check_heads(self) -> None:
+        now = time.monotonic()
+        if now - self._heads_checked < self.head_check_seconds or len(self.endpoints) < 2:
+            return
+        if self._head_task is not None and not self._head_task.done():
+            return
+        self._heads_checked = now
+        self._head_task = asyncio.create_task(self.check_heads())
+
+    async def check_heads(self) -> None:
+        """Ask every node for its head block at once and mark the ones behind the best"""
+        async def head(endpoint: RpcEndpoint) -> Optional[int]:
+            try:
+                # Straight to the node: probes must not disturb breakers or latency stats
+                return int(await endpoint.client.call("eth_blockNumber"), 16)
+            except Exception as e:
+                endpoint.last_error = str(e) or type(e).__name__
+                return None
+
+        heads = await asyncio.gather(*(head(endpoint) for endpoint in self.endpoints))
+        answered = [h for h in heads if h is not None]
+        if not answered:
+            return
+        best = max(answered)
+        for endpoint, block in zip(self.endpoints, heads):
+            if block is None:
+                continue
+            endpoint.head = block
+            endpoint.lag = best - block
+            RPC_ENDPOINT_LAG.labels(endpoint.name).set(endpoint.lag)
+            lagging = endpoint.lag > self.max_lag_blocks
+            if lagging != endpoint.lagging:
+                state = "is" if lagging else "is no longer"
+                print(f"RPC endpoint {endpoint.name} {state} lagging ({endpoint.lag} blocks behind)")
+                endpoint.lagging = lagging
+
+    def health_version(self) -> Tuple:
+        """Changes when a node's state, head or failures change.
+
+        Latency averages and request counts move on every call; they refresh
+        whenever anything else in a response does (at least once per block).
+        """
+        return tuple(
+            (e.breaker.state, e.head, e.lagging, e is self._sticky, e.failures, e.last_error)
+            for e in self.endpoints
+        )
+
+    def endpoint_health(self) -> List[RpcEndpointHealth]:
+        return [
+            RpcEndpointHealth(
+                name=e.name,
+                state=e.breaker.state,
+                latency_ms=round(e.latency * 1000, 1) if e.latency is not None else None,
+                error_rate=round(e.error_rate, 4),
+                head_block=e.head,
+                lag_blocks=e.lag,
+                lagging=e.lagging,
+                sticky=e is self._sticky,
+                requests=e.requests,
+                failures=e.failures,
+                last_error=e.last_error,
+            )
+            for e in self.endpoints
+        ]
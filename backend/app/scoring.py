@@ -0,0 +1,100 @@
+from typing import Any, Dict, List, Optional, Sequence
+import math
+import numpy as np
+
+from app.models import RebalanceDecision
+
+# Risk-adjusted return = APY / (1 + risk_score / RISK_DIVISOR)
+RISK_DIVISOR = 10.0
+# Minimum improvement in risk-adjusted APY (percentage points) worth the gas of a rebalance
+REBALANCE_THRESHOLD_PERCENT = 2.0
+
+
+def risk_adjusted_return(apy: float, risk_score: float) -> float:
+    """Scalar risk-adjusted return, guarded against degenerate inputs"""
+    denom = 1 + risk_score / RISK_DIVISOR
+    if not math.isfinite(denom) or abs(denom) < 1e-9:
+        return 0.0
+    return apy / denom
+
+
+def risk_adjusted_returns(apys: np.ndarray, risk_scores: np.ndarray) -> np.ndarray:
+    """Vectorized risk-adjusted return for any number of pools.
+
+    Non-finite or negative inputs score 0, matching the tool handler's sanitizing.
+    """
+    apys = np.asarray(apys, dtype=np.float64)
+    risk_scores = np.asarray(risk_scores, dtype=np.float64)
+    apys = np.where(np.isfinite(apys) & (apys >= 0), apys, 0.0)
+    risk_scores = np.where(np.isfinite(risk_scores) & (risk_scores >= 0), risk_scores, 0.0)
+    return apys / (1 + risk_scores / RISK_DIVISOR)
+
+
+class ProtocolScores:
+    """Risk-adjusted ranking of every protocol computed in one pass"""
+
+    def __init__(
+        self,
+        names: List[str],
+        scores: np.ndarray,
+        current_protocol: Optional[str],
+        threshold: float = REBALANCE_THRESHOLD_PERCENT,
+    ):
+        self.names = names
+        self.scores = scores
+        self.current_protocol = current_protocol
+        self.threshold = threshold
+        # Ranking, best first
+        self.order = np.argsort(-scores, kind="stable")
+
+    @property
+    def best_protocol(self) -> str:
+        return self.names[int(self.order[0])]
+
+    @property
+    def best_score(self) -> float:
+        return float(self.scores[self.order[0]])
+
+    @property
+    def current_score(self) -> float:
+        if self.current_protocol in self.names:
+            return float(self.scores[self.names.index(self.current_protocol)])
+        return 0.0
+
+    @property
+    def delta(self) -> float:
+        """Improvement of the best protocol over the current one, in percentage points"""
+        return self.best_score - self.current_score
+
+    @property
+    def is_rebalance_candidate(self) -> bool:
+        return self.best_protocol != self.current_protocol and self.delta > self.threshold
+
+    def as_dict(self) -> Dict[str, float]:
+        return {self.names[i]: round(float(self.scores[i]), 4) for i in self.order}
+
+    def no_rebalance_decision(self) -> RebalanceDecision:
+        return RebalanceDecision(
+            should_rebalance=False,
+            target_protocol="",
+            delta_percentage=round(self.delta, 4),
+            reason=(
+                f"Local scoring: {self.current_protocol} is within {self.threshold:.2f}% "
+                f"of best risk-adjusted return ({self.best_protocol}, delta {self.delta:.2f}%)"
+            ),
+        )
+
+
+def score_protocols(
+    protocols: Sequence[Dict[str, Any]],
+    current_protocol: Optional[str],
+    threshold: float = REBALANCE_THRESHOLD_PERCENT,
+) -> ProtocolScores:
+    """Rank protocols by risk-adjusted return and compare against the current one"""
+    if not protocols:
+        raise ValueError("No protocols to score")
+
+    names = [p["name"] for p in protocols]
+    apys = np.fromiter((p["apy"] for p in protocols), dtype=np.float64, count=len(protocols))
+    risks = np.fromiter((p["risk_score"] for p in protocols), dtype=np.float64, count=len(protocols))
+    return ProtocolScores(names, risk_adjusted_returns(apys, risks), current_protocol, threshold)
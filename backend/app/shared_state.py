@@ -0,0 +1,181 @@
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import os
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS agent_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_agent_state_version ON agent_state (version);
+-- Last version handed out; kept apart from agent_state so pruning rows never lowers it
+CREATE TABLE IF NOT EXISTS agent_state_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO agent_state_version (id, version)
+SELECT 1, COALESCE(MAX(version), 0) FROM agent_state;
+CREATE TABLE IF NOT EXISTS cycle_requests (
+    id TEXT PRIMARY KEY,
+    requested_at REAL NOT NULL
+);
+"""
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Several worker processes share the file; wait out each other's short writes
+    conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=5.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+class LeaderLease:
+    """Time-limited lease in SQLite; whoever holds it is the leader.
+
+    `try_acquire` both takes an expired (or free) lease and renews one this
+    holder already owns, in a single atomic upsert. A leader that stops
+    renewing loses the lease after `ttl_seconds` and another worker takes over.
+    """
+
+    def __init__(self, db_path: str, holder: str, name: str = "scheduler", ttl_seconds: float = 15.0):
+        self.holder = holder
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = _connect(db_path)
+        # Local view of our own expiry, so a stalled leader stops acting before others take over
+        self._held_until = 0.0
+
+    @property
+    def held(self) -> bool:
+        return time.monotonic() < self._held_until
+
+    def try_acquire(self) -> bool:
+        now = time.time()
+        started = time.monotonic()
+        with self._lock:
+            changed = self._conn.execute(
+                "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at "
+                "WHERE leases.holder = excluded.holder OR leases.expires_at < ?",
+                (self.name, self.holder, now + self.ttl_seconds, now),
+            ).rowcount
+        self._held_until = started + self.ttl_seconds if changed else 0.0
+        return bool(changed)
+
+    def current_holder(self) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT holder FROM leases WHERE name = ? AND expires_at >= ?", (self.name, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def release(self) -> None:
+        """Give the lease up immediately so a follower can take over without waiting"""
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (self.name, self.holder))
+        self._held_until = 0.0
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SharedAgentState:
+    """Versioned JSON key/value store shared by every worker process.
+
+    Each write takes the next global version from a counter that only goes
+    up, so a reader asks only for what changed since the last version it saw.
+    """
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+        self._conn = _connect(db_path)
+        self._written: Dict[str, str] = {}
+
+    def put(self, key: str, value: Any) -> bool:
+        """Store `value` under `key`; returns False (no write) if this process already wrote it"""
+        encoded = json.dumps(value, separators=(",", ":"), default=str)
+        if self._written.get(key) == encoded:
+            return False
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("UPDATE agent_state_version SET version = version + 1 WHERE id = 1")
+                self._conn.execute(
+                    "INSERT INTO agent_state (key, value, version, updated_at) "
+                    "VALUES (?, ?, (SELECT version FROM agent_state_version WHERE id = 1), ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value, version = excluded.version, "
+                    "updated_at = excluded.updated_at",
+                    (key, encoded, time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._written[key] = encoded
+        return True
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM agent_state WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def changes(self, since_version: int) -> Tuple[List[Tuple[str, Any]], int]:
+        """(key, value) pairs written after `since_version`, and the newest version"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, value, version FROM agent_state WHERE version > ? ORDER BY version",
+                (since_version,),
+            ).fetchall()
+        if not rows:
+            return [], since_version
+        for key, value, _ in rows:
+            # Remember what others wrote so we don't echo it back unchanged
+            self._written[key] = value
+        return [(key, json.loads(value)) for key, value, _ in rows], rows[-1][2]
+
+    def prune(self, prefix: str, older_than_seconds: float) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM agent_state WHERE key LIKE ? AND updated_at < ?",
+                (prefix + "%", time.time() - older_than_seconds),
+            ).rowcount
+
+    def request_cycle(self, request_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO cycle_requests (id, requested_at) VALUES (?, ?)", (request_id, time.time())
+            )
+
+    def take_cycle_requests(self) -> List[str]:
+        """Claim every queued cycle request (leader only)"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [row[0] for row in self._conn.execute("SELECT id FROM cycle_requests ORDER BY requested_at")]
+                self._conn.execute("DELETE FROM cycle_requests")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return ids
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,90 @@
+from typing import Callable, List, Optional
+import asyncio
+import time
+from datetime import datetime, timezone
+
+from app.models import ProtocolSnapshot
+from app.protocols import ProtocolManager
+
+
+class ProtocolSnapshotCache:
+    """TTL cache of protocol APY snapshots with stale-while-revalidate.
+
+    Fresh snapshots are served directly. Once the TTL passes, the last good
+    snapshot keeps being served while a single background refresh runs;
+    concurrent callers share that one upstream fetch.
+    """
+
+    def __init__(self, protocol_manager: ProtocolManager, ttl_seconds: float = 60.0):
+        self.protocol_manager = protocol_manager
+        self.ttl_seconds = ttl_seconds
+        self._snapshot: Optional[ProtocolSnapshot] = None
+        self._fetched_at_monotonic = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._listeners: List[Callable[[ProtocolSnapshot], None]] = []
+
+    def add_listener(self, listener: Callable[[ProtocolSnapshot], None]) -> None:
+        """Call `listener` with every newly fetched snapshot"""
+        self._listeners.append(listener)
+
+    @property
+    def snapshot(self) -> Optional[ProtocolSnapshot]:
+        return self._snapshot
+
+    def is_fresh(self) -> bool:
+        if self._snapshot is None:
+            return False
+        return time.monotonic() - self._fetched_at_monotonic < self.ttl_seconds
+
+    def set_snapshot(self, snapshot: ProtocolSnapshot) -> None:
+        """Adopt a snapshot fetched elsewhere (another worker); listeners are not called"""
+        self._snapshot = snapshot
+        age = (datetime.now(timezone.utc) - snapshot.fetched_at).total_seconds()
+        self._fetched_at_monotonic = time.monotonic() - max(0.0, age)
+
+    async def get(self) -> ProtocolSnapshot:
+        """Return the cached snapshot, refreshing in the background if stale"""
+        if self.is_fresh():
+            return self._snapshot
+
+        if self._snapshot is None:
+            # Nothing to serve yet; wait for the shared fetch.
+            return await self.refresh()
+
+        self._start_refresh()
+        return self._snapshot
+
+    async def refresh(self) -> ProtocolSnapshot:
+        """Fetch a new snapshot, joining any refresh already in flight"""
+        task = self._start_refresh()
+        # Shield so a cancelled caller doesn't cancel the fetch others share.
+        return await asyncio.shield(task)
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._do_refresh())
+            self._refresh_task.add_done_callback(self._log_refresh_error)
+        return self._refresh_task
+
+    async def _do_refresh(self) -> ProtocolSnapshot:
+        protocols = await self.protocol_manager.fetch_all_apys()
+        snapshot = ProtocolSnapshot(
+            protocols=protocols,
+            fetched_at=datetime.now(timezone.utc),
+        )
+        self._snapshot = snapshot
+        self._fetched_at_monotonic = time.monotonic()
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Protocol snapshot listener failed: {e}")
+        return snapshot
+
+    @staticmethod
+    def _log_refresh_error(task: asyncio.Task) -> None:
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            print(f"Protocol snapshot refresh failed: {exc}")
@@ -0,0 +1,171 @@
+from typing import Dict, Optional
+import hashlib
+import os
+import re
+import numpy as np
+
+from app.models import ProtocolSnapshot
+
+# One fixed-size record per sample; the ring lives in a memory-mapped file so it
+# survives restarts and queries slice it without materializing Python objects.
+SAMPLE_DTYPE = np.dtype([
+    ("ts", "<f8"),
+    ("apy", "<f4"),
+    ("tvl", "<f8"),
+    ("fallback", "u1"),
+])
+
+# Header: magic, format version, capacity, next write position, sample count
+_HEADER_DTYPE = np.dtype("<i8")
+_HEADER_FIELDS = 5
+_HEADER_BYTES = 64
+_MAGIC = 0x594D4150  # "YMAP"
+_VERSION = 1
+
+_TVL_SUFFIXES = {"K": 1e3, "M": 1e6, "B": 1e9, "T": 1e12}
+
+
+def parse_tvl(text: str) -> float:
+    """Turn a display TVL such as "$2.1B" into a number (NaN if unparseable)"""
+    match = re.fullmatch(r"\s*\$?\s*([0-9][0-9,]*(?:\.[0-9]+)?)\s*([KMBT]?)\s*", text or "", re.IGNORECASE)
+    if match is None:
+        return float("nan")
+    value = float(match.group(1).replace(",", ""))
+    return value * _TVL_SUFFIXES.get(match.group(2).upper(), 1.0)
+
+
+class ApySeries:
+    """Ring buffer of (timestamp, apy, tvl, fallback) samples for one protocol"""
+
+    def __init__(self, path: str, capacity: int):
+        exists = os.path.exists(path)
+        if not exists:
+            with open(path, "wb") as f:
+                f.truncate(_HEADER_BYTES + capacity * SAMPLE_DTYPE.itemsize)
+
+        self.path = path
+        self._header = np.memmap(path, dtype=_HEADER_DTYPE, mode="r+", shape=(_HEADER_FIELDS,))
+        if exists:
+            if self._header[0] != _MAGIC or self._header[1] != _VERSION:
+                raise ValueError(f"Unrecognized APY series file: {path}")
+            # The file's own capacity wins; resizing needs a new file
+            capacity = int(self._header[2])
+        else:
+            self._header[:] = (_MAGIC, _VERSION, capacity, 0, 0)
+
+        self.capacity = capacity
+        self._data = np.memmap(
+            path, dtype=SAMPLE_DTYPE, mode="r+", offset=_HEADER_BYTES, shape=(capacity,)
+        )
+
+    @property
+    def count(self) -> int:
+        return int(self._header[4])
+
+    def append(self, ts: float, apy: float, tvl: float, fallback: bool) -> None:
+        pos = int(self._header[3])
+        self._data[pos] = (ts, apy, tvl, 1 if fallback else 0)
+        self._header[3] = (pos + 1) % self.capacity
+        self._header[4] = min(self.count + 1, self.capacity)
+
+    def _segments(self):
+        """Chronologically ordered views over the ring (no copies)"""
+        count = self.count
+        if count < self.capacity:
+            return [self._data[:count]]
+        head = int(self._header[3])
+        return [self._data[head:], self._data[:head]]
+
+    def window(self, start: float, end: float) -> np.ndarray:
+        """Samples with start <= ts < end, oldest first"""
+        parts = []
+        for segment in self._segments():
+            if len(segment) == 0:
+                continue
+            ts = segment["ts"]
+            lo = np.searchsorted(ts, start, side="left")
+            hi = np.searchsorted(ts, end, side="left")
+            if hi > lo:
+                parts.append(segment[lo:hi])
+        if not parts:
+            return np.empty(0, dtype=SAMPLE_DTYPE)
+        return np.concatenate(parts)
+
+    def downsample(self, start: float, end: float, resolution: float) -> Dict[str, np.ndarray]:
+        """Min/max/mean buckets of width `resolution` seconds over [start, end)"""
+        samples = self.window(start, end)
+        if len(samples) == 0:
+            empty_f = np.empty(0, dtype=np.float64)
+            empty_i = np.empty(0, dtype=np.int64)
+            return {
+                "bucket_start": empty_f, "min": empty_f, "max": empty_f, "mean": empty_f,
+                "tvl_mean": empty_f, "count": empty_i, "fallback_count": empty_i,
+            }
+
+        bucket = ((samples["ts"] - start) // resolution).astype(np.int64)
+        # Samples are sorted by time, so each bucket is a contiguous run
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket)) + 1))
+        counts = np.diff(np.concatenate((starts, [len(samples)])))
+        apy = samples["apy"].astype(np.float64)
+        tvl = samples["tvl"]
+        return {
+            "bucket_start": start + bucket[starts] * resolution,
+            "min": np.minimum.reduceat(apy, starts),
+            "max": np.maximum.reduceat(apy, starts),
+            "mean": np.add.reduceat(apy, starts) / counts,
+            "tvl_mean": np.add.reduceat(tvl, starts) / counts,
+            "count": counts,
+            "fallback_count": np.add.reduceat(samples["fallback"].astype(np.int64), starts),
+        }
+
+    def flush(self) -> None:
+        self._data.flush()
+        self._header.flush()
+
+
+class ApyTimeSeriesStore:
+    """Per-protocol APY series stored as memory-mapped files in one directory"""
+
+    def __init__(self, directory: str, capacity: int = 525_600):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.capacity = capacity
+        self._series: Dict[str, ApySeries] = {}
+
+    @staticmethod
+    def _slug(protocol: str) -> str:
+        return re.sub(r"[^a-z0-9]+", "_", protocol.lower()).strip("_")
+
+    @classmethod
+    def _file_name(cls, protocol: str) -> str:
+        """Readable slug plus a hash of the exact name, so "Venus-BNB" and "venus bnb" stay apart"""
+        digest = hashlib.blake2b(protocol.encode("utf-8"), digest_size=4).hexdigest()
+        return f"{cls._slug(protocol)}_{digest}.apy"
+
+    def series(self, protocol: str, create: bool = False) -> Optional[ApySeries]:
+        series = self._series.get(protocol)
+        if series is not None:
+            return series
+
+        path = os.path.join(self.directory, self._file_name(protocol))
+        legacy = os.path.join(self.directory, self._slug(protocol) + ".apy")
+        if not os.path.exists(path) and os.path.exists(legacy):
+            # Written before file names carried the hash
+            os.replace(legacy, path)
+        if not create and not os.path.exists(path):
+            return None
+        series = ApySeries(path, self.capacity)
+        self._series[protocol] = series
+        return series
+
+    def record_snapshot(self, snapshot: ProtocolSnapshot) -> None:
+        """Append one sample per protocol in the snapshot"""
+        ts = snapshot.fetched_at.timestamp()
+        for protocol in snapshot.protocols:
+            self.series(protocol.name, create=True).append(
+                ts, protocol.apy, parse_tvl(protocol.tvl), protocol.source != "fresh"
+            )
+
+    def flush(self) -> None:
+        for series in self._series.values():
+            series.flush()
@@ -0,0 +1,283 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import time
+from eth_account import Account
+
+from app.chain_reader import VaultChainReader
+from app.rpc import JsonRpcClient, RpcError
+
+TX_STATUSES = ("pending", "confirmed", "failed")
+
+
+class NonceManager:
+    """Hands out nonces locally so several transactions can be in flight at once"""
+
+    def __init__(self, rpc: JsonRpcClient, address: str):
+        self.rpc = rpc
+        self.address = address
+        self._next: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    async def next(self) -> int:
+        async with self._lock:
+            if self._next is None:
+                self._next = int(await self.rpc.call("eth_getTransactionCount", [self.address, "pending"]), 16)
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def release(self, nonce: int) -> None:
+        """Give back a nonce whose transaction never reached the node"""
+        if self._next is not None and nonce == self._next - 1:
+            self._next = nonce
+        else:
+            # A later nonce is already out; resync from the node's pending count
+            self._next = None
+
+
+class PendingTransaction:
+    """One logical transaction (fixed nonce) and every hash sent for it"""
+
+    def __init__(self, nonce: int, fields: Dict[str, Any], on_update: Optional[Callable[["PendingTransaction"], None]]):
+        self.nonce = nonce
+        self.fields = fields
+        self.fees: Dict[str, int] = {}
+        self.hashes: List[str] = []
+        self.status = "pending"
+        self.receipt: Optional[Dict[str, Any]] = None
+        self.replacements = 0
+        self.sent_at = 0.0
+        self.on_update = on_update
+        self.done = asyncio.get_running_loop().create_future()
+
+    @property
+    def tx_hash(self) -> Optional[str]:
+        """Mined hash once confirmed, else the latest submitted one"""
+        if self.receipt is not None:
+            return self.receipt["transactionHash"]
+        return self.hashes[-1] if self.hashes else None
+
+
+class TransactionPipeline:
+    """Signs and submits transactions without waiting for them to be mined.
+
+    Nonces are assigned locally, fees and gas estimates are fetched once per
+    block, and a single watcher polls receipts for everything in flight in one
+    JSON-RPC batch. Transactions still unmined after `replace_after_seconds`
+    are re-sent with the same nonce and bumped fees (speed-up).
+    """
+
+    def __init__(
+        self,
+        rpc: JsonRpcClient,
+        private_key: str,
+        chain: VaultChainReader,
+        confirmations: int = 1,
+        poll_seconds: float = 3.0,
+        replace_after_seconds: float = 45.0,
+        fee_bump_percent: float = 12.5,
+        max_replacements: int = 3,
+        gas_margin: float = 1.2,
+    ):
+        self.rpc = rpc
+        self.chain = chain
+        self.account = Account.from_key(private_key)
+        self.nonces = NonceManager(rpc, self.account.address)
+        self.confirmations = confirmations
+        self.poll_seconds = poll_seconds
+        self.replace_after_seconds = replace_after_seconds
+        self.fee_bump_percent = fee_bump_percent
+        self.max_replacements = max_replacements
+        self.gas_margin = gas_margin
+        self._chain_id: Optional[int] = None
+        self._fees: Optional[Tuple[int, Dict[str, int]]] = None
+        self._gas_cache: Dict[Tuple[int, str, str], int] = {}
+        self._pending: Dict[int, PendingTransaction] = {}
+        self._watcher: Optional[asyncio.Task] = None
+
+    @property
+    def address(self) -> str:
+        return self.account.address
+
+    def owns(self, tx_hash: str) -> bool:
+        """True if tx_hash belongs to a transaction this pipeline is still tracking"""
+        tx_hash = tx_hash.lower()
+        return any(tx_hash == h.lower() for tx in self._pending.values() for h in tx.hashes)
+
+    async def _prepare(self, to: str, data: str) -> Tuple[Dict[str, int], int]:
+        """Fee fields and gas limit, both cached for the current block"""
+        block = await self.chain.block_number()
+        gas_key = (block, to.lower(), data)
+        if self._fees is not None and self._fees[0] == block and gas_key in self._gas_cache:
+            return self._fees[1], self._gas_cache[gas_key]
+
+        calls = [("eth_estimateGas", [{"from": self.address, "to": to, "data": data}])]
+        need_fees = self._fees is None or self._fees[0] != block
+        if need_fees:
+            calls += [("eth_getBlockByNumber", [hex(block), False]), ("eth_gasPrice", []), ("eth_maxPriorityFeePerGas", [])]
+        if self._chain_id is None:
+            calls.append(("eth_chainId", []))
+        results = await self.rpc.batch(calls)
+
+        if isinstance(results[0], RpcError):
+            # Reverts surface here, before a nonce is spent
+            raise results[0]
+        gas = int(int(results[0], 16) * self.gas_margin)
+        if need_fees:
+            self._fees = (block, self._fee_fields(*results[1:4]))
+            self._gas_cache = {k: v for k, v in self._gas_cache.items() if k[0] == block}
+        if self._chain_id is None:
+            chain_id = results[-1]
+            if isinstance(chain_id, RpcError):
+                raise chain_id
+            self._chain_id = int(chain_id, 16)
+        self._gas_cache[gas_key] = gas
+        return self._fees[1], gas
+
+    @staticmethod
+    def _fee_fields(block: Any, gas_price: Any, priority_fee: Any) -> Dict[str, int]:
+        if isinstance(gas_price, RpcError):
+            raise gas_price
+        base_fee = block.get("baseFeePerGas") if isinstance(block, dict) else None
+        if base_fee is None or isinstance(priority_fee, RpcError):
+            # Pre-London chains (and BSC nodes that only price legacy txs)
+            return {"gasPrice": int(gas_price, 16)}
+        tip = int(priority_fee, 16)
+        return {"maxFeePerGas": 2 * int(base_fee, 16) + tip, "maxPriorityFeePerGas": tip}
+
+    def _bumped(self, fees: Dict[str, int], current: Dict[str, int]) -> Dict[str, int]:
+        """Replacement fees: at least fee_bump_percent above the previous send, or the current market"""
+        factor = 1 + self.fee_bump_percent / 100
+        return {
+            key: max(int(value * factor) + 1, current.get(key, 0))
+            for key, value in fees.items()
+        }
+
+    async def _send(self, tx: PendingTransaction) -> str:
+        signed = self.account.sign_transaction({
+            **tx.fields,
+            **tx.fees,
+            "nonce": tx.nonce,
+            "chainId": self._chain_id,
+        })
+        tx_hash = await self.rpc.call("eth_sendRawTransaction", ["0x" + signed.raw_transaction.hex().removeprefix("0x")])
+        tx.hashes.append(tx_hash)
+        tx.sent_at = time.monotonic()
+        return tx_hash
+
+    async def submit(
+        self,
+        to: str,
+        data: str,
+        on_update: Optional[Callable[[PendingTransaction], None]] = None,
+    ) -> PendingTransaction:
+        """Sign and broadcast; returns as soon as the node accepts the transaction"""
+        fees, gas = await self._prepare(to, data)
+        nonce = await self.nonces.next()
+        tx = PendingTransaction(nonce, {"to": to, "data": data, "value": 0, "gas": gas}, on_update)
+        tx.fees = dict(fees)
+        try:
+            await self._send(tx)
+        except Exception:
+            self.nonces.release(nonce)
+            raise
+        self._track(tx)
+        return tx
+
+    def resume(
+        self,
+        nonce: int,
+        hashes: List[str],
+        on_update: Optional[Callable[[PendingTransaction], None]] = None,
+    ) -> PendingTransaction:
+        """Watch a transaction sent before a restart until one of its hashes is mined.
+
+        Its fields were not kept, so it is never sped up; if the nonce is used
+        by none of `hashes`, it is reported as failed.
+        """
+        tx = PendingTransaction(nonce, {}, on_update)
+        tx.hashes = list(hashes)
+        tx.replacements = self.max_replacements
+        tx.sent_at = time.monotonic()
+        self._track(tx)
+        return tx
+
+    def _track(self, tx: PendingTransaction) -> None:
+        previous = self._pending.get(tx.nonce)
+        if previous is not None:
+            # A resumed tx the node dropped: its nonce was handed out again
+            self._finish(previous, "failed")
+        self._pending[tx.nonce] = tx
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def speed_up(self, tx: PendingTransaction) -> str:
+        """Re-send the same nonce with bumped fees"""
+        current, _ = await self._prepare(tx.fields["to"], tx.fields["data"])
+        tx.fees = self._bumped(tx.fees, current)
+        tx.replacements += 1
+        tx_hash = await self._send(tx)
+        print(f"Replaced stuck tx nonce={tx.nonce} -> {tx_hash}")
+        self._notify(tx)
+        return tx_hash
+
+    def _notify(self, tx: PendingTransaction) -> None:
+        if tx.on_update is not None:
+            try:
+                tx.on_update(tx)
+            except Exception as e:
+                print(f"Transaction update callback failed: {e}")
+
+    def _finish(self, tx: PendingTransaction, status: str, receipt: Optional[Dict[str, Any]] = None) -> None:
+        tx.status = status
+        tx.receipt = receipt
+        self._pending.pop(tx.nonce, None)
+        self._notify(tx)
+        if not tx.done.done():
+            tx.done.set_result(tx)
+
+    async def _watch(self) -> None:
+        while self._pending:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Receipt polling failed: {e}")
+
+    async def _poll(self) -> None:
+        inflight = list(self._pending.values())
+        lookups = [(tx, h) for tx in inflight for h in tx.hashes]
+        results = await self.rpc.batch([("eth_getTransactionReceipt", [h]) for _, h in lookups])
+        head = await self.chain.block_number()
+
+        receipts: Dict[int, Dict[str, Any]] = {}
+        for (tx, _), receipt in zip(lookups, results):
+            if isinstance(receipt, dict):
+                receipts[tx.nonce] = receipt
+
+        for tx in inflight:
+            receipt = receipts.get(tx.nonce)
+            if receipt is not None:
+                if head - int(receipt["blockNumber"], 16) + 1 >= self.confirmations:
+                    self._finish(tx, "confirmed" if int(receipt.get("status", "0x1"), 16) == 1 else "failed", receipt)
+                continue
+            if time.monotonic() - tx.sent_at < self.replace_after_seconds:
+                continue
+            if tx.replacements >= self.max_replacements:
+                # Nonce used by a transaction we never saw (e.g. sent from another process)
+                mined_nonce = int(await self.rpc.call("eth_getTransactionCount", [self.address, "latest"]), 16)
+                if mined_nonce > tx.nonce:
+                    self._finish(tx, "failed")
+                continue
+            try:
+                await self.speed_up(tx)
+            except RpcError as e:
+                # "nonce too low": one of the earlier hashes was mined; the next poll finds it
+                print(f"Speed-up for nonce {tx.nonce} rejected: {e}")
+                tx.sent_at = time.monotonic()
+
+    async def close(self) -> None:
+        if self._watcher is not None:
+            self._watcher.cancel()
@@ -0,0 +1,100 @@
+from typing import Any, Dict, List
+import json
+import os
+
+# Subset of the YieldMindVault ABI the backend uses. The full ABI from the
+# Hardhat artifact is preferred when it exists (see load_vault_abi).
+VAULT_ABI: List[Dict[str, Any]] = [
+    {
+        "type": "function", "name": "getBalance", "stateMutability": "view",
+        "inputs": [], "outputs": [{"name": "", "type": "uint256"}],
+    },
+    {
+        "type": "function", "name": "getRebalanceCount", "stateMutability": "view",
+        "inputs": [], "outputs": [{"name": "", "type": "uint256"}],
+    },
+    {
+        "type": "function", "name": "getRebalanceLog", "stateMutability": "view",
+        "inputs": [{"name": "index", "type": "uint256"}],
+        "outputs": [
+            {"name": "timestamp", "type": "uint256"},
+            {"name": "fromProtocol", "type": "address"},
+            {"name": "toProtocol", "type": "address"},
+            {"name": "amount", "type": "uint256"},
+            {"name": "reason", "type": "string"},
+            {"name": "deltaPercentage", "type": "uint256"},
+        ],
+    },
+    {
+        "type": "function", "name": "currentProtocol", "stateMutability": "view",
+        "inputs": [], "outputs": [{"name": "", "type": "address"}],
+    },
+    {
+        "type": "function", "name": "totalDeposits", "stateMutability": "view",
+        "inputs": [], "outputs": [{"name": "", "type": "uint256"}],
+    },
+    {
+        "type": "function", "name": "executeRebalance", "stateMutability": "nonpayable",
+        "inputs": [
+            {"name": "toProtocol", "type": "address"},
+            {"name": "reason", "type": "string"},
+            {"name": "deltaPercentage", "type": "uint256"},
+        ],
+        "outputs": [],
+    },
+    {
+        "type": "event", "name": "Deposit", "anonymous": False,
+        "inputs": [
+            {"name": "user", "type": "address", "indexed": True},
+            {"name": "amount", "type": "uint256", "indexed": False},
+        ],
+    },
+    {
+        "type": "event", "name": "Withdraw", "anonymous": False,
+        "inputs": [
+            {"name": "user", "type": "address", "indexed": True},
+            {"name": "amount", "type": "uint256", "indexed": False},
+        ],
+    },
+    {
+        "type": "event", "name": "Rebalance", "anonymous": False,
+        "inputs": [
+            {"name": "fromProtocol", "type": "address", "indexed": True},
+            {"name": "toProtocol", "type": "address", "indexed": True},
+            {"name": "amount", "type": "uint256", "indexed": False},
+            {"name": "reason", "type": "string", "indexed": False},
+            {"name": "deltaPercentage", "type": "uint256", "indexed": False},
+        ],
+    },
+]
+
+# Protocol address constants from YieldMindVault.sol
+PROTOCOL_ADDRESSES: Dict[str, str] = {
+    "PancakeSwap V3": "0x0000000000000000000000000000000000000001",
+    "Venus": "0x0000000000000000000000000000000000000002",
+    "Lista DAO": "0x0000000000000000000000000000000000000003",
+}
+PROTOCOL_NAMES: Dict[str, str] = {address.lower(): name for name, address in PROTOCOL_ADDRESSES.items()}
+# executeRebalance reverts below 200 bps ("Delta must be >= 2%")
+MIN_REBALANCE_DELTA_PERCENT = 2.0
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+
+def load_vault_abi() -> List[Dict[str, Any]]:
+    """ABI from the compiled Hardhat artifact if present, else the embedded subset"""
+    path = os.getenv(
+        "VAULT_ABI_PATH",
+        os.path.join(
+            os.path.dirname(__file__), "..", "..", "contracts", "artifacts",
+            "contracts", "YieldMindVault.sol", "YieldMindVault.json",
+        ),
+    )
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)["abi"]
+    return VAULT_ABI
+
+
+def protocol_name(address: str) -> str:
+    return PROTOCOL_NAMES.get(address.lower(), address)
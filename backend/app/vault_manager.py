@@ -1,74 +1,306 @@
-from typing import Dict
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
 import os
 from web3 import Web3
 from datetime import datetime, timezone
 import json
 
-from app.models import RebalanceEvent
+from app.chain_reader import VaultChainReader
+from app.config import data_path, get_int_env
+from app.history_store import DEFAULT_VAULT_ID, RebalanceHistoryStore
+from app.models import AllocationPlan, RebalanceEvent, VaultChainState
+from app.tx_pipeline import PendingTransaction, TransactionPipeline
+from app.vault_abi import MIN_REBALANCE_DELTA_PERCENT, PROTOCOL_ADDRESSES, ZERO_ADDRESS, load_vault_abi, protocol_name
+
+if TYPE_CHECKING:
+    from app.workers import WorkerCoordinator
 
 class VaultManager:
     """Manages interaction with YieldMindVault smart contract"""
     
-    def __init__(self):
-        self.w3 = Web3(Web3.HTTPProvider(
-            os.getenv("BSC_RPC_URL", "https://bsc-dataseed.binance.org/")
-        ))
-        self.vault_address = os.getenv("VAULT_CONTRACT_ADDRESS", "")
+    def __init__(
+        self,
+        vault_id: str = DEFAULT_VAULT_ID,
+        vault_address: Optional[str] = None,
+        initial_protocol: str = "PancakeSwap V3",
+        history_store: Optional[RebalanceHistoryStore] = None,
+        chain: Optional[VaultChainReader] = None,
+        tx_pipeline: Optional[TransactionPipeline] = None,
+    ):
+        self.vault_id = vault_id
+        self.chain = chain
+        self.tx_pipeline = tx_pipeline
+        # Set with several workers; only the current leader may write
+        self.coordinator: Optional["WorkerCoordinator"] = None
+        if vault_address is None:
+            vault_address = os.getenv("VAULT_CONTRACT_ADDRESS", "")
+        self.vault_address = vault_address
         self.private_key = os.getenv("PRIVATE_KEY", "")
-        self.current_protocol = "PancakeSwap V3"
-        self.rebalance_history = []
+        self.current_protocol = initial_protocol
+        self.history = history_store or RebalanceHistoryStore(
+            os.getenv("REBALANCE_DB_PATH", data_path("yieldmind.db")),
+            recent_size=get_int_env("REBALANCE_HISTORY_MEMORY_SIZE", 200),
+        )
+        # Resume from the last recorded rebalance after a restart
+        latest = self.history.latest(self.vault_id)
+        if latest is not None:
+            self.current_protocol = latest.to_protocol
+        # Percent of the vault per protocol; only split by execute_allocation
+        self.allocation: Dict[str, float] = self._restore_allocation()
         
-        # Load contract ABI (will be set after contract deployment)
+        # Load contract ABI (Hardhat artifact if compiled, else the embedded subset)
         self.vault_abi = self.load_vault_abi()
+        self._contract = Web3().eth.contract(abi=self.vault_abi)
         
+    def _restore_allocation(self) -> Dict[str, float]:
+        """Replay partial moves recorded since the last whole-vault rebalance"""
+        events, _ = self.history.query(limit=500, vault_id=self.vault_id)
+        partial = []
+        base: Optional[RebalanceEvent] = None
+        for event in events:
+            if not event.amount.endswith("%"):
+                base = event
+                break
+            if event.status != "failed":
+                partial.append(event)
+        if not partial:
+            return {self.current_protocol: 100.0}
+
+        allocation = {base.to_protocol if base is not None else partial[-1].from_protocol: 100.0}
+        for event in reversed(partial):
+            moved = float(event.amount.rstrip("%"))
+            allocation[event.from_protocol] = allocation.get(event.from_protocol, 0.0) - moved
+            allocation[event.to_protocol] = allocation.get(event.to_protocol, 0.0) + moved
+        allocation = {name: round(pct, 2) for name, pct in allocation.items() if pct > 0.005}
+        self.current_protocol = max(allocation, key=allocation.get)
+        return allocation
+
     def load_vault_abi(self):
         """Load the vault contract ABI"""
-        # Placeholder - will be populated after contract is compiled
-        return []
+        return load_vault_abi()
+
+    @property
+    def is_onchain(self) -> bool:
+        """True when a real vault contract is configured and reachable through an RPC reader"""
+        return (
+            self.chain is not None
+            and Web3.is_address(self.vault_address)
+            and self.vault_address.lower() != ZERO_ADDRESS
+        )
+
+    def can_target(self, protocol: str) -> bool:
+        """On-chain vaults can only move into protocols the contract has an address for"""
+        return not self.is_onchain or protocol in PROTOCOL_ADDRESSES
+
+    @property
+    def dry_run(self) -> bool:
+        """A real vault contract but no signer: rebalances are reported, not sent or recorded"""
+        return self.is_onchain and self.tx_pipeline is None
+
+    def _check_leading(self) -> None:
+        if self.coordinator is not None:
+            self.coordinator.check_leading()
+
+    async def get_chain_state(self) -> Optional[VaultChainState]:
+        """Batched view reads at the head block (cached per block); None when off-chain"""
+        if not self.is_onchain:
+            return None
+        state = await self.chain.read_vault_state(self.vault_address)
+        # The contract is the source of truth for the active protocol
+        self.current_protocol = protocol_name(state.current_protocol_address)
+        self.allocation = {self.current_protocol: 100.0}
+        return state
     
-    async def get_current_allocation(self) -> Dict[str, float]:
-        """Get current protocol allocation"""
+    async def get_current_allocation(self) -> Dict[str, Any]:
+        """Get current protocol allocation (largest holding plus the full split)"""
+        await self.get_chain_state()
         return {
             "protocol": self.current_protocol,
-            "percentage": 100.0
+            "percentage": self.allocation.get(self.current_protocol, 0.0),
+            "allocation": dict(self.allocation),
         }
     
-    async def execute_rebalance(self, target_protocol: str, reason: str) -> str:
-        """Execute rebalance transaction on-chain"""
-        
-        # Create rebalance event
+    async def execute_rebalance(
+        self,
+        target_protocol: str,
+        reason: str,
+        delta_percentage: float = 0.0,
+        on_update: Optional[Callable[[RebalanceEvent], None]] = None,
+    ) -> Optional[str]:
+        """Submit the rebalance transaction; confirmation is tracked in the background.
+
+        `on_update` receives the stored event again whenever its tx hash or
+        status changes (speed-up, confirmation, failure). Returns the tx hash,
+        or None on a dry run.
+        """
         event = RebalanceEvent(
             timestamp=datetime.now(timezone.utc),
             from_protocol=self.current_protocol,
             to_protocol=target_protocol,
             amount="All funds",
             reason=reason,
-            tx_hash=""
         )
-        
-        # In production, this would:
-        # 1. Call vault contract's rebalance function
-        # 2. Wait for transaction confirmation
-        # 3. Return transaction hash
-        
-        # For now, simulate the transaction
-        print(f"📝 Logging rebalance: {self.current_protocol} -> {target_protocol}")
-        
-        # Update current protocol
+
+        if self.dry_run:
+            # The contract stays on its protocol, so recording a move would repeat it every cycle
+            print(f"📝 Dry run [{self.vault_id}]: would rebalance {self.current_protocol} -> {target_protocol} (no PRIVATE_KEY)")
+            return None
+
+        self._check_leading()
+        if not self.is_onchain:
+            # No contract configured: simulate the transaction
+            print(f"📝 Logging rebalance [{self.vault_id}]: {self.current_protocol} -> {target_protocol}")
+            self.current_protocol = target_protocol
+            self.allocation = {target_protocol: 100.0}
+            event.tx_hash = f"0x{'0'*64}"  # Simulated tx hash
+            event.status = "simulated"
+            self.history.append(event, self.vault_id)
+            return event.tx_hash
+
+        if not self.can_target(target_protocol):
+            raise ValueError(f"No contract address for {target_protocol}")
+        data = self._contract.encode_abi(
+            "executeRebalance",
+            args=[
+                Web3.to_checksum_address(PROTOCOL_ADDRESSES[target_protocol]),
+                reason,
+                int(round(delta_percentage * 100)),  # basis points
+            ],
+        )
+        row_id: Optional[int] = None
+        # The lease may have lapsed while the cycle was waiting on Claude or the node
+        self._check_leading()
+
+        def track(tx: PendingTransaction) -> None:
+            if row_id is not None:
+                self._record_tx_update(row_id, event, tx, on_update)
+
+        tx = await self.tx_pipeline.submit(self.vault_address, data, on_update=track)
+        print(f"📝 Submitted rebalance [{self.vault_id}]: {self.current_protocol} -> {target_protocol} ({tx.tx_hash})")
+        event.tx_hash = tx.tx_hash
+        event.status = "pending"
+        row_id = self.history.append(event, self.vault_id, nonce=tx.nonce)
+        # Optimistic until the receipt arrives; get_chain_state() reads the contract
         self.current_protocol = target_protocol
-        
-        # Store event
-        event.tx_hash = f"0x{'0'*64}"  # Simulated tx hash
-        self.rebalance_history.append(event)
-        
+        self.allocation = {target_protocol: 100.0}
         return event.tx_hash
-    
-    def get_rebalance_history(self):
-        """Get rebalance history"""
-        return self.rebalance_history
+
+    def _record_tx_update(
+        self,
+        row_id: int,
+        event: RebalanceEvent,
+        tx: PendingTransaction,
+        on_update: Optional[Callable[[RebalanceEvent], None]],
+    ) -> None:
+        self.history.update_tx(row_id, tx.tx_hash, tx.status, self.vault_id)
+        if tx.status == "failed":
+            # Let the next chain read restore the real protocol
+            self.current_protocol = event.from_protocol
+            self.allocation = {event.from_protocol: 100.0}
+        if on_update is not None:
+            on_update(event.model_copy(update={"tx_hash": tx.tx_hash, "status": tx.status}))
+
+    def resume_pending(self, on_update: Optional[Callable[[RebalanceEvent], None]] = None) -> int:
+        """Watch the receipts of rebalances still pending from before a restart; returns how many"""
+        if self.tx_pipeline is None:
+            return 0
+        resumed = 0
+        for row_id, event, nonce, hashes in self.history.pending(self.vault_id):
+            if nonce is None or any(self.tx_pipeline.owns(h) for h in hashes):
+                # Recorded before nonces were kept, or already watched by this process
+                continue
+            self.tx_pipeline.resume(
+                nonce, hashes, on_update=lambda tx, row_id=row_id, event=event: self._record_tx_update(row_id, event, tx, on_update)
+            )
+            resumed += 1
+        return resumed
+
+    def onchain_plan_blocker(self, plan: AllocationPlan, apys: Dict[str, float]) -> Optional[str]:
+        """Why the contract can't execute `plan` (None if it can, or if the vault is simulated).
+
+        The deployed contract holds one protocol at a time, so on-chain a plan
+        collapses to a whole-vault move into its largest target weight, and
+        the contract only accepts moves whose APY spread is at least 2%.
+        """
+        if not self.is_onchain or not plan.moves:
+            return None
+        target = max(plan.weights, key=plan.weights.get)
+        if target == self.current_protocol:
+            return f"plan keeps {target} as the largest holding"
+        spread = apys.get(target, 0.0) - apys.get(self.current_protocol, 0.0)
+        if spread < MIN_REBALANCE_DELTA_PERCENT:
+            return (
+                f"{target} APY is {spread:.2f}% above {self.current_protocol}; "
+                f"the vault contract needs at least {MIN_REBALANCE_DELTA_PERCENT:.0f}%"
+            )
+        return None
+
+    async def execute_allocation(
+        self,
+        plan: AllocationPlan,
+        reason: str,
+        apys: Dict[str, float],
+        on_update: Optional[Callable[[RebalanceEvent], None]] = None,
+    ) -> List[str]:
+        """Apply an optimizer plan move by move; returns the tx hash of each move.
+
+        On-chain the plan collapses to one whole-vault rebalance, with the
+        target's APY spread as the contract's delta (see onchain_plan_blocker).
+        """
+        if not plan.moves:
+            return []
+
+        if self.dry_run:
+            print(f"📝 Dry run [{self.vault_id}]: would apply {len(plan.moves)} allocation move(s) (no PRIVATE_KEY)")
+            return []
+
+        self._check_leading()
+        if self.is_onchain:
+            blocker = self.onchain_plan_blocker(plan, apys)
+            if blocker is not None:
+                print(f"📝 Allocation plan [{self.vault_id}] not submitted: {blocker}")
+                return []
+            target = max(plan.weights, key=plan.weights.get)
+            spread = apys[target] - apys[self.current_protocol]
+            tx_hash = await self.execute_rebalance(
+                target, f"{reason} (split plan collapsed to {target})", spread, on_update
+            )
+            return [tx_hash] if tx_hash is not None else []
+
+        tx_hashes = []
+        for move in plan.moves:
+            event = RebalanceEvent(
+                timestamp=datetime.now(timezone.utc),
+                from_protocol=move.from_protocol,
+                to_protocol=move.to_protocol,
+                amount=f"{move.percentage:.2f}%",
+                reason=reason,
+                tx_hash=f"0x{'0'*64}",
+                status="simulated",
+            )
+            print(f"📝 Logging move [{self.vault_id}]: {move.percentage:.2f}% {move.from_protocol} -> {move.to_protocol}")
+            self.history.append(event, self.vault_id)
+            tx_hashes.append(event.tx_hash)
+        self.allocation = dict(plan.weights)
+        self.current_protocol = max(self.allocation, key=self.allocation.get)
+        return tx_hashes
+
+    def get_rebalance_history(
+        self,
+        limit: int = 50,
+        cursor: Optional[int] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        protocol: Optional[str] = None,
+    ) -> Tuple[List[RebalanceEvent], Optional[int]]:
+        """Get a page of rebalance history (newest first) and the next cursor"""
+        return self.history.query(
+            limit=limit, cursor=cursor, since=since, until=until, protocol=protocol, vault_id=self.vault_id
+        )
     
     async def get_balance(self) -> str:
-        """Get vault balance"""
-        # In production, query the contract
-        # For now, return simulated balance
+        """Get vault balance (BNB)"""
+        state = await self.get_chain_state()
+        if state is not None:
+            return str(Web3.from_wei(state.balance_wei, "ether"))
+        # No contract configured: simulated balance
         return "10.5"
@@ -0,0 +1,156 @@
+from typing import Any, Dict, Iterator, List, Optional
+import json
+import os
+from eth_account import Account
+
+from app.chain_reader import VaultChainReader
+from app.config import data_path, get_float_env, get_int_env
+from app.event_indexer import VaultEventIndexer
+from app.event_store import ChainEventStore
+from app.history_store import DEFAULT_VAULT_ID, RebalanceHistoryStore
+from app.models import RebalanceEvent
+from app.rpc import JsonRpcClient
+from app.rpc_pool import RpcEndpointPool
+from app.tx_pipeline import TransactionPipeline
+from app.vault_manager import VaultManager
+
+
+def load_vault_configs() -> List[Dict[str, Any]]:
+    """Vault definitions from VAULTS_FILE or VAULTS (JSON list), else the single default vault.
+
+    Each entry: {"id": "...", "address": "0x...", "initial_protocol": "..."}
+    """
+    path = os.getenv("VAULTS_FILE")
+    raw = os.getenv("VAULTS")
+    if path:
+        with open(path) as f:
+            configs = json.load(f)
+    elif raw:
+        configs = json.loads(raw)
+    else:
+        return [{"id": DEFAULT_VAULT_ID, "address": os.getenv("VAULT_CONTRACT_ADDRESS", "")}]
+
+    if not isinstance(configs, list) or not configs:
+        raise ValueError("Vault config must be a non-empty JSON list")
+
+    seen = set()
+    for config in configs:
+        vault_id = config.get("id") if isinstance(config, dict) else None
+        if not vault_id:
+            raise ValueError(f"Vault config entry without an id: {config!r}")
+        if vault_id in seen:
+            raise ValueError(f"Duplicate vault id: {vault_id}")
+        seen.add(vault_id)
+    return configs
+
+
+class VaultRegistry:
+    """All vaults managed by this backend, sharing one chain reader and history store"""
+
+    @staticmethod
+    def _rpc_client() -> JsonRpcClient:
+        """One node from BSC_RPC_URL, or a latency-routed pool over BSC_RPC_URLS"""
+        urls = [url.strip() for url in os.getenv("BSC_RPC_URLS", "").split(",") if url.strip()]
+        if len(urls) < 2:
+            return JsonRpcClient(urls[0] if urls else os.getenv("BSC_RPC_URL", "https://bsc-dataseed.binance.org/"))
+        return RpcEndpointPool(
+            urls,
+            hedge_percentile=get_float_env("RPC_HEDGE_PERCENTILE", 90.0),
+            hedge_min_delay_seconds=get_float_env("RPC_HEDGE_MIN_DELAY_SECONDS", 0.05),
+            max_lag_blocks=get_int_env("RPC_MAX_LAG_BLOCKS", 5),
+            head_check_seconds=get_float_env("RPC_HEAD_CHECK_SECONDS", 15.0),
+        )
+
+    def __init__(self, configs: Optional[List[Dict[str, Any]]] = None):
+        if configs is None:
+            configs = load_vault_configs()
+
+        db_path = os.getenv("REBALANCE_DB_PATH", data_path("yieldmind.db"))
+        self.history = RebalanceHistoryStore(
+            db_path,
+            recent_size=get_int_env("REBALANCE_HISTORY_MEMORY_SIZE", 200),
+        )
+        self.event_store = ChainEventStore(db_path)
+        self.rpc = self._rpc_client()
+        self.chain = VaultChainReader(
+            self.rpc,
+            block_time_seconds=get_float_env("BSC_BLOCK_TIME_SECONDS", 3.0),
+        )
+        private_key = os.getenv("PRIVATE_KEY", "")
+        self.tx_pipeline: Optional[TransactionPipeline] = None
+        try:
+            # Validates the key; the .env.example placeholder disables signing
+            signer = Account.from_key(private_key) if private_key else None
+        except ValueError:
+            print("PRIVATE_KEY is not a valid key; rebalances of on-chain vaults will be dry runs")
+            signer = None
+        if signer is not None:
+            # One signer for every vault, so nonces must come from one place
+            self.tx_pipeline = TransactionPipeline(
+                self.rpc,
+                private_key,
+                self.chain,
+                confirmations=get_int_env("TX_CONFIRMATIONS", 1),
+                poll_seconds=get_float_env("TX_POLL_SECONDS", 3.0),
+                replace_after_seconds=get_float_env("TX_REPLACE_AFTER_SECONDS", 45.0),
+                fee_bump_percent=get_float_env("TX_FEE_BUMP_PERCENT", 12.5),
+                max_replacements=get_int_env("TX_MAX_REPLACEMENTS", 3),
+            )
+        self._vaults: Dict[str, VaultManager] = {}
+        for config in configs:
+            self._vaults[config["id"]] = VaultManager(
+                vault_id=config["id"],
+                vault_address=config.get("address", ""),
+                initial_protocol=config.get("initial_protocol", "PancakeSwap V3"),
+                history_store=self.history,
+                chain=self.chain,
+                tx_pipeline=self.tx_pipeline,
+            )
+        self.default_id = configs[0]["id"]
+
+        self._ids_by_address = {vault.vault_address.lower(): vault.vault_id for vault in self if vault.is_onchain}
+        self.indexer: Optional[VaultEventIndexer] = None
+        if self._ids_by_address:
+            start_block = os.getenv("INDEXER_START_BLOCK")
+            self.indexer = VaultEventIndexer(
+                self.rpc,
+                self.event_store,
+                list(self._ids_by_address),
+                start_block=int(start_block) if start_block else None,
+                confirmations=get_int_env("INDEXER_CONFIRMATIONS", 15),
+                poll_seconds=get_float_env("INDEXER_POLL_SECONDS", 6.0),
+                max_blocks_per_pass=get_int_env("INDEXER_MAX_BLOCKS_PER_PASS", 200_000),
+                on_rebalance=self._record_indexed_rebalance,
+                on_rollback=self._drop_reorged_events,
+            )
+
+    def _record_indexed_rebalance(self, vault_address: str, event: RebalanceEvent) -> None:
+        vault_id = self._ids_by_address.get(vault_address)
+        if vault_id is None:
+            return
+        if self.tx_pipeline is not None and self.tx_pipeline.owns(event.tx_hash):
+            # Our own transaction: the pipeline records it once confirmed
+            return
+        self.history.append_if_new(event, vault_id)
+
+    def _drop_reorged_events(self, events: List[Dict[str, Any]]) -> None:
+        tx_hashes = [event["tx_hash"] for event in events if event["event"] == "Rebalance"]
+        if tx_hashes:
+            removed = self.history.delete_by_tx_hashes(tx_hashes)
+            print(f"Reorg: removed {removed} rebalance(s) from history")
+
+    def __iter__(self) -> Iterator[VaultManager]:
+        return iter(self._vaults.values())
+
+    def __len__(self) -> int:
+        return len(self._vaults)
+
+    @property
+    def default(self) -> VaultManager:
+        return self._vaults[self.default_id]
+
+    def get(self, vault_id: Optional[str] = None) -> Optional[VaultManager]:
+        """Look up a vault; None means the default vault"""
+        if vault_id is None:
+            return self.default
+        return self._vaults.get(vault_id)
@@ -0,0 +1,225 @@
+"""Coordination between uvicorn worker processes.
+
+Exactly one worker (the holder of the SQLite lease) runs cycles, the event
+indexer and transaction submission. It publishes agent state to the shared
+store; the others mirror that state into their own AIAgent, so every worker
+serves the same status, allocation and history, and forward cycle triggers
+to the leader.
+"""
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Optional
+from datetime import datetime, timezone
+import asyncio
+import os
+import socket
+import time
+import uuid
+
+from app.models import CycleJobResponse, ProtocolSnapshot, VaultCycleStatus
+from app.shared_state import LeaderLease, SharedAgentState
+
+if TYPE_CHECKING:
+    from app.ai_agent import AIAgent
+
+# Finished cycle jobs stay visible to other workers this long
+JOB_RETENTION_SECONDS = 86400.0
+
+
+class NotLeaderError(RuntimeError):
+    """A write (transaction or history row) attempted by a worker that no longer leads"""
+
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class WorkerCoordinator:
+    def __init__(
+        self,
+        agent: "AIAgent",
+        db_path: str,
+        lease_seconds: float = 15.0,
+        poll_seconds: float = 1.0,
+        on_elected: Optional[Callable[[], Awaitable[None]]] = None,
+        on_demoted: Optional[Callable[[], Awaitable[None]]] = None,
+    ):
+        self.agent = agent
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.lease = LeaderLease(db_path, self.worker_id, ttl_seconds=lease_seconds)
+        self.state = SharedAgentState(db_path)
+        self.poll_seconds = poll_seconds
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.is_leader = False
+        self._version = 0
+        self._renew_at = 0.0
+        # Cycle requests from followers -> the leader's job serving them
+        self._forwarded: Dict[str, str] = {}
+        self._history_counts: Dict[str, int] = {}
+        self._stopping = False
+        # Followers until elected
+        agent.records_history = False
+        agent.coordinator = self
+        for vault in agent.vaults:
+            vault.coordinator = self
+        agent.protocol_cache.add_listener(self._share_snapshot)
+
+    @property
+    def leading(self) -> bool:
+        """Leader with a lease that has not lapsed locally"""
+        return self.is_leader and self.lease.held
+
+    def check_leading(self) -> None:
+        """Raise NotLeaderError unless this worker may submit right now"""
+        if not self.leading:
+            raise NotLeaderError(f"Worker {self.worker_id} is not the leader; refusing to submit")
+
+    async def run(self) -> None:
+        """Election and state sync loop; runs until cancelled"""
+        while not self._stopping:
+            try:
+                await self._elect()
+                if self.is_leader:
+                    self._publish()
+                    self._serve_cycle_requests()
+                self._pull()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Worker coordination error: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self.is_leader:
+            self._publish()
+            self.lease.release()
+            self.is_leader = False
+            if self.on_demoted is not None:
+                await self.on_demoted()
+        self.lease.close()
+        self.state.close()
+
+    async def _elect(self) -> None:
+        now = time.monotonic()
+        if self.is_leader and now < self._renew_at and self.lease.held:
+            return
+        acquired = self.lease.try_acquire()
+        # Renew at a third of the lease so two missed polls don't lose it
+        self._renew_at = now + self.lease.ttl_seconds / 3
+        if acquired and not self.is_leader:
+            self.is_leader = True
+            print(f"👑 Worker {self.worker_id} elected leader")
+            self.agent.records_history = True
+            if self.on_elected is not None:
+                await self.on_elected()
+        elif not acquired and self.is_leader:
+            self.is_leader = False
+            print(f"Worker {self.worker_id} lost leadership to {self.lease.current_holder()}")
+            self.agent.records_history = False
+            if self.on_demoted is not None:
+                await self.on_demoted()
+        elif not acquired:
+            self.agent.records_history = False
+
+    def _share_snapshot(self, snapshot: ProtocolSnapshot) -> None:
+        # Any worker's fetch is shared, so others skip their own upstream calls
+        self.state.put("snapshot", snapshot.model_dump(mode="json"))
+
+    def _publish(self) -> None:
+        agent = self.agent
+        self.state.put("agent", {
+            "status": agent.status,
+            "last_run": agent.last_run.isoformat() if agent.last_run else None,
+            "last_error": agent.last_error,
+        })
+        for vault in agent.vaults:
+            self.state.put(f"vault:{vault.vault_id}", {
+                "status": agent.vault_status[vault.vault_id].model_dump(mode="json"),
+                "current_protocol": vault.current_protocol,
+                "allocation": vault.allocation,
+            })
+
+    def _serve_cycle_requests(self) -> None:
+        jobs = self.agent.cycle_jobs
+        for request_id in self.state.take_cycle_requests():
+            job, _ = jobs.trigger(source="api")
+            self._forwarded[request_id] = job.id
+        for job in jobs.jobs():
+            self.state.put(f"job:{job.id}", jobs.describe(job).model_dump(mode="json"))
+        for request_id, job_id in list(self._forwarded.items()):
+            job = jobs.get(job_id)
+            if job is None:
+                del self._forwarded[request_id]
+                continue
+            described = jobs.describe(job).model_copy(update={"job_id": request_id})
+            self.state.put(f"job:{request_id}", described.model_dump(mode="json"))
+            if job.state != "running":
+                del self._forwarded[request_id]
+        self.state.prune("job:", JOB_RETENTION_SECONDS)
+
+    def _pull(self) -> None:
+        changes, self._version = self.state.changes(self._version)
+        for key, value in changes:
+            if key == "snapshot":
+                self._apply_snapshot(ProtocolSnapshot.model_validate(value))
+            elif self.is_leader:
+                # The leader is the source of everything else
+                continue
+            elif key == "agent":
+                self._apply_agent(value)
+            elif key.startswith("vault:"):
+                self._apply_vault(key[len("vault:"):], value)
+
+    def _apply_snapshot(self, snapshot: ProtocolSnapshot) -> None:
+        cache = self.agent.protocol_cache
+        if cache.snapshot is not None and cache.snapshot.fetched_at >= snapshot.fetched_at:
+            return
+        cache.set_snapshot(snapshot)
+        self.agent.record_snapshot(snapshot)
+        self.agent._publish_snapshot(snapshot)
+
+    def _apply_agent(self, value: Dict) -> None:
+        agent = self.agent
+        if value["status"] != agent.status:
+            agent.status = value["status"]
+        agent.last_run = _parse_time(value["last_run"])
+        agent.last_error = value["last_error"]
+
+    def _apply_vault(self, vault_id: str, value: Dict) -> None:
+        vault = self.agent.vaults.get(vault_id)
+        if vault is None:
+            return
+        status = VaultCycleStatus.model_validate(value["status"])
+        previous = self.agent.vault_status[vault_id].status
+        self.agent.vault_status[vault_id] = status
+        if status.status != previous:
+            self.agent.events.publish("vault_status", {"vault_id": vault_id, "status": status.status})
+        vault.current_protocol = value["current_protocol"]
+        vault.allocation = value["allocation"]
+
+        # Rebalances the leader recorded since the last sync go out on this worker's stream too
+        count = vault.history.count(vault_id)
+        seen = self._history_counts.get(vault_id, count)
+        self._history_counts[vault_id] = count
+        if count > seen:
+            events, _ = vault.history.query(limit=min(count - seen, 50), vault_id=vault_id)
+            for event in reversed(events):
+                self.agent._publish_rebalance(vault, event)
+
+    def request_cycle(self) -> CycleJobResponse:
+        """Queue a cycle for the leader; the returned job id is tracked in the shared store"""
+        request_id = uuid.uuid4().hex
+        queued = CycleJobResponse(
+            job_id=request_id,
+            state="running",
+            source="api",
+            message="Queued for the leader worker",
+            started_at=datetime.now(timezone.utc),
+        )
+        self.state.put(f"job:{request_id}", queued.model_dump(mode="json"))
+        self.state.request_cycle(request_id)
+        return queued
+
+    def get_job(self, job_id: str) -> Optional[CycleJobResponse]:
+        value = self.state.get(f"job:{job_id}")
+        return CycleJobResponse.model_validate(value) if value is not None else None
@@ -0,0 +1,130 @@
+"""Offline backtest of the rebalance policy over a parameter grid.
+
+Examples:
+    python backtest.py --synthetic-days 730
+    python backtest.py --csv apy.csv --thresholds 0:5:0.25 --gas-bps 0,1,5
+    python backtest.py --store data/apy_history --since 2024-01-01 --output results.csv
+"""
+from typing import List
+import argparse
+import csv
+import json
+import os
+import time
+from datetime import datetime, timezone
+import numpy as np
+
+from app.backtest import (
+    DEFAULT_STEP_SECONDS,
+    load_csv_history,
+    load_store_history,
+    run_backtest,
+    synthetic_history,
+)
+from app.config import data_path
+from app.protocols import ProtocolManager
+from app.scoring import REBALANCE_THRESHOLD_PERCENT, RISK_DIVISOR
+from app.timeseries import ApyTimeSeriesStore
+
+LIVE_INTERVAL_MINUTES = 5
+LIVE_INITIAL_PROTOCOL = "PancakeSwap V3"
+
+
+def parse_values(spec: str) -> List[float]:
+    """"1,2,5" or an inclusive range "start:stop:step" """
+    if ":" in spec:
+        start, stop, step = (float(part) for part in spec.split(":"))
+        return list(np.round(np.arange(start, stop + step / 2, step), 10))
+    return [float(part) for part in spec.split(",") if part.strip()]
+
+
+def parse_time(value: str) -> float:
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backtest the YieldMind rebalance policy")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--synthetic-days", type=float, default=365, help="Generate this many days of synthetic APYs (default)")
+    source.add_argument("--csv", help="CSV with timestamp,<protocol>... or timestamp,protocol,apy")
+    source.add_argument("--store", nargs="?", const=os.getenv("APY_HISTORY_DIR", data_path("apy_history")),
+                        help="Recorded APY history directory (default: APY_HISTORY_DIR)")
+    parser.add_argument("--since", help="Start of the --store window (ISO date)")
+    parser.add_argument("--until", help="End of the --store window (ISO date)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--step-seconds", type=float, default=DEFAULT_STEP_SECONDS)
+    parser.add_argument("--thresholds", default="0:5:0.25", help="Rebalance thresholds in APY points")
+    parser.add_argument("--risk-weights", default="0,0.05,0.1,0.15,0.2,0.3", help="Score = APY / (1 + w * risk)")
+    parser.add_argument("--intervals", default="5,15,30,60,240,1440", help="Cycle intervals in minutes")
+    parser.add_argument("--gas-bps", default="0,0.5,1,2,5", help="Cost per rebalance in basis points of capital")
+    parser.add_argument("--initial", default=LIVE_INITIAL_PROTOCOL, help="Protocol held at the start")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--output", help="Write every combination to .csv or .json")
+    args = parser.parse_args()
+
+    pools = ProtocolManager().pools
+    risk_scores = {name: pool.risk_score for name, pool in pools.items()}
+
+    started = time.perf_counter()
+    if args.csv:
+        history = load_csv_history(args.csv, risk_scores, args.step_seconds)
+        label = args.csv
+    elif args.store:
+        end = parse_time(args.until) if args.until else time.time()
+        start = parse_time(args.since) if args.since else 0.0
+        history = load_store_history(ApyTimeSeriesStore(args.store), risk_scores, start, end, args.step_seconds)
+        label = args.store
+    else:
+        history = synthetic_history(pools, args.synthetic_days, args.step_seconds, args.seed)
+        label = f"synthetic, seed {args.seed}"
+    loaded = time.perf_counter()
+
+    result = run_backtest(
+        history,
+        thresholds=parse_values(args.thresholds),
+        risk_weights=parse_values(args.risk_weights),
+        intervals_minutes=parse_values(args.intervals),
+        gas_costs_bps=parse_values(args.gas_bps),
+        initial_protocol=args.initial,
+    )
+    finished = time.perf_counter()
+
+    print(
+        f"📈 {len(history.apys):,} samples x {len(history.names)} protocols ({history.years:.2f} years, {label}); "
+        f"{len(result):,} combinations in {finished - loaded:.2f}s (load {loaded - started:.2f}s)"
+    )
+    for name, column in zip(history.names, history.apys.T):
+        print(f"   {name}: mean APY {column.mean():.2f}%, hold-only {column.sum() * history.step_seconds / (365 * 86400) / history.years:.2f}%/yr")
+
+    header = f"{'threshold':>9} {'risk_w':>6} {'interval':>8} {'gas_bps':>7} {'moves':>6} {'net%/yr':>8} {'gross%':>8} {'gas%':>6}"
+    print(f"\nTop {args.top} by net yield:\n{header}")
+    for row in result.rows(result.order()[:args.top]):
+        print(
+            f"{row['threshold']:>9.2f} {row['risk_weight']:>6.2f} {row['interval_minutes']:>7.0f}m {row['gas_cost_bps']:>7.2f} "
+            f"{row['rebalances']:>6} {row['annualized_net_pct']:>8.3f} {row['gross_yield_pct']:>8.3f} {row['gas_pct']:>6.3f}"
+        )
+
+    live = result.find(REBALANCE_THRESHOLD_PERCENT, 1 / RISK_DIVISOR, LIVE_INTERVAL_MINUTES, parse_values(args.gas_bps)[0])
+    if live is not None:
+        row = result.rows([live])[0]
+        rank = int(np.flatnonzero(result.order() == live)[0]) + 1
+        print(f"\nLive policy (threshold {REBALANCE_THRESHOLD_PERCENT}, w {1 / RISK_DIVISOR:.2f}, {LIVE_INTERVAL_MINUTES}m): "
+              f"{row['annualized_net_pct']:.3f}%/yr, {row['rebalances']} moves, rank {rank:,}/{len(result):,}")
+
+    if args.output:
+        rows = result.rows(result.order())
+        with open(args.output, "w", newline="") as f:
+            if args.output.endswith(".json"):
+                json.dump({"years": history.years, "protocols": history.names, "results": rows}, f)
+            else:
+                writer = csv.DictWriter(f, fieldnames=result.COLUMNS)
+                writer.writeheader()
+                writer.writerows(rows)
+        print(f"\nWrote {len(rows):,} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
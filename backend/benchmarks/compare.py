@@ -0,0 +1,69 @@
+"""Compare two benchmark result files.
+
+    python -m benchmarks.compare base.json new.json --tolerance 10
+
+Exits with status 1 when any latency metric got slower (or throughput
+dropped) by more than the tolerance, so it can gate CI.
+"""
+from typing import Any, Dict, Iterator, Tuple
+import argparse
+import json
+import sys
+
+LATENCY_METRICS = ("p50_ms", "p99_ms")
+
+
+def _metrics(results: Dict[str, Any]) -> Iterator[Tuple[str, str, float, bool]]:
+    """(row, metric, value, higher_is_better) for everything worth comparing"""
+    for endpoint, summary in {**results.get("endpoints", {}), "TOTAL": results.get("total", {})}.items():
+        if "rps" in summary:
+            yield endpoint, "rps", summary["rps"], True
+        for metric in LATENCY_METRICS:
+            if metric in summary:
+                yield endpoint, metric, summary[metric], False
+    for stage, summary in results.get("cycles", {}).get("stages", {}).items():
+        for metric in LATENCY_METRICS:
+            if metric in summary:
+                yield f"stage:{stage}", metric, summary[metric], False
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="Allowed regression in percent")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    base_metrics = {(row, metric): (value, higher) for row, metric, value, higher in _metrics(base)}
+    print(f"base {base['meta'].get('commit', '')[:8]} vs new {new['meta'].get('commit', '')[:8]} (tolerance {args.tolerance:g}%)")
+    print(f"{'row':<42} {'metric':>7} {'base':>10} {'new':>10} {'change':>8}")
+
+    regressions = 0
+    for row, metric, value, higher_is_better in _metrics(new):
+        if (row, metric) not in base_metrics:
+            continue
+        before = base_metrics[(row, metric)][0]
+        change = (value - before) / before * 100 if before else 0.0
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > args.tolerance:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif worse < -args.tolerance:
+            flag = "  improved"
+        print(f"{row:<42} {metric:>7} {before:>10.2f} {value:>10.2f} {change:>+7.1f}%{flag}")
+
+    settings = [{k: v for k, v in r["meta"].get("config", {}).items() if k != "output"} for r in (base, new)]
+    if settings[0] != settings[1]:
+        print("\nNote: the runs used different benchmark settings")
+    print(f"\n{regressions} regression(s)")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
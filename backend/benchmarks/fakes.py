@@ -0,0 +1,373 @@
+"""Local stand-ins for Claude, the APY sources and the BSC node"""
+from typing import Any, Dict, List, Optional, Sequence
+import asyncio
+import itertools
+import json
+import math
+import random
+import threading
+import time
+from anthropic.types import TextBlock, ToolUseBlock, Usage
+from eth_abi import encode
+from eth_account import Account
+from eth_account.typed_transactions import TypedTransaction
+from hexbytes import HexBytes
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+import uvicorn
+from web3 import Web3
+
+from app.scoring import REBALANCE_THRESHOLD_PERCENT, risk_adjusted_return
+from app.vault_abi import PROTOCOL_ADDRESSES, VAULT_ABI
+
+
+class FakeMessage:
+    """Just the attributes AIAgent reads from a Claude response"""
+
+    def __init__(self, content: List[Any], stop_reason: str, usage: Usage):
+        self.content = content
+        self.stop_reason = stop_reason
+        self.usage = usage
+
+
+class _FakeMessages:
+    def __init__(self, client: "FakeAnthropicClient"):
+        self._client = client
+
+    async def create(self, **kwargs: Any) -> FakeMessage:
+        return await self._client.respond(**kwargs)
+
+
+class FakeAnthropicClient:
+    """Scripted tool_use responses after a configurable delay.
+
+    Mirrors the shape of `AsyncAnthropic().beta.prompt_caching.messages`.
+    Decisions follow the same rule as the local scorer, so cycles behave like
+    a well-behaved model would. Usage is estimated at ~4 characters a token
+    and follows the API's prompt caching: a tools + system prefix ending in a
+    cache_control block is written once and read afterwards, but only if it
+    reaches the model's minimum cacheable length.
+    """
+
+    def __init__(self, delay_seconds: float = 0.5, jitter_seconds: float = 0.0):
+        self.delay_seconds = delay_seconds
+        self.jitter_seconds = jitter_seconds
+        self.calls = 0
+        self._ids = itertools.count(1)
+        self._cached_prefixes: set = set()
+        messages = _FakeMessages(self)
+        self.beta = type("Beta", (), {"prompt_caching": type("PromptCaching", (), {"messages": messages})()})()
+
+    def _usage(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]], system: Any, model: str) -> Usage:
+        system = system or []
+        prefix = json.dumps(tools) + "".join(block.get("text", "") for block in system)
+        prefix_tokens = len(prefix) // 4
+        input_tokens = len(json.dumps(messages, default=str)) // 4
+        minimum = 2048 if "haiku" in model else 1024
+        read = written = 0
+        if any("cache_control" in block for block in system) and prefix_tokens >= minimum:
+            if prefix in self._cached_prefixes:
+                read = prefix_tokens
+            else:
+                self._cached_prefixes.add(prefix)
+                written = prefix_tokens
+        else:
+            input_tokens += prefix_tokens
+        return Usage(
+            input_tokens=input_tokens, output_tokens=120,
+            cache_read_input_tokens=read, cache_creation_input_tokens=written,
+        )
+
+    async def respond(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]], **kwargs: Any) -> FakeMessage:
+        self.calls += 1
+        await asyncio.sleep(self.delay_seconds + random.uniform(0, self.jitter_seconds))
+        usage = self._usage(messages, tools, kwargs.get("system"), kwargs.get("model", ""))
+
+        prompt = messages[0]["content"]
+        tool_names = {tool["name"] for tool in tools}
+        if "calculate_risk_adjusted_return" in tool_names and len(messages) == 1:
+            # Tool-loop mode, first round: ask for every metric
+            protocols = json.loads(prompt.split("\n")[1])
+            blocks = [
+                ToolUseBlock(
+                    type="tool_use", id=f"toolu_{next(self._ids)}", name="calculate_risk_adjusted_return",
+                    input={"apy": p["apy"], "risk_score": p["risk_score"]},
+                )
+                for p in protocols
+            ]
+            return FakeMessage(blocks, "tool_use", usage)
+
+        if "review_allocation" in tool_names:
+            plan = json.loads(prompt.split("\n", 1)[-1])["plan"]
+            approve = plan["net_improvement"] > 0 or not plan["current_feasible"]
+            review = {"approve": approve, "reason": f"Net improvement {plan['net_improvement']:.2f}%"}
+            blocks = [ToolUseBlock(type="tool_use", id=f"toolu_{next(self._ids)}", name="review_allocation", input=review)]
+            return FakeMessage(blocks, "tool_use", usage)
+
+        decision = self._decide(prompt)
+        blocks = [
+            TextBlock(type="text", text="Recommendation follows."),
+            ToolUseBlock(type="tool_use", id=f"toolu_{next(self._ids)}", name="recommend_rebalance", input=decision),
+        ]
+        return FakeMessage(blocks, "tool_use", usage)
+
+    @staticmethod
+    def _decide(prompt: str) -> Dict[str, Any]:
+        if prompt.startswith("Current Protocol Data:"):
+            lines = prompt.split("\n")
+            protocols = json.loads(lines[1])
+            current = json.loads(lines[4]).get("protocol")
+        else:
+            metrics = json.loads(prompt.split("\n", 2)[-1])
+            protocols = metrics["protocols"]
+            current = metrics["current_allocation"].get("protocol")
+        scores = {p["name"]: risk_adjusted_return(p["apy"], p["risk_score"]) for p in protocols}
+        best = max(scores, key=scores.get)
+        delta = scores[best] - scores.get(current, 0.0)
+        return {
+            "should_rebalance": best != current and delta > REBALANCE_THRESHOLD_PERCENT,
+            "target_protocol": best,
+            "delta_percentage": round(delta, 4),
+            "reason": f"{best} leads by {delta:.2f}% risk-adjusted",
+        }
+
+
+class ApyStub:
+    """APY source whose leader rotates over `period_seconds`.
+
+    Serves every pool in one document at GET /pools ({name: {"apy": x}}), the
+    shape the json_http adapter reads, and single pools at GET /apy/{name}.
+    """
+
+    def __init__(self, bases: Dict[str, float], swing: float = 4.0, period_seconds: float = 30.0, latency_seconds: float = 0.02):
+        self.bases = bases
+        self.swing = swing
+        self.period_seconds = period_seconds
+        self.latency_seconds = latency_seconds
+        self.requests = 0
+
+    def apy(self, name: str) -> float:
+        phase = 2 * math.pi * list(self.bases).index(name) / len(self.bases)
+        wave = math.sin(2 * math.pi * time.time() / self.period_seconds + phase)
+        return round(self.bases[name] + self.swing * wave, 4)
+
+    async def handle(self, request: Request) -> JSONResponse:
+        self.requests += 1
+        await asyncio.sleep(self.latency_seconds)
+        name = request.path_params["name"]
+        if name not in self.bases:
+            return JSONResponse({"error": "unknown pool"}, status_code=404)
+        return JSONResponse({"apy": self.apy(name)})
+
+    async def handle_all(self, request: Request) -> JSONResponse:
+        self.requests += 1
+        await asyncio.sleep(self.latency_seconds)
+        return JSONResponse({name: {"apy": self.apy(name)} for name in self.bases})
+
+
+GWEI = 10**9
+
+
+class MockChain:
+    """JSON-RPC node with the vault views, an advancing head and empty logs.
+
+    `slow_fraction` of requests take `slow_seconds` extra (a tail for hedging
+    to cut) and `head_lag_blocks` makes the node trail the chain head; reads
+    pinned to a block past its head fail with "header not found".
+
+    Signed transactions go to a mempool that is mined once per block like a
+    real node: nonces in order only, and only txs tipping at least
+    `min_priority_fee`. The first send of each nonce in `reject_nonces` is
+    refused and nonces in `revert_nonces` are mined with a failed receipt. A mined
+    executeRebalance moves `currentProtocol`.
+    """
+
+    def __init__(
+        self,
+        block_time_seconds: float = 3.0,
+        latency_seconds: float = 0.005,
+        slow_fraction: float = 0.0,
+        slow_seconds: float = 0.0,
+        head_lag_blocks: int = 0,
+        started: Optional[float] = None,
+    ):
+        self.block_time_seconds = block_time_seconds
+        self.latency_seconds = latency_seconds
+        self.slow_fraction = slow_fraction
+        self.slow_seconds = slow_seconds
+        self.head_lag_blocks = head_lag_blocks
+        self.started = time.time() if started is None else started
+        self.requests = 0
+        self.calls = 0
+        contract = Web3().eth.contract(abi=VAULT_ABI)
+        self._selectors = {
+            contract.encode_abi(name, args=[0] if name == "getRebalanceLog" else [])[:10]: name
+            for name in ("getBalance", "getRebalanceCount", "currentProtocol", "totalDeposits", "getRebalanceLog")
+        }
+        self._protocol = PROTOCOL_ADDRESSES["PancakeSwap V3"]
+        self._execute_selector = contract.encode_abi(
+            "executeRebalance", args=[PROTOCOL_ADDRESSES["Venus"], "", 0]
+        )[:10]
+        self.min_priority_fee = 0
+        self.reject_nonces: set = set()
+        self.revert_nonces: set = set()
+        # sender -> mined nonce count; (sender, nonce) -> (hash, tip, to, data)
+        self.mined_nonces: Dict[str, int] = {}
+        self.mempool: Dict[Any, Any] = {}
+        self.receipts: Dict[str, Dict[str, Any]] = {}
+        self.sent: List[Dict[str, Any]] = []
+        self._mined_head = 0
+
+    @property
+    def head(self) -> int:
+        return 1_000_000 + int((time.time() - self.started) / self.block_time_seconds) - self.head_lag_blocks
+
+    def _pending_nonce(self, sender: str) -> int:
+        """Next nonce after the contiguous run of mempool txs (later ones are queued, like geth)"""
+        nonce = self.mined_nonces.get(sender, 0)
+        while (sender, nonce) in self.mempool:
+            nonce += 1
+        return nonce
+
+    def _mine(self) -> None:
+        head = self.head
+        if head == self._mined_head:
+            return
+        self._mined_head = head
+        for sender in {sender for sender, _ in self.mempool}:
+            nonce = self.mined_nonces.get(sender, 0)
+            while (sender, nonce) in self.mempool and self.mempool[sender, nonce][1] >= self.min_priority_fee:
+                tx_hash, _, to, data = self.mempool.pop((sender, nonce))
+                ok = nonce not in self.revert_nonces
+                if ok and data.startswith(self._execute_selector):
+                    self._protocol = Web3.to_checksum_address("0x" + data[34:74])
+                self.receipts[tx_hash] = {
+                    "transactionHash": tx_hash,
+                    "blockNumber": hex(head),
+                    "status": "0x1" if ok else "0x0",
+                    "to": to,
+                }
+                nonce += 1
+            self.mined_nonces[sender] = nonce
+
+    def _send_raw(self, raw: str) -> str:
+        tx = TypedTransaction.from_bytes(HexBytes(raw)).as_dict()
+        sender = Account.recover_transaction(raw)
+        nonce, tip = tx["nonce"], tx["maxPriorityFeePerGas"]
+        if nonce in self.reject_nonces:
+            self.reject_nonces.discard(nonce)
+            raise ValueError("txpool is full")
+        if nonce < self.mined_nonces.get(sender, 0):
+            raise ValueError("nonce too low")
+        previous = self.mempool.get((sender, nonce))
+        if previous is not None and tip < previous[1] * 1.1:
+            raise ValueError("replacement transaction underpriced")
+        tx_hash = Web3.keccak(hexstr=raw).hex()
+        tx_hash = tx_hash if tx_hash.startswith("0x") else "0x" + tx_hash
+        data = tx["data"] if isinstance(tx["data"], str) else "0x" + bytes(tx["data"]).hex()
+        self.mempool[sender, nonce] = (tx_hash, tip, Web3.to_checksum_address(tx["to"]), data)
+        self.sent.append({"hash": tx_hash, "nonce": nonce, "tip": tip})
+        return tx_hash
+
+    def _check_block(self, tag: Any) -> None:
+        if isinstance(tag, str) and tag.startswith("0x") and int(tag, 16) > self.head:
+            raise ValueError("header not found")
+
+    def _eth_call(self, data: str) -> str:
+        name = self._selectors.get(data[:10])
+        if name == "getBalance":
+            value = encode(["uint256"], [3 * 10**18])
+        elif name == "getRebalanceCount":
+            value = encode(["uint256"], [0])
+        elif name == "currentProtocol":
+            value = encode(["address"], [self._protocol])
+        elif name == "totalDeposits":
+            value = encode(["uint256"], [5 * 10**18])
+        else:
+            raise ValueError("execution reverted")
+        return "0x" + value.hex()
+
+    def _handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls += 1
+        self._mine()
+        method, params = request.get("method"), request.get("params") or []
+        try:
+            if method == "eth_blockNumber":
+                result: Any = hex(self.head)
+            elif method == "eth_call":
+                self._check_block(params[1] if len(params) > 1 else "latest")
+                result = self._eth_call(params[0]["data"])
+            elif method == "eth_getLogs":
+                result = []
+            elif method == "eth_getBlockByNumber":
+                self._check_block(params[0])
+                result = {"number": params[0], "timestamp": hex(int(time.time())), "baseFeePerGas": hex(GWEI)}
+            elif method == "eth_chainId":
+                result = hex(56)
+            elif method == "eth_estimateGas":
+                result = hex(60_000)
+            elif method == "eth_gasPrice":
+                result = hex(2 * GWEI)
+            elif method == "eth_maxPriorityFeePerGas":
+                result = hex(GWEI)
+            elif method == "eth_getTransactionCount":
+                sender = Web3.to_checksum_address(params[0])
+                result = hex(self._pending_nonce(sender) if params[1] == "pending" else self.mined_nonces.get(sender, 0))
+            elif method == "eth_sendRawTransaction":
+                result = self._send_raw(params[0])
+            elif method == "eth_getTransactionReceipt":
+                result = self.receipts.get(params[0])
+            else:
+                return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32601, "message": f"{method} not supported"}}
+        except ValueError as e:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": 3, "message": str(e)}}
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+    async def handle(self, request: Request) -> JSONResponse:
+        self.requests += 1
+        body = await request.json()
+        slow = self.slow_seconds if random.random() < self.slow_fraction else 0.0
+        await asyncio.sleep(self.latency_seconds + slow)
+        if isinstance(body, list):
+            return JSONResponse([self._handle(item) for item in body])
+        return JSONResponse(self._handle(body))
+
+
+class StubServers:
+    """APY stub and mock RPC on ephemeral localhost ports, in their own thread.
+
+    Extra `nodes` are served at /rpc/0, /rpc/1, ... for the RPC node pool.
+    """
+
+    def __init__(self, apy: ApyStub, chain: MockChain, host: str = "127.0.0.1", nodes: Sequence[MockChain] = ()):
+        self.apy = apy
+        self.chain = chain
+        self.nodes = list(nodes)
+        self.host = host
+        app = Starlette(routes=[
+            Route("/pools", apy.handle_all),
+            Route("/apy/{name}", apy.handle),
+            Route("/rpc", chain.handle, methods=["POST"]),
+            *(Route(f"/rpc/{i}", node.handle, methods=["POST"]) for i, node in enumerate(self.nodes)),
+        ])
+        self._server = uvicorn.Server(uvicorn.Config(app, host=host, port=0, log_level="warning", lifespan="off"))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        port = self._server.servers[0].sockets[0].getsockname()[1]
+        return f"http://{self.host}:{port}"
+
+    def start(self) -> "StubServers":
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=5)
@@ -0,0 +1,332 @@
+"""Offline load + cycle benchmark.
+
+Starts the real FastAPI app with a fake Claude client, stub APY sources and a
+mock BSC node, drives agent cycles in the background and measures API
+latency under concurrent load. Results are written as JSON for
+`python -m benchmarks.compare`.
+
+    cd backend
+    python -m benchmarks.run --duration 20 --concurrency 32 --vaults 4
+"""
+from typing import Any, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+import httpx
+import numpy as np
+import uvicorn
+
+from benchmarks.fakes import ApyStub, FakeAnthropicClient, MockChain, StubServers
+
+POOL_RISK = {"PancakeSwap V3": 3, "Venus": 4, "Lista DAO": 5}
+
+DEFAULT_ENDPOINTS = [
+    "/api/protocols",
+    "/api/vault/status",
+    "/api/vaults",
+    "/api/rebalances?limit=20",
+    "/api/protocols/history?resolution=60",
+    "/",
+]
+
+
+def latency_summary(samples: List[float], duration: Optional[float] = None) -> Dict[str, float]:
+    """Count, mean and percentiles in milliseconds (plus throughput when duration is given)"""
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples) * 1000
+    summary = {
+        "count": len(samples),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+    if duration:
+        summary["rps"] = round(len(samples) / duration, 2)
+    return summary
+
+
+class StageTimings:
+    """Wall-clock durations of instrumented agent coroutines, by stage name"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.enabled = False
+
+    def wrap(self, obj: Any, attr: str, stage: str) -> None:
+        original: Callable = getattr(obj, attr)
+
+        async def timed(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            try:
+                return await original(*args, **kwargs)
+            finally:
+                if self.enabled:
+                    self.samples.setdefault(stage, []).append(time.perf_counter() - started)
+
+        setattr(obj, attr, timed)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {stage: latency_summary(samples) for stage, samples in sorted(self.samples.items())}
+
+
+def git_revision() -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, timeout=10).stdout.strip()
+        except Exception:
+            return ""
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def configure_environment(args: argparse.Namespace, stubs: StubServers, data_dir: str) -> None:
+    """Point the app at the stand-ins before it is imported"""
+    vaults = [
+        {"id": f"vault-{i}", "address": "0x" + f"{0x1000 + i:040x}", "initial_protocol": "PancakeSwap V3"}
+        for i in range(args.vaults)
+    ]
+    # Every pool comes from the stub in one GET per refresh, like a real aggregator source
+    protocols_file = os.path.join(data_dir, "protocols.json")
+    with open(protocols_file, "w") as f:
+        json.dump({
+            "sources": {"stub": {"adapter": "json_http", "url": f"{stubs.base_url}/pools"}},
+            "pools": [
+                {"name": name, "source": "stub", "risk_score": POOL_RISK.get(name, 5), "fallback_apy": base}
+                for name, base in stubs.apy.bases.items()
+            ],
+        }, f)
+    os.environ.update({
+        "PROTOCOLS_FILE": protocols_file,
+        "YIELDMIND_DATA_DIR": data_dir,
+        "REBALANCE_DB_PATH": os.path.join(data_dir, "yieldmind.db"),
+        "APY_HISTORY_DIR": os.path.join(data_dir, "apy_history"),
+        "ANTHROPIC_API_KEY": "benchmark",
+        "ANTHROPIC_DECISION_MODE": args.decision_mode,
+        "BSC_RPC_URL": f"{stubs.base_url}/rpc",
+        "BSC_RPC_URLS": ",".join(f"{stubs.base_url}/rpc/{i}" for i in range(len(stubs.nodes))),
+        "BSC_BLOCK_TIME_SECONDS": str(stubs.chain.block_time_seconds),
+        "VAULTS": json.dumps(vaults),
+        "PRIVATE_KEY": "",
+        "LLM_CALLS_PER_MINUTE": "100000",
+        "LLM_BURST": "1000",
+        "PROTOCOL_CACHE_TTL_SECONDS": str(args.cache_ttl),
+        # Cycles are driven by the harness, not the scheduler
+        "CYCLE_INTERVAL_MINUTES": "1440",
+    })
+
+
+def install_fakes(ai_agent: Any, llm: FakeAnthropicClient, timings: StageTimings) -> None:
+    ai_agent.client = llm
+    timings.wrap(ai_agent, "run_cycle", "cycle")
+    timings.wrap(ai_agent.protocol_cache, "refresh", "fetch_protocols")
+    timings.wrap(ai_agent, "_analyze", "decision")
+    timings.wrap(ai_agent, "_create_message", "llm_call")
+    timings.wrap(ai_agent, "execute_rebalance", "execute_rebalance")
+    for vault in ai_agent.vaults:
+        timings.wrap(vault, "get_current_allocation", "vault_read")
+
+
+class AppServer:
+    """The app under test on its own event loop, plus a loop that keeps cycles running"""
+
+    def __init__(self, app: Any, ai_agent: Any, cycle_pause: float):
+        self.ai_agent = ai_agent
+        self.cycle_pause = cycle_pause
+        self.cycles = 0
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._main()), daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.servers[0].sockets[0].getsockname()[1]}"
+
+    async def _drive_cycles(self) -> None:
+        while not self.server.started:
+            await asyncio.sleep(0.01)
+        while not self._stop.is_set():
+            job, _ = self.ai_agent.cycle_jobs.trigger(source="benchmark")
+            await asyncio.shield(job.task)
+            self.cycles += 1
+            await asyncio.sleep(self.cycle_pause)
+
+    async def _main(self) -> None:
+        driver = asyncio.create_task(self._drive_cycles())
+        await self.server.serve()
+        driver.cancel()
+
+    def start(self) -> "AppServer":
+        self._thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.server.should_exit = True
+        self._thread.join(timeout=30)
+
+
+async def generate_load(
+    base_url: str,
+    endpoints: List[str],
+    concurrency: int,
+    duration: float,
+    warmup: float,
+) -> Dict[str, Any]:
+    latencies: Dict[str, List[float]] = {endpoint: [] for endpoint in endpoints}
+    errors: Dict[str, int] = {endpoint: 0 for endpoint in endpoints}
+    measure_from = time.perf_counter() + warmup
+    stop_at = measure_from + duration
+
+    async def worker(offset: int, client: httpx.AsyncClient) -> None:
+        i = offset
+        while True:
+            endpoint = endpoints[i % len(endpoints)]
+            i += 1
+            started = time.perf_counter()
+            if started >= stop_at:
+                return
+            try:
+                response = await client.get(endpoint)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            if started >= measure_from:
+                latencies[endpoint].append(time.perf_counter() - started)
+                errors[endpoint] += failed
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        await asyncio.gather(*(worker(n, client) for n in range(concurrency)))
+
+    results = {}
+    for endpoint in endpoints:
+        summary = latency_summary(latencies[endpoint], duration)
+        summary["errors"] = errors[endpoint]
+        results[endpoint] = summary
+    total = latency_summary([s for samples in latencies.values() for s in samples], duration)
+    total["errors"] = sum(errors.values())
+    return {"endpoints": results, "total": total}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the YieldMind API and agent cycle offline")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds of load")
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--vaults", type=int, default=4)
+    parser.add_argument("--endpoints", nargs="+", default=DEFAULT_ENDPOINTS)
+    parser.add_argument("--llm-delay", type=float, default=0.5, help="Fake Claude latency (seconds)")
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--decision-mode", choices=("single", "tools", "allocation"), default="single")
+    parser.add_argument("--pools", type=int, default=3, help="Pools served by the APY stub (the 3 real ones plus synthetic extras)")
+    parser.add_argument("--apy-latency", type=float, default=0.02)
+    parser.add_argument("--apy-period", type=float, default=20.0, help="Seconds for the APY leader to rotate")
+    parser.add_argument("--rpc-latency", type=float, default=0.005)
+    parser.add_argument(
+        "--rpc-nodes", type=int, default=0,
+        help="Serve N mock nodes to the RPC pool (increasing latency, a slow tail, the last one lagging)",
+    )
+    parser.add_argument("--block-time", type=float, default=3.0)
+    parser.add_argument("--cache-ttl", type=float, default=5.0, help="PROTOCOL_CACHE_TTL_SECONDS for the app")
+    parser.add_argument("--cycle-pause", type=float, default=0.5, help="Pause between background cycles")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<time>-<commit>.json)")
+    args = parser.parse_args()
+
+    revision = git_revision()
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "results",
+        f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{(revision['commit'] or 'nogit')[:8]}.json",
+    )
+
+    bases = {"PancakeSwap V3": 12.5, "Venus": 15.2, "Lista DAO": 18.7}
+    for i in range(max(0, args.pools - len(bases))):
+        bases[f"Pool {i + 1}"] = round(8 + (i * 7.3) % 6, 2)
+    chain = MockChain(block_time_seconds=args.block_time, latency_seconds=args.rpc_latency)
+    nodes = [
+        MockChain(
+            block_time_seconds=args.block_time,
+            latency_seconds=args.rpc_latency * (1 + i),
+            slow_fraction=0.05,
+            slow_seconds=0.25,
+            head_lag_blocks=20 if i == args.rpc_nodes - 1 and args.rpc_nodes > 2 else 0,
+            started=chain.started,
+        )
+        for i in range(args.rpc_nodes)
+    ]
+    stubs = StubServers(
+        ApyStub(bases, period_seconds=args.apy_period, latency_seconds=args.apy_latency),
+        chain,
+        nodes=nodes,
+    ).start()
+    data_dir = tempfile.mkdtemp(prefix="yieldmind-bench-")
+    configure_environment(args, stubs, data_dir)
+
+    # Imported only now: main builds the agent from the environment at import time
+    import main as app_main
+
+    llm = FakeAnthropicClient(args.llm_delay, args.llm_jitter)
+    timings = StageTimings()
+    install_fakes(app_main.ai_agent, llm, timings)
+
+    server = AppServer(app_main.app, app_main.ai_agent, args.cycle_pause).start()
+    print(f"⏱️  Load: {args.concurrency} clients x {args.duration:.0f}s (+{args.warmup:.0f}s warmup), {args.vaults} vaults")
+
+    # Warmup runs first; stage timings cover only the measured window
+    threading.Timer(args.warmup, lambda: setattr(timings, "enabled", True)).start()
+    cycles_before = server.cycles
+    load = asyncio.run(generate_load(server.base_url, args.endpoints, args.concurrency, args.duration, args.warmup))
+    timings.enabled = False
+    cycles = server.cycles - cycles_before
+    server.stop()
+    stubs.stop()
+
+    results = {
+        "meta": {
+            **revision,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "config": vars(args),
+        },
+        **load,
+        "cycles": {"completed": cycles, "stages": timings.summary()},
+        "stand_ins": {
+            "llm_calls": llm.calls,
+            "apy_requests": stubs.apy.requests,
+            "rpc_http_requests": stubs.chain.requests + sum(node.requests for node in stubs.nodes),
+            "rpc_calls": stubs.chain.calls + sum(node.calls for node in stubs.nodes),
+            "rpc_node_requests": [node.requests for node in stubs.nodes],
+        },
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"\n{'endpoint':<40} {'rps':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for endpoint, summary in {**results["endpoints"], "TOTAL": results["total"]}.items():
+        print(f"{endpoint:<40} {summary.get('rps', 0):>9.1f} {summary.get('p50_ms', 0):>9.2f} {summary.get('p99_ms', 0):>9.2f} {summary['errors']:>7}")
+    print(f"\n{'cycle stage':<40} {'count':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    for stage, summary in results["cycles"]["stages"].items():
+        print(f"{stage:<40} {summary['count']:>9} {summary.get('p50_ms', 0):>9.2f} {summary.get('p99_ms', 0):>9.2f}")
+    stand_ins = results["stand_ins"]
+    print(f"\n{cycles} cycles, {llm.calls} LLM calls, {stand_ins['rpc_calls']} RPC calls in {stand_ins['rpc_http_requests']} requests")
+    if stubs.nodes:
+        print(f"RPC node requests: {stand_ins['rpc_node_requests']}")
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Rebalance transactions against the mock BSC node: nonce gaps, speed-ups, reverts, restarts.
+
+Runs the real TransactionPipeline and VaultManager over JSON-RPC against
+`MockChain` (offline, fast blocks) and checks what ends up on the node and
+in the rebalance history.
+
+    cd backend
+    python -m benchmarks.tx_scenarios        # exits 1 if a scenario fails
+"""
+from typing import Awaitable, Callable, List, Tuple
+from datetime import datetime, timezone
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from app.chain_reader import VaultChainReader
+from app.history_store import RebalanceHistoryStore
+from app.models import RebalanceEvent
+from app.http_client import close_http_client
+from app.rpc import JsonRpcClient
+from app.tx_pipeline import TransactionPipeline
+from app.vault_manager import VaultManager
+from benchmarks.fakes import GWEI, ApyStub, MockChain, StubServers
+
+# Throwaway key; the mock node accepts any signer
+PRIVATE_KEY = "0x" + "11" * 32
+BLOCK_TIME_SECONDS = 0.1
+
+
+class Scenario:
+    def __init__(self, chain: MockChain, rpc_url: str, data_dir: str):
+        self.chain = chain
+        rpc = JsonRpcClient(rpc_url)
+        self.reader = VaultChainReader(rpc, block_time_seconds=BLOCK_TIME_SECONDS)
+        self.pipeline = self._pipeline()
+        self.history = RebalanceHistoryStore(os.path.join(data_dir, "yieldmind.db"))
+        self.failures: List[str] = []
+
+    def _pipeline(self) -> TransactionPipeline:
+        return TransactionPipeline(
+            self.reader.rpc, PRIVATE_KEY, self.reader, confirmations=2, poll_seconds=0.05, replace_after_seconds=0.4,
+        )
+
+    async def restart(self) -> None:
+        """Lose every in-flight watcher, as a process restart would"""
+        await self.pipeline.close()
+        self.pipeline = self._pipeline()
+
+    def vault(self, vault_id: str, index: int) -> VaultManager:
+        return VaultManager(vault_id, "0x" + f"{index + 1:040x}", "PancakeSwap V3", self.history, self.reader, self.pipeline)
+
+    def check(self, ok: bool, what: str) -> None:
+        print(f"  {'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            self.failures.append(what)
+
+    async def settle(self, timeout: float = 5.0) -> None:
+        """Wait until every submitted transaction is confirmed or failed"""
+        deadline = time.monotonic() + timeout
+        while self.pipeline._pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    async def close(self) -> None:
+        await self.pipeline.close()
+        self.history.close()
+
+
+async def nonce_gap(s: Scenario) -> None:
+    """A send refused after a later nonce went out must not leave a hole that stalls it"""
+    s.chain.reject_nonces.add(0)
+    a, b, c = s.vault("a", 0), s.vault("b", 1), s.vault("c", 2)
+    results = await asyncio.gather(
+        a.execute_rebalance("Venus", "gap test", 2.5),
+        b.execute_rebalance("Venus", "gap test", 2.5),
+        return_exceptions=True,
+    )
+    s.check(isinstance(results[0], Exception) and isinstance(results[1], str), "nonce 0 is refused, nonce 1 accepted")
+    s.check(s.history.count(a.vault_id) == 0, "no history row for the refused send")
+    await c.execute_rebalance("Venus", "gap test", 2.5)
+    await s.settle()
+    nonces = [tx["nonce"] for tx in s.chain.sent]
+    s.check(nonces == [1, 0], f"the next transaction refills the gap (sent nonces {nonces})")
+    statuses = [s.history.latest(v.vault_id).status for v in (b, c)]
+    s.check(statuses == ["confirmed", "confirmed"], f"the queued and the refilling tx both confirm {statuses}")
+
+
+async def replacement(s: Scenario) -> None:
+    """An underpriced tx is re-sent with the same nonce and higher fees; history follows the new hash"""
+    s.chain.min_priority_fee = int(1.1 * GWEI)
+    vault = s.vault("stuck", 0)
+    first = await vault.execute_rebalance("Lista DAO", "speed-up test", 3.0)
+    await s.settle()
+    sends = list(s.chain.sent)
+    event = s.history.latest(vault.vault_id)
+    s.check(len(sends) >= 2 and len({tx["nonce"] for tx in sends}) == 1, f"{len(sends)} sends share one nonce")
+    s.check(sends[-1]["tip"] >= sends[0]["tip"] * 1.125, "replacement tip is bumped by at least 12.5%")
+    s.check(event.status == "confirmed" and event.tx_hash == sends[-1]["hash"] != first, "history holds the mined replacement")
+    await vault.get_chain_state()
+    s.check(vault.current_protocol == "Lista DAO", "contract reports the new protocol")
+
+
+async def failed_receipt(s: Scenario) -> None:
+    """A mined but reverted tx is recorded as failed and the vault falls back to its old protocol"""
+    s.chain.revert_nonces.add(0)
+    vault = s.vault("revert", 0)
+    await vault.execute_rebalance("Venus", "revert test", 2.5)
+    s.check(vault.current_protocol == "Venus", "protocol is updated optimistically on submit")
+    await s.settle()
+    event = s.history.latest(vault.vault_id)
+    s.check(event.status == "failed", f"history status is {event.status}")
+    s.check(vault.current_protocol == "PancakeSwap V3", "vault falls back to the previous protocol")
+
+
+async def _stuck_replacement(s: Scenario, vault: VaultManager) -> List[str]:
+    """Submit a tx no block will include, wait for one speed-up, then restart; returns the hashes sent"""
+    s.chain.min_priority_fee = 100 * GWEI
+    await vault.execute_rebalance("Lista DAO", "restart test", 3.0)
+    deadline = time.monotonic() + 5
+    while len(s.chain.sent) < 2 and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    await s.restart()
+    # The replacement's tip was bumped past this; the original's was not
+    s.chain.min_priority_fee = int(1.1 * GWEI)
+    return [tx["hash"] for tx in s.chain.sent]
+
+
+async def restart_resume(s: Scenario) -> None:
+    """A restarted pipeline resolves a row left pending, even when a speed-up was mined"""
+    hashes = await _stuck_replacement(s, s.vault("resume", 0))
+    vault = s.vault("resume", 0)
+    vault.tx_pipeline = s.pipeline
+    s.check(vault.resume_pending() == 1, "the pending row is resumed after the restart")
+    await s.settle()
+    event = s.history.latest(vault.vault_id)
+    s.check(event.status == "confirmed" and event.tx_hash == hashes[-1], f"row confirmed with the mined hash ({event.status})")
+    s.check(s.history.count(vault.vault_id) == 1, "no second row")
+
+
+async def restart_indexer(s: Scenario) -> None:
+    """Without a resumed watcher, the indexed log resolves the pending row instead of duplicating it"""
+    hashes = await _stuck_replacement(s, s.vault("indexed", 0))
+    mined = RebalanceEvent(
+        timestamp=datetime.now(timezone.utc), from_protocol="PancakeSwap V3", to_protocol="Lista DAO",
+        amount="3", reason="restart test", tx_hash=hashes[-1], status="confirmed",
+    )
+    s.check(s.history.append_if_new(mined, "indexed") is None, "the indexed speed-up adds no row")
+    event = s.history.latest("indexed")
+    s.check(event.status == "confirmed" and event.tx_hash == hashes[-1], f"row confirmed with the mined hash ({event.status})")
+    s.check(s.history.count("indexed") == 1, "no second row")
+
+
+async def restart_failed(s: Scenario) -> None:
+    """A tx that reverts after a restart is recorded as failed by the resumed watcher"""
+    s.chain.revert_nonces.add(0)
+    await _stuck_replacement(s, s.vault("revert", 0))
+    vault = s.vault("revert", 0)
+    vault.tx_pipeline = s.pipeline
+    vault.resume_pending()
+    await s.settle()
+    s.check(s.history.latest(vault.vault_id).status == "failed", "row marked failed")
+
+
+SCENARIOS: List[Tuple[str, Callable[[Scenario], Awaitable[None]]]] = [
+    ("nonce gap", nonce_gap),
+    ("replacement", replacement),
+    ("failed receipt", failed_receipt),
+    ("restart: resumed watcher", restart_resume),
+    ("restart: indexed log", restart_indexer),
+    ("restart: reverted", restart_failed),
+]
+
+
+async def run_all() -> List[str]:
+    failures = []
+    for name, scenario in SCENARIOS:
+        print(f"{name}:")
+        # Fresh node and signer state per scenario
+        chain = MockChain(block_time_seconds=BLOCK_TIME_SECONDS, latency_seconds=0.001)
+        servers = StubServers(ApyStub({}), chain).start()
+        with tempfile.TemporaryDirectory(prefix="yieldmind-tx-") as data_dir:
+            s = Scenario(chain, f"{servers.base_url}/rpc", data_dir)
+            try:
+                await scenario(s)
+            except Exception as e:
+                s.check(False, f"raised {type(e).__name__}: {e}")
+            finally:
+                await s.close()
+                servers.stop()
+        failures += [f"{name}: {what}" for what in s.failures]
+    await close_http_client()
+    return failures
+
+
+def main() -> None:
+    failures = asyncio.run(run_all())
+    print(f"\n{len(SCENARIOS)} scenarios, {len(failures)} failed check(s)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,31 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
 import uvicorn
 from dotenv import load_dotenv
+import asyncio
 import os
+from datetime import datetime, timezone
 
-from app.ai_agent import AIAgent
-from app.routes import router, set_ai_agent
-from app.models import BackendRootResponse
-
+# Before the app imports: some modules read settings when first used.
+# PROMETHEUS_MULTIPROC_DIR is read when prometheus_client is first imported.
 load_dotenv()
 
-def _get_int_env(name: str, default: int) -> int:
-    raw = os.getenv(name)
-    if raw is None or raw == "":
-        return default
+from prometheus_client import CONTENT_TYPE_LATEST
 
-    try:
-        return int(raw)
-    except ValueError:
-        print(f"Invalid {name}={raw!r}; using {default}")
-        return default
+from app.ai_agent import AIAgent
+from app.routes import router, set_ai_agent
+from app.http_client import close_http_client
+from app.models import BackendRootResponse
+from app.config import data_path, get_float_env, get_int_env
+from app.workers import WorkerCoordinator
+from app.adaptive_scheduler import AdaptiveCycleScheduler
+from app import metrics
 
 DEFAULT_CYCLE_INTERVAL_MINUTES = 5
 MIN_CYCLE_INTERVAL_MINUTES = 5
 
-raw_cycle_interval = _get_int_env("CYCLE_INTERVAL_MINUTES", DEFAULT_CYCLE_INTERVAL_MINUTES)
+raw_cycle_interval = get_int_env("CYCLE_INTERVAL_MINUTES", DEFAULT_CYCLE_INTERVAL_MINUTES)
 if raw_cycle_interval < MIN_CYCLE_INTERVAL_MINUTES:
     print(
         f"CYCLE_INTERVAL_MINUTES={raw_cycle_interval} is too low; using {MIN_CYCLE_INTERVAL_MINUTES}"
@@ -34,6 +34,17 @@ if raw_cycle_interval < MIN_CYCLE_INTERVAL_MINUTES:
 else:
     CYCLE_INTERVAL_MINUTES = raw_cycle_interval
 
+# "interval" runs a cycle every CYCLE_INTERVAL_MINUTES; "adaptive" polls APYs and
+# runs one only when a rebalance signal appears (or the last cycle is too old)
+CYCLE_SCHEDULER = os.getenv("CYCLE_SCHEDULER", "interval").strip().lower()
+if CYCLE_SCHEDULER not in ("interval", "adaptive"):
+    print(f"Unknown CYCLE_SCHEDULER={CYCLE_SCHEDULER!r}; using 'interval'")
+    CYCLE_SCHEDULER = "interval"
+CYCLE_MAX_STALENESS_MINUTES = get_int_env("CYCLE_MAX_STALENESS_MINUTES", 30)
+metrics.set_cycle_interval(
+    (CYCLE_MAX_STALENESS_MINUTES if CYCLE_SCHEDULER == "adaptive" else CYCLE_INTERVAL_MINUTES) * 60
+)
+
 app = FastAPI(title="YieldMind AI Backend", version="1.0.0")
 
 # CORS middleware
@@ -48,11 +59,76 @@ app.add_middleware(
 # Initialize AI Agent
 ai_agent = AIAgent()
 set_ai_agent(ai_agent)
+if CYCLE_SCHEDULER == "adaptive":
+    ai_agent.adaptive_scheduler = AdaptiveCycleScheduler(
+        ai_agent,
+        poll_seconds=get_float_env("APY_POLL_SECONDS", 15.0),
+        max_staleness_seconds=CYCLE_MAX_STALENESS_MINUTES * 60,
+        min_interval_seconds=get_float_env("CYCLE_MIN_INTERVAL_SECONDS", 60.0),
+        max_cycles_per_hour=get_float_env("CYCLE_MAX_PER_HOUR", 12.0),
+        rearm_spread=get_float_env("CYCLE_REARM_SPREAD", 1.0),
+    )
+
+# Setup scheduler for 5-minute cycles. AsyncIOScheduler runs the coroutine on the
+# server's event loop; it is started in the startup hook once that loop exists.
+scheduler = AsyncIOScheduler()
+indexer_task = None
+adaptive_task = None
+
+
+async def start_leader_duties():
+    """Cycles and the event indexer; with several workers only the leader runs these"""
+    global indexer_task, adaptive_task
+    ai_agent.resume_pending_transactions()
+    if ai_agent.adaptive_scheduler is not None:
+        # Its first poll finds no previous cycle and runs one right away
+        if adaptive_task is None:
+            adaptive_task = asyncio.create_task(ai_agent.adaptive_scheduler.run())
+    else:
+        # Run the initial cycle right away in the background instead of blocking startup
+        scheduler.add_job(
+            ai_agent.cycle_jobs.run_scheduled,
+            'interval',
+            minutes=CYCLE_INTERVAL_MINUTES,
+            next_run_time=datetime.now(timezone.utc),
+            max_instances=1,
+            coalesce=True,
+            id="cycle",
+            replace_existing=True,
+        )
+    if ai_agent.vaults.indexer is not None and indexer_task is None:
+        indexer_task = asyncio.create_task(ai_agent.vaults.indexer.run_forever())
+
 
-# Setup scheduler for 5-minute cycles
-scheduler = BackgroundScheduler()
-scheduler.add_job(ai_agent.run_cycle, 'interval', minutes=CYCLE_INTERVAL_MINUTES)
-scheduler.start()
+async def stop_leader_duties():
+    global indexer_task, adaptive_task
+    # A cycle started as leader must not keep submitting after the lease is gone
+    if ai_agent.cycle_jobs.cancel_current("this worker is no longer the leader"):
+        print("Cancelled the running cycle")
+    metrics.cycles_stopped()
+    if scheduler.get_job("cycle") is not None:
+        scheduler.remove_job("cycle")
+    if adaptive_task is not None:
+        adaptive_task.cancel()
+        adaptive_task = None
+    if indexer_task is not None:
+        indexer_task.cancel()
+        indexer_task = None
+
+
+# With `uvicorn --workers N` every process runs this module; LEADER_ELECTION=1
+# makes them elect one leader through the shared SQLite database
+coordinator = None
+coordinator_task = None
+if get_int_env("LEADER_ELECTION", 0):
+    coordinator = WorkerCoordinator(
+        ai_agent,
+        os.getenv("REBALANCE_DB_PATH", data_path("yieldmind.db")),
+        lease_seconds=get_float_env("LEADER_LEASE_SECONDS", 15.0),
+        poll_seconds=get_float_env("SHARED_STATE_POLL_SECONDS", 1.0),
+        on_elected=start_leader_duties,
+        on_demoted=stop_leader_duties,
+    )
 
 # Include routes
 app.include_router(router, prefix="/api")
@@ -61,13 +137,35 @@ app.include_router(router, prefix="/api")
 async def startup_event():
     print("🚀 YieldMind AI Backend started")
     print(f"🤖 AI Agent initialized (model: {ai_agent.model})")
-    print(f"⏱️  Running optimization cycles every {CYCLE_INTERVAL_MINUTES} minutes")
-    # Run initial cycle
-    await ai_agent.run_cycle()
+    if CYCLE_SCHEDULER == "adaptive":
+        print(
+            f"⏱️  Adaptive cycles: APYs polled every {ai_agent.adaptive_scheduler.poll_seconds:.0f}s, "
+            f"a cycle at least every {CYCLE_MAX_STALENESS_MINUTES} minutes"
+        )
+    else:
+        print(f"⏱️  Running optimization cycles every {CYCLE_INTERVAL_MINUTES} minutes")
+    if metrics.MULTIPROCESS:
+        scheduler.add_job(metrics.refresh_cycle_lag, 'interval', seconds=5, id="cycle_lag_metric")
+    scheduler.start()
+    if coordinator is None:
+        await start_leader_duties()
+    else:
+        global coordinator_task
+        print(f"🗳️  Leader election enabled (worker {coordinator.worker_id})")
+        coordinator_task = asyncio.create_task(coordinator.run())
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    if coordinator is not None:
+        coordinator_task.cancel()
+        await coordinator.stop()
+    await stop_leader_duties()
     scheduler.shutdown()
+    if ai_agent.vaults.tx_pipeline is not None:
+        await ai_agent.vaults.tx_pipeline.close()
+    metrics.process_exited()
+    await close_http_client()
+    ai_agent.apy_history.flush()
 
 @app.get("/", response_model=BackendRootResponse)
 async def root() -> BackendRootResponse:
@@ -75,9 +173,18 @@ async def root() -> BackendRootResponse:
         name="YieldMind AI Backend",
         status="active",
         ai_model=ai_agent.model,
-        cycle_interval=f"{CYCLE_INTERVAL_MINUTES} minutes",
-        cycle_interval_minutes=CYCLE_INTERVAL_MINUTES,
+        cycle_interval=(
+            f"adaptive (at most {CYCLE_MAX_STALENESS_MINUTES} minutes)"
+            if CYCLE_SCHEDULER == "adaptive" else f"{CYCLE_INTERVAL_MINUTES} minutes"
+        ),
+        cycle_interval_minutes=(
+            CYCLE_MAX_STALENESS_MINUTES if CYCLE_SCHEDULER == "adaptive" else CYCLE_INTERVAL_MINUTES
+        ),
     )
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics() -> Response:
+    return Response(metrics.render(), media_type=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
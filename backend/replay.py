@@ -0,0 +1,94 @@
+"""Replay recorded agent cycles offline and flag behavior or latency changes.
+
+Examples:
+    python replay.py                                  # every trace in CYCLE_TRACE_DIR
+    python replay.py data/traces/cycles.jsonl.gz --last 20 --output before.json
+    python replay.py --baseline before.json --tolerance 25   # exits 1 on divergence or slowdown
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from app.config import data_path
+from app.cycle_trace import read_traces, trace_files
+from app.replay import ReplayResult, replay_trace
+
+
+def main() -> None:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Replay recorded YieldMind cycles against the current code")
+    parser.add_argument("paths", nargs="*", help="Trace files (default: every log in CYCLE_TRACE_DIR)")
+    parser.add_argument("--last", type=int, help="Only the most recent N cycles")
+    parser.add_argument("--cycle", help="Only the cycle with this id")
+    parser.add_argument("--realtime", action="store_true", help="Sleep for each recorded Claude call")
+    parser.add_argument("--repeat", type=int, default=3, help="Replays per cycle; the fastest counts")
+    parser.add_argument("--output", help="Write per-cycle replay results (JSON) for a later --baseline")
+    parser.add_argument("--baseline", help="Earlier --output to compare replay latency against")
+    parser.add_argument("--tolerance", type=float, default=25.0, help="Allowed local-time growth vs --baseline, percent")
+    parser.add_argument("--min-regression-ms", type=float, default=2.0, help="Ignore latency growth below this")
+    parser.add_argument("--verbose", action="store_true", help="Print the first differing Claude request")
+    args = parser.parse_args()
+
+    paths = args.paths or trace_files(os.getenv("CYCLE_TRACE_DIR") or data_path("traces"))
+    traces = [t for t in read_traces(paths) if args.cycle is None or t["cycle_id"] == args.cycle]
+    if args.last:
+        traces = traces[-args.last:]
+    if not traces:
+        print("No recorded cycles found")
+        sys.exit(1)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["cycles"]
+
+    diverged = regressed = 0
+    results = {}
+    # "recorded ms" is production time on other hardware (a lower bound with concurrent
+    # vaults); regressions are judged against a --baseline replay on this machine
+    print(f"{'cycle':<14} {'started':<20} {'vaults':>6} {'llm':>5} {'recorded ms':>12} {'replay ms':>10}  result")
+    for trace in traces:
+        runs = [asyncio.run(replay_trace(trace, realtime=args.realtime)) for _ in range(max(1, args.repeat))]
+        result: ReplayResult = runs[0]
+        recorded_ms = ReplayResult.local_seconds(trace) * 1000
+        replayed_ms = min(ReplayResult.local_seconds(run.replayed) for run in runs) * 1000
+        before = baseline.get(trace["cycle_id"], {}).get("replay_ms")
+        slower = (
+            before is not None
+            and replayed_ms - before > args.min_regression_ms
+            and replayed_ms > before * (1 + args.tolerance / 100)
+        )
+        verdict = "ok" if result.matches else "DIVERGED: " + "; ".join(result.differences)
+        if slower:
+            verdict += f" (SLOWER than baseline {before:.1f} ms)"
+        diverged += not result.matches
+        regressed += slower
+        results[trace["cycle_id"]] = {
+            "replay_ms": round(replayed_ms, 3),
+            "recorded_ms": round(recorded_ms, 3),
+            "matches": result.matches,
+            "differences": result.differences,
+        }
+        print(
+            f"{trace['cycle_id'][:12]:<14} {trace['started_at'][:19]:<20} {len(trace['vaults']):>6} "
+            f"{len(trace['llm']):>5} {recorded_ms:>12.1f} {replayed_ms:>10.1f}  {verdict}"
+        )
+        if args.verbose and result.unmatched:
+            print(f"    first unmatched request: {result.unmatched[0]}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cycles": results}, f, indent=2)
+    summary = f"\n{len(traces)} cycles replayed: {diverged} diverged"
+    if baseline:
+        summary += f", {regressed} slower than {args.baseline}"
+    print(summary)
+    sys.exit(1 if diverged or regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -44,6 +44,23 @@ type BackendRebalanceEvent = {
   reason: string
 }
 
+type TriggerCycleResponse = {
+  status: 'accepted' | 'success' | 'error'
+  message: string
+  last_run?: string | null
+  job_id?: string | null
+}
+
+type CycleJob = {
+  job_id: string
+  state: 'running' | 'succeeded' | 'failed'
+  message?: string | null
+  rebalances?: number | null
+}
+
+const CYCLE_JOB_POLL_MS = 1500
+const CYCLE_JOB_TIMEOUT_MS = 5 * 60 * 1000
+
 export default function Home() {
   const [protocols, setProtocols] = useState<ProtocolData[]>([])
   const [vaultBalance, setVaultBalance] = useState('0')
@@ -182,6 +199,23 @@ export default function Home() {
     }
   }
 
+  // Polls GET /api/cycles/{job_id}; null if the job is still running after the timeout
+  const waitForCycleJob = async (jobId: string): Promise<CycleJob | null> => {
+    const deadline = Date.now() + CYCLE_JOB_TIMEOUT_MS
+    while (Date.now() < deadline) {
+      const response = await fetch(`${BACKEND_URL}/api/cycles/${encodeURIComponent(jobId)}`)
+      if (!response.ok) {
+        throw new Error(`Backend returned ${response.status} for cycle job`)
+      }
+      const job = (await response.json()) as CycleJob
+      if (job.state !== 'running') {
+        return job
+      }
+      await new Promise((resolve) => setTimeout(resolve, CYCLE_JOB_POLL_MS))
+    }
+    return null
+  }
+
   const triggerCycle = async () => {
     try {
       setIsTriggeringCycle(true)
@@ -193,16 +227,36 @@ export default function Home() {
         return
       }
 
+      const trigger = (await response.json()) as TriggerCycleResponse
+      if (trigger.status === 'error' || !trigger.job_id) {
+        setTriggerStatus({ message: trigger.message || 'Failed to trigger AI cycle', tone: 'error' })
+        return
+      }
+
+      // The cycle runs in the background; wait for its job before refreshing
+      setTriggerStatus({ message: 'Cycle running...', tone: 'success' })
+      const job = await waitForCycleJob(trigger.job_id)
+      if (job === null) {
+        setTriggerStatus({ message: 'Cycle still running; the dashboard will update when it finishes', tone: 'success' })
+        return
+      }
+
       try {
         await Promise.all([
           fetchProtocolData({ throwOnError: true }),
           fetchVaultStatus({ throwOnError: true }),
           fetchRebalanceHistory({ throwOnError: true }),
         ])
-        setTriggerStatus({ message: 'Cycle triggered and dashboard updated', tone: 'success' })
       } catch (error) {
-        console.error('Error refreshing after trigger:', error)
-        setTriggerStatus({ message: 'Cycle triggered, but failed to refresh dashboard data', tone: 'error' })
+        console.error('Error refreshing after cycle:', error)
+        setTriggerStatus({ message: 'Cycle finished, but failed to refresh dashboard data', tone: 'error' })
+        return
+      }
+
+      if (job.state === 'failed') {
+        setTriggerStatus({ message: `Cycle failed: ${job.message ?? 'unknown error'}`, tone: 'error' })
+      } else {
+        setTriggerStatus({ message: 'Cycle finished and dashboard updated', tone: 'success' })
       }
     } catch (error) {
       console.error('Error triggering AI cycle:', error)